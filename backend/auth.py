@@ -1,66 +1,156 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta, date as dt_date
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+import hashlib
+import os
 import secrets
 
-from database import SessionLocal
+from cache import TTLCache
+from database import AsyncSessionLocal
+from email_outbox import EmailOutbox
+from email_service import build_reset_email
 from models.user import User
+from passwords import hasher
+from report_cache import report_cache
+from reset_tokens import RESET_TOKEN_TTL_MIN, ResetTokenStore
+from revocation import build_revocation_store
 
 # ── Config ────────────────────────────────────────────────────────────────────
 SECRET_KEY = "dermassist-secret-key-change-in-production-2024"
 ALGORITHM  = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
-# ── Token blacklist (in-memory) ───────────────────────────────────────────────
-token_blacklist: set = set()
+# ── Revoked tokens (see revocation.py) ────────────────────────────────────────
+revocation_store = build_revocation_store(AsyncSessionLocal)
 
-# ── Password reset store (in-memory) ─────────────────────────────────────────
-reset_tokens: dict = {}
+# ── Password reset tokens (see reset_tokens.py) ──────────────────────────────
+reset_store = ResetTokenStore(AsyncSessionLocal)
+email_outbox = EmailOutbox(AsyncSessionLocal)
+
+# ── Authenticated-principal cache ─────────────────────────────────────────────
+# Username → Principal, so an authenticated request normally costs no query.
+# Profile updates, password resets and logout evict the entry in this
+# process; other workers pick the change up within the TTL.
+PRINCIPAL_CACHE_SIZE  = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_S = float(os.getenv("PRINCIPAL_CACHE_TTL_S", "30"))
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_S)
 
-pwd_context   = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 # ── DB dependency ─────────────────────────────────────────────────────────────
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def find_user(db: AsyncSession, *conditions) -> Optional[User]:
+    return (await db.execute(select(User).where(*conditions))).scalars().first()
+
+
+async def find_login_user(db: AsyncSession, identifier: str) -> Optional[User]:
+    """Username or email in one indexed OR query; a username match wins."""
+    users = (await db.execute(
+        select(User).where(or_(User.username == identifier, User.email == identifier)).limit(2)
+    )).scalars().all()
+    return next((u for u in users if u.username == identifier), users[0] if users else None)
+
+
+# ── Principal ─────────────────────────────────────────────────────────────────
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Detached snapshot of the authenticated user; never bound to a session."""
+    id:            int
+    username:      str
+    email:         str
+    full_name:     str
+    phone_number:  Optional[str]
+    gender:        Optional[str]
+    date_of_birth: Optional[dt_date]
+    role:          Optional[str]
+    is_active:     Optional[bool]
+    created_at:    Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            phone_number=user.phone_number,
+            gender=user.gender,
+            date_of_birth=user.date_of_birth,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+def invalidate_principal(username: Optional[str]):
+    if username:
+        principal_cache.pop(username)
 
 
 # ── JWT helpers ───────────────────────────────────────────────────────────────
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire    = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(16)})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Optional[User]:
+def decode_token(token: Optional[str]) -> Optional[dict]:
     if not token:
         return None
-    if token in token_blacklist:
-        return None
     try:
-        payload  = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            return None
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
-    return db.query(User).filter(User.username == username).first()
+
+
+def token_id(token: str, payload: dict) -> str:
+    # Tokens issued before jti existed are identified by their digest
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+async def revoke_token(token: Optional[str]):
+    payload = decode_token(token)
+    if payload:
+        await revocation_store.revoke(token_id(token, payload), payload["exp"])
+        invalidate_principal(payload.get("sub"))
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Optional[Principal]:
+    payload = decode_token(token)
+    if not payload or revocation_store.is_revoked(token_id(token, payload)):
+        return None
+    username = payload.get("sub")
+    if not username:
+        return None
+
+    principal = principal_cache.get(username)
+    if principal is None:
+        user = await find_user(db, User.username == username)
+        if not user:
+            return None
+        principal = Principal.from_user(user)
+        principal_cache.set(username, principal)
+    return principal
 
 
 # ── Schemas ───────────────────────────────────────────────────────────────────
@@ -91,12 +181,7 @@ class UpdateProfileRequest(BaseModel):
 
 # ── Register ──────────────────────────────────────────────────────────────────
 @router.post("/register", status_code=201)
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == payload.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    if db.query(User).filter(User.username == payload.username).first():
-        raise HTTPException(status_code=400, detail="Username already taken")
-
+async def register(payload: RegisterRequest, db: AsyncSession = Depends(get_db)):
     dob = None
     if payload.date_of_birth:
         try:
@@ -114,11 +199,26 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
         phone_number=payload.phone_number,
         gender=payload.gender,
         date_of_birth=dob,
+        password_hash=await hasher.hash(payload.password),
     )
-    user.set_password(payload.password)
+    # One INSERT; the unique indexes on email/username reject duplicates,
+    # including two concurrent registrations of the same name
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # Rare path: look up which of the two is taken to keep the specific messages
+        taken = (await db.execute(
+            select(User.email, User.username)
+            .where(or_(User.email == payload.email, User.username == payload.username))
+            .limit(2)
+        )).all()
+        if any(row.email == payload.email for row in taken):
+            raise HTTPException(status_code=400, detail="Email already registered")
+        if taken:
+            raise HTTPException(status_code=400, detail="Username already taken")
+        raise HTTPException(status_code=409, detail="Username or email already registered")
 
     token = create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
@@ -126,24 +226,45 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
 
 # ── Login ─────────────────────────────────────────────────────────────────────
 @router.post("/login")
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(
+    background_tasks: BackgroundTasks,
+    form: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
     # Allow login with either username OR email
-    user = (
-        db.query(User).filter(User.username == form.username).first() or
-        db.query(User).filter(User.email    == form.username).first()
-    )
+    user = await find_login_user(db, form.username)
 
     # ✅ FIXED: was check_password (doesn't exist) → now verify_password
-    if not user or not user.verify_password(form.password):
+    await db.commit()       # hand the connection back while bcrypt runs
+    if not user or not await hasher.verify(form.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
+    if hasher.needs_rehash(user.password_hash):
+        background_tasks.add_task(rehash_password, user.id, user.password_hash, form.password)
+
     token = create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
 
 
+async def rehash_password(user_id: int, old_hash: str, password: str):
+    """Upgrade a hash made with an old bcrypt cost; runs after the login response."""
+    try:
+        new_hash = await hasher.hash(password)
+        async with AsyncSessionLocal() as db:
+            # Compare-and-set, so a reset that happened meanwhile is not overwritten
+            await db.execute(
+                update(User)
+                .where(User.id == user_id, User.password_hash == old_hash)
+                .values(password_hash=new_hash)
+            )
+            await db.commit()
+    except Exception as e:
+        print(f"⚠ Password rehash failed for user {user_id}: {e}")
+
+
 # ── Get current user info ─────────────────────────────────────────────────────
 @router.get("/me")
-def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return {
@@ -160,93 +281,93 @@ def get_me(current_user: User = Depends(get_current_user)):
 
 # ── Logout ────────────────────────────────────────────────────────────────────
 @router.post("/logout")
-def logout(token: str = Depends(oauth2_scheme)):
-    if token:
-        token_blacklist.add(token)
+async def logout(token: str = Depends(oauth2_scheme)):
+    await revoke_token(token)
     return {"message": "Logged out successfully"}
 
 
 # ── Logout all devices ────────────────────────────────────────────────────────
 @router.post("/logout-all")
-def logout_all(
+async def logout_all(
     token: str = Depends(oauth2_scheme),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    if token:
-        token_blacklist.add(token)
+    await revoke_token(token)
     return {"message": "Logged out from all devices successfully"}
 
 
 # ── Forgot password ───────────────────────────────────────────────────────────
 @router.post("/forgot-password")
-def forgot_password(payload: ForgotPasswordRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
+async def forgot_password(payload: ForgotPasswordRequest, db: AsyncSession = Depends(get_db)):
+    user = await find_user(db, User.email == payload.email)
 
     # Always return same message — don't reveal if email exists
     if not user:
         return {"message": "If that email is registered, a reset link has been sent."}
 
-    reset_token = secrets.token_urlsafe(32)
-    reset_tokens[reset_token] = {
-        "email":   user.email,
-        "expires": datetime.utcnow() + timedelta(minutes=30),
-    }
+    reset_token = await reset_store.issue(user.id, db)
+    if reset_token is None:
+        # Rate-limited: same answer, no new token and no email
+        print(f"⚠ Password reset rate limit hit for {user.email}")
+        return {"message": "If that email is registered, a reset link has been sent."}
 
     # Log token to console so you can test without email setup
     print(f"\n[RESET TOKEN for {user.email}]: {reset_token}\n")
 
-    try:
-        from email_service import send_reset_email
-        send_reset_email(
-            to_email=user.email,
-            full_name=user.full_name,
-            reset_token=reset_token
-        )
-    except Exception as e:
-        print(f"Email send failed (token still valid): {e}")
+    # The token and the email carrying it commit together; the outbox sender
+    # delivers it, so no SMTP work happens on the request path
+    await email_outbox.enqueue(
+        build_reset_email(to_email=user.email, full_name=user.full_name, reset_token=reset_token),
+        expires_at=datetime.utcnow() + timedelta(minutes=RESET_TOKEN_TTL_MIN),
+        db=db,
+    )
+    await db.commit()
+    email_outbox.notify()
 
     return {"message": "If that email is registered, a reset link has been sent."}
 
 
 # ── Reset password ────────────────────────────────────────────────────────────
 @router.post("/reset-password")
-def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_db)):
-    entry = reset_tokens.get(payload.token)
-    if not entry:
-        raise HTTPException(status_code=400, detail="Invalid or expired reset link.")
-    if datetime.utcnow() > entry["expires"]:
-        del reset_tokens[payload.token]
+async def reset_password(payload: ResetPasswordRequest, db: AsyncSession = Depends(get_db)):
+    user_id, expired = await reset_store.consume(payload.token)
+    if expired:
         raise HTTPException(status_code=400, detail="Reset link expired. Please request a new one.")
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired reset link.")
 
-    user = db.query(User).filter(User.email == entry["email"]).first()
+    user = await find_user(db, User.id == user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
 
-    user.set_password(payload.new_password)
-    db.commit()
-    del reset_tokens[payload.token]
+    await db.commit()       # hand the connection back while bcrypt runs
+    user.password_hash = await hasher.hash(payload.new_password)
+    await db.commit()
+    invalidate_principal(user.username)
 
     return {"message": "Password reset successfully. You can now log in."}
 
 
 # ── Update profile ────────────────────────────────────────────────────────────
 @router.put("/profile")
-def update_profile(
+async def update_profile(
     payload: UpdateProfileRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    if payload.full_name    is not None: current_user.full_name    = payload.full_name
-    if payload.phone_number is not None: current_user.phone_number = payload.phone_number
-    if payload.gender       is not None: current_user.gender       = payload.gender
-
-    db.commit()
-    db.refresh(current_user)
+    changes = payload.model_dump(exclude_none=True)
+    if changes:
+        await db.execute(update(User).where(User.id == current_user.id).values(**changes))
+        await db.commit()
+        invalidate_principal(current_user.username)
+        current_user = replace(current_user, **changes)
+        # Cached PDFs print the old profile
+        await run_in_threadpool(report_cache.evict_user, current_user.id)
 
     return {
         "message":      "Profile updated successfully",
@@ -258,10 +379,10 @@ def update_profile(
 
 # ── Debug: check reset tokens (REMOVE BEFORE PRODUCTION) ─────────────────────
 @router.get("/debug-reset-tokens")
-def debug_tokens():
+async def debug_tokens():
     return {
         "active_tokens": [
-            {"token": k[:8] + "...", "email": v["email"], "expires": str(v["expires"])}
-            for k, v in reset_tokens.items()
+            {"token_hash": row.token_hash[:8] + "...", "user_id": row.user_id, "expires": str(row.expires_at)}
+            for row in await reset_store.active()
         ]
     }
\ No newline at end of file
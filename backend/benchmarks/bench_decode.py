@@ -0,0 +1,175 @@
+"""
+DermAssist AI — Decode benchmark
+Compares the original full-resolution decode in preprocess_image against
+the reduced-resolution fast path in image_io.decode_for_model.
+
+Run from backend/:
+    python benchmarks/bench_decode.py                     # images in uploads/
+    python benchmarks/bench_decode.py --megapixels 12     # re-encode as 12 MP phone shots
+    python benchmarks/bench_decode.py --model skin_cancer_model.tflite --tolerance 0.05
+
+Reports median decode time per image, peak RSS growth for one decode of
+the largest input (measured in a fresh subprocess per path), and — when a
+model is given — the max absolute difference between the two paths' scores.
+Exits non-zero if that difference exceeds --tolerance.
+"""
+import argparse
+import glob
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_io import decode_for_model  # noqa: E402
+
+
+def legacy_preprocess(data: bytes) -> np.ndarray:
+    """The pre-fast-path implementation, kept verbatim for comparison."""
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, (128, 128))
+    return img.astype('float32') / 255.0
+
+
+def fast_preprocess(data: bytes) -> np.ndarray:
+    return np.divide(decode_for_model(data), 255.0, dtype=np.float32)
+
+
+PATHS = {"legacy": legacy_preprocess, "fast": fast_preprocess}
+
+
+def load_images(pattern: str, megapixels: float):
+    images = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            data = f.read()
+        if megapixels:
+            img   = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            scale = (megapixels * 1e6 / (img.shape[0] * img.shape[1])) ** 0.5
+            img   = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            data  = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+        images.append((os.path.basename(path), data))
+    return images
+
+
+def time_path(fn, data: bytes, repeat: int) -> float:
+    fn(data)                                        # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def peak_rss_kb(path_name: str, image_file: str) -> int:
+    """Peak RSS growth (KB) of one decode, measured in a clean interpreter."""
+    out = subprocess.run(
+        [sys.executable, __file__, "--rss-child", path_name, image_file],
+        check=True, capture_output=True, text=True,
+    )
+    return int(out.stdout.strip().splitlines()[-1])
+
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss is inherited from the parent across fork/exec, so on Linux
+    # reset the high-water mark and read VmHWM instead.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def rss_child(path_name: str, image_file: str):
+    with open(image_file, "rb") as f:
+        data = f.read()
+    fn = PATHS[path_name]
+    fn(cv2.imencode(".png", np.zeros((8, 8, 3), np.uint8))[1].tobytes())  # load codecs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    before = _peak_rss_kb()
+    fn(data)
+    print(_peak_rss_kb() - before)
+
+
+def score_diff(model_path: str, images) -> float:
+    import tensorflow as tf
+    interpreter = tf.lite.Interpreter(model_path=model_path)
+    interpreter.allocate_tensors()
+    in_idx  = interpreter.get_input_details()[0]['index']
+    out_idx = interpreter.get_output_details()[0]['index']
+
+    def scores(x):
+        interpreter.set_tensor(in_idx, x[np.newaxis].astype(np.float32))
+        interpreter.invoke()
+        return interpreter.get_tensor(out_idx)[0]
+
+    worst = 0.0
+    for name, data in images:
+        diff = float(np.max(np.abs(scores(legacy_preprocess(data)) - scores(fast_preprocess(data)))))
+        print(f"  {name:<44} max |Δscore| = {diff:.4f}")
+        worst = max(worst, diff)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="uploads/*")
+    parser.add_argument("--megapixels", type=float, default=0, help="re-encode inputs at this size first")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--model", help="TFLite model for the score tolerance check")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--rss-child", nargs=2, metavar=("PATH", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_child:
+        return rss_child(*args.rss_child)
+
+    images = load_images(args.images, args.megapixels)
+    if not images:
+        sys.exit(f"No images match {args.images!r}")
+
+    print(f"{'image':<44} {'legacy ms':>10} {'fast ms':>10} {'speedup':>8}")
+    legacy_total = fast_total = 0.0
+    for name, data in images:
+        t_legacy = time_path(legacy_preprocess, data, args.repeat)
+        t_fast   = time_path(fast_preprocess, data, args.repeat)
+        legacy_total += t_legacy
+        fast_total   += t_fast
+        print(f"{name:<44} {t_legacy:>10.2f} {t_fast:>10.2f} {t_legacy / t_fast:>7.1f}x")
+    print(f"{'TOTAL':<44} {legacy_total:>10.2f} {fast_total:>10.2f} {legacy_total / fast_total:>7.1f}x")
+
+    largest = max(images, key=lambda item: len(item[1]))
+    tmp = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bench_largest.jpg")
+    with open(tmp, "wb") as f:
+        f.write(largest[1])
+    try:
+        rss = {name: peak_rss_kb(name, tmp) for name in PATHS}
+    finally:
+        os.remove(tmp)
+    print(f"\nPeak RSS growth for one decode of {largest[0]}: "
+          f"legacy {rss['legacy']} KB, fast {rss['fast']} KB")
+
+    if args.model:
+        print(f"\nScore tolerance check (≤ {args.tolerance}):")
+        worst = score_diff(args.model, images)
+        print(f"  worst = {worst:.4f}")
+        if worst > args.tolerance:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
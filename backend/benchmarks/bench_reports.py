@@ -0,0 +1,161 @@
+"""
+DermAssist AI — Report rendering benchmark
+Compares the original per-call report builder against the precompiled
+ReportTemplate in report_generator.py. The original is loaded from git:
+report_generator.py as of the commit before ReportTemplate was introduced,
+or --baseline REV.
+
+Run from backend/, in a git checkout:
+    python benchmarks/bench_reports.py                  # 200 reports per path
+    python benchmarks/bench_reports.py --reports 1000
+    python benchmarks/bench_reports.py --baseline v1.2  # any revision
+
+For each path it reports reports/second (single thread), peak traced
+memory while rendering one report, and how many ReportLab styles and
+flowables are constructed per report. It also renders every sample scan
+through both paths with ReportLab's invariant mode and a frozen clock and
+exits non-zero if any two PDFs differ.
+"""
+import argparse
+import datetime as dt
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+from collections import Counter
+
+from reportlab import rl_config
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+import report_generator  # noqa: E402
+
+USER = {
+    "full_name":     "Jane Doe",
+    "email":         "jane@example.com",
+    "date_of_birth": "1990-04-12",
+    "gender":        "Female",
+    "phone_number":  "+1 555 0100",
+}
+
+
+def _git(*args) -> str:
+    return subprocess.run(["git", "-C", BACKEND, *args], check=True, capture_output=True, text=True).stdout
+
+
+def load_legacy(rev: str = None) -> types.ModuleType:
+    """report_generator.py as of `rev` (default: just before ReportTemplate), as a module."""
+    if rev is None:
+        introduced = _git("log", "--format=%H", "--reverse", "-S", "class ReportTemplate",
+                          "--", "report_generator.py").split()
+        if not introduced:
+            sys.exit("Could not find the commit that introduced ReportTemplate; pass --baseline REV")
+        rev = introduced[0] + "^"
+    source = _git("show", f"{rev}:./report_generator.py")
+    module = types.ModuleType("legacy_report_generator")
+    module.__file__ = f"{rev}:report_generator.py"
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def sample_scans():
+    labels = list(report_generator.NAME_MAP)
+    risks  = {"High": "High Risk", "Moderate": "Moderate Risk", "Low": "Low Risk"}
+    scans  = []
+    for i, label in enumerate(labels):
+        rest   = [c for c in labels if c != label]
+        scores = {label: 0.64, **{c: 0.06 for c in rest}}
+        scans.append({
+            "id":               i + 1,
+            "predicted_label":  label,
+            "confidence_score": 0.64,
+            "risk_level":       risks[report_generator.CLASS_RISK[label]],
+            "created_at":       "2026-03-01 14:05:00",
+            "raw_output":       scores,
+        })
+    return scans
+
+
+def count_constructions(fn, scan) -> Counter:
+    """How many styles/flowables one render constructs."""
+    counts, originals = Counter(), {}
+    for cls in (ParagraphStyle, Paragraph, Table, TableStyle):
+        originals[cls] = cls.__init__
+
+        def counted(self, *a, _cls=cls, **kw):
+            counts[_cls.__name__] += 1
+            originals[_cls](self, *a, **kw)
+        cls.__init__ = counted
+    try:
+        fn(scan, USER)
+    finally:
+        for cls, init in originals.items():
+            cls.__init__ = init
+    return counts
+
+
+def peak_kb(fn, scan) -> float:
+    tracemalloc.start()
+    try:
+        fn(scan, USER)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def throughput(fn, scans, reports: int) -> float:
+    for scan in scans:                              # warm-up
+        fn(scan, USER)
+    t0 = time.perf_counter()
+    for i in range(reports):
+        fn(scans[i % len(scans)], USER)
+    return reports / (time.perf_counter() - t0)
+
+
+class _FrozenClock(dt.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 3, 1, 15, 0, 0)
+
+
+def outputs_match(legacy: types.ModuleType, scans) -> bool:
+    rl_config.invariant = 1
+    saved = legacy.datetime, report_generator.datetime
+    legacy.datetime = report_generator.datetime = _FrozenClock
+    try:
+        return all(legacy.generate_scan_report(s, USER) == report_generator.generate_scan_report(s, USER)
+                   for s in scans)
+    finally:
+        legacy.datetime, report_generator.datetime = saved
+        rl_config.invariant = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--baseline", help="git revision to take the legacy report_generator.py from")
+    args = parser.parse_args()
+
+    legacy = load_legacy(args.baseline)
+    paths  = {"legacy": legacy.generate_scan_report, "template": report_generator.generate_scan_report}
+    scans  = sample_scans()
+    print(f"legacy: report_generator.py at {legacy.__file__.split(':')[0]}")
+    print(f"{'path':<10} {'reports/s':>10} {'peak KB':>9}  constructed per report")
+    for name, fn in paths.items():
+        rate   = throughput(fn, scans, args.reports)
+        peak   = peak_kb(fn, scans[0])
+        counts = count_constructions(fn, scans[0])
+        built  = ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+        print(f"{name:<10} {rate:10.1f} {peak:9.0f}  {built}")
+
+    same = outputs_match(legacy, scans)
+    print(f"{'✅' if same else '❌'} template output {'matches' if same else 'differs from'} legacy output")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+DermAssist AI — Email outbox check
+Runs the outbox sender (email_outbox.py) against a local aiosmtpd server
+on a throwaway SQLite database built through the Alembic migrations.
+
+Run from backend/ (needs `pip install aiosmtpd`):
+    python benchmarks/check_email_outbox.py                 # 200 messages
+    python benchmarks/check_email_outbox.py --messages 1000
+
+The server answers "451 try again" to the first --transient DATA commands
+and refuses one recipient with 550, so retry and permanent failure are
+exercised too. Reports how long enqueue() takes (what forgot-password now
+waits for), delivery rate over the shared connection versus a new
+connection per message, and how many SMTP sessions were opened.
+
+Exits non-zero if a message is lost, sent twice, not retried, or if the
+outbox opened more than one session.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    sys.exit("aiosmtpd is not installed: pip install aiosmtpd")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import email_outbox  # noqa: E402
+from database import build_async_engine, build_engine  # noqa: E402
+from email_outbox import EmailOutbox  # noqa: E402
+from email_service import SMTPMailer, build_reset_email  # noqa: E402
+from migrate import upgrade_database  # noqa: E402
+from models.email_outbox import OutboxEmail  # noqa: E402
+
+REFUSED = "refused@example.com"
+
+
+class Recorder:
+    """aiosmtpd handler: records deliveries, counts sessions, injects failures."""
+
+    def __init__(self, transient: int):
+        self.transient = transient
+        self.sessions  = 0
+        self.received  = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.transient > 0:
+            self.transient -= 1
+            return "451 4.3.0 Try again later"
+        self.received.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+def local_mailer(port: int, **kw) -> SMTPMailer:
+    return SMTPMailer(host="127.0.0.1", port=port, user="outbox@example.com",
+                      use_ssl=False, starttls=False, auth=False, **kw)
+
+
+def per_message_rate(port: int, messages: list) -> float:
+    """The old behaviour: connect, send, quit for every email."""
+    t0 = time.perf_counter()
+    for msg in messages:
+        mailer = local_mailer(port)
+        mailer.send([msg["To"]], msg.as_string())
+        mailer.close()
+    return len(messages) / (time.perf_counter() - t0)
+
+
+def shared_rate(port: int, messages: list) -> float:
+    mailer = local_mailer(port)
+    t0 = time.perf_counter()
+    for msg in messages:
+        mailer.send([msg["To"]], msg.as_string())
+    rate = len(messages) / (time.perf_counter() - t0)
+    mailer.close()
+    return rate
+
+
+async def run(args, path: str) -> bool:
+    sync_engine = build_engine(f"sqlite:///{path}")
+    upgrade_database(sync_engine)
+    sync_engine.dispose()
+    engine   = build_async_engine(f"sqlite:///{path}")
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    recorder   = Recorder(args.transient)
+    controller = Controller(recorder, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    email_outbox.OUTBOX_BACKOFF_S = 0.05        # retry within the run
+    email_outbox.OUTBOX_POLL_S    = 0.1
+    try:
+        outbox = EmailOutbox(sessions, local_mailer(args.port))
+        to     = [f"user{i}@example.com" for i in range(args.messages - 1)] + [REFUSED]
+        expiry = datetime.utcnow() + timedelta(minutes=30)
+
+        timings = []
+        for addr in to:
+            t0 = time.perf_counter()
+            await outbox.enqueue(build_reset_email(addr, "Test User", "token"), expires_at=expiry)
+            timings.append((time.perf_counter() - t0) * 1000)
+        # One already lapsed: must be dropped, not sent
+        await outbox.enqueue(build_reset_email("late@example.com", "Test User", "token"),
+                             expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+        t0 = time.perf_counter()
+        sender = asyncio.create_task(outbox.run())
+        async with sessions() as db:
+            while await db.scalar(select(func.count()).select_from(OutboxEmail)
+                                  .where(OutboxEmail.status.in_(("queued", "sending")))):
+                await asyncio.sleep(0.05)
+        outbox_rate = len(to) / (time.perf_counter() - t0)
+        sender.cancel()
+        await outbox.shutdown()
+        outbox_sessions = recorder.sessions
+        received        = sorted(recorder.received)
+
+        async with sessions() as db:
+            by_status = dict((await db.execute(
+                select(OutboxEmail.status, func.count()).group_by(OutboxEmail.status)
+            )).all())
+            bodies = await db.scalar(select(func.count()).select_from(OutboxEmail).where(OutboxEmail.body.is_not(None)))
+
+        sample = [build_reset_email(f"x{i}@example.com", "Test User", "token") for i in range(min(args.messages, 100))]
+        direct_rate = per_message_rate(args.port, sample)
+        reused_rate = shared_rate(args.port, sample)
+    finally:
+        controller.stop()
+        await engine.dispose()
+
+    print(f"enqueue:   median {statistics.median(timings):.2f} ms, "
+          f"p99 {sorted(timings)[int(len(timings) * 0.99) - 1]:.2f} ms")
+    print(f"outbox:    {outbox_rate:8.1f} msg/s end to end, {outbox_sessions} SMTP session(s) opened")
+    print(f"smtp:      {reused_rate:8.1f} msg/s on a shared session, "
+          f"{direct_rate:8.1f} msg/s with a session per message (no TLS or login here)")
+    print(f"outcome:   {by_status}, stats {outbox.stats()}")
+
+    expected = sorted(to[:-1])
+    checks = {
+        "every deliverable message arrived once": received == expected,
+        "refused recipient failed":               by_status.get("failed") == 1,
+        "lapsed message expired":                 by_status.get("expired") == 1,
+        "transient refusals retried":             outbox.retried == args.transient,
+        "one SMTP session reused":                outbox_sessions == 1,
+        "bodies cleared":                         bodies == 0,
+    }
+    for name, ok in checks.items():
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(checks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--transient", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="outbox-")
+    try:
+        ok = asyncio.run(run(args, os.path.join(directory, "outbox.db")))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
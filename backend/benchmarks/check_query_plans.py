@@ -0,0 +1,147 @@
+"""
+DermAssist AI — Query-plan regression check
+Builds a SQLite database through the Alembic migrations, seeds it with
+--rows predictions (and as many images) spread over --users users, then
+runs EXPLAIN QUERY PLAN on the hot per-user queries and checks that each
+one is answered from the expected index, with no full scan and no sort.
+
+Run from backend/:
+    python benchmarks/check_query_plans.py                  # 1M rows, temp file
+    python benchmarks/check_query_plans.py --rows 100000 --db /tmp/plans.db
+
+Exits non-zero if any query's plan regresses.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import build_engine  # noqa: E402
+from migrate import upgrade_database  # noqa: E402
+from models.images import Image  # noqa: E402
+from models.prediciton import Prediction, pack_scores  # noqa: E402
+from models.user import User  # noqa: E402
+
+SEED_CHUNK = 50_000
+LABELS     = ["akiec", "bcc", "bkl", "df", "mel", "nv", "vasc"]
+
+
+def seed(engine, rows: int, users: int):
+    rng   = random.Random(42)
+    start = datetime(2024, 1, 1)
+    blob  = pack_scores([1 / len(LABELS)] * len(LABELS))
+    raw   = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            "INSERT INTO users (id, full_name, username, email, password_hash) VALUES (?, ?, ?, ?, ?)",
+            [(u, f"User {u}", f"user{u}", f"user{u}@example.com", "x") for u in range(1, users + 1)],
+        )
+        for base in range(0, rows, SEED_CHUNK):
+            n      = min(SEED_CHUNK, rows - base)
+            owners = [rng.randint(1, users) for _ in range(n)]
+            stamps = [start + timedelta(seconds=rng.randint(0, 365 * 86400)) for _ in range(n)]
+            cur.executemany(
+                "INSERT INTO images (id, image_name, image_path, image_format, image_size_kb, uploaded_at, user_id)"
+                " VALUES (?, ?, ?, 'jpg', 200, ?, ?)",
+                [(base + i + 1, f"{base + i}.jpg", f"uploads/{base + i}.jpg", stamps[i], owners[i]) for i in range(n)],
+            )
+            cur.executemany(
+                "INSERT INTO predictions (id, predicted_label, confidence_score, model_version, processing_time_ms,"
+                " risk_level, diagnosis_name, image_url, class_scores, status, created_at, user_id, image_id)"
+                " VALUES (?, ?, 0.5, 'v2.0', 20, 'Low Risk', 'Nevus', ?, ?, 'completed', ?, ?, ?)",
+                [(base + i + 1, rng.choice(LABELS), f"/uploads/{base + i}.jpg", blob, stamps[i], owners[i], base + i + 1)
+                 for i in range(n)],
+            )
+            raw.commit()
+            print(f"  seeded {base + n:,} / {rows:,}", end="\r")
+        cur.execute("ANALYZE")
+        raw.commit()
+    finally:
+        raw.close()
+    print()
+
+
+def hot_queries(user_id: int):
+    """The per-user queries main.py and auth.py issue, with the index each must use."""
+    history = (
+        select(
+            Prediction.id, Prediction.predicted_label, Prediction.confidence_score,
+            Prediction.risk_level, Prediction.diagnosis_name, Prediction.image_url,
+            Prediction.processing_time_ms, Prediction.created_at,
+        )
+        .where(Prediction.user_id == user_id)
+    )
+    order  = (Prediction.created_at.desc(), Prediction.id.desc())
+    cursor = datetime(2024, 6, 1)
+    return [
+        ("history: first page", "ix_predictions_user_id_created_at",
+         history.order_by(*order).limit(21)),
+        ("history: keyset page", "ix_predictions_user_id_created_at",
+         history.where(or_(
+             Prediction.created_at < cursor,
+             and_(Prediction.created_at == cursor, Prediction.id < 500),
+         )).order_by(*order).limit(21)),
+        ("history: etag version", "ix_predictions_user_id_created_at",
+         select(func.count(Prediction.id), func.max(Prediction.id)).where(Prediction.user_id == user_id)),
+        ("profile: total scans", "ix_predictions_user_id_created_at",
+         select(func.count()).select_from(Prediction).where(Prediction.user_id == user_id)),
+        ("report: scan lookup", "INTEGER PRIMARY KEY",
+         select(Prediction).where(Prediction.id == 12345, Prediction.user_id == user_id)),
+        ("images: newest uploads", "ix_images_user_id_uploaded_at",
+         select(Image.id, Image.image_path).where(Image.user_id == user_id)
+         .order_by(Image.uploaded_at.desc()).limit(20)),
+        ("auth: login lookup", "ix_users_email",
+         select(User).where(or_(User.username == "user1@example.com", User.email == "user1@example.com")).limit(2)),
+    ]
+
+
+def check(engine, user_id: int) -> bool:
+    ok = True
+    with engine.connect() as conn:
+        for name, index, stmt in hot_queries(user_id):
+            sql    = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan   = " | ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+            t0     = time.perf_counter()
+            conn.exec_driver_sql(sql).all()
+            ms     = (time.perf_counter() - t0) * 1000
+            passed = index in plan and "TEMP B-TREE" not in plan and not plan.startswith("SCAN")
+            ok    &= passed
+            print(f"{'✅' if passed else '❌'} {name:<24} {ms:7.2f} ms  {plan}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--db", help="SQLite file to create (default: a temp file, removed afterwards)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "plans.db")
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    engine = build_engine(f"sqlite:///{path}")
+    try:
+        upgrade_database(engine)
+        t0 = time.perf_counter()
+        seed(engine, args.rows, args.users)
+        print(f"Seeded {args.rows:,} predictions for {args.users:,} users in {time.perf_counter() - t0:.1f}s")
+        ok = check(engine, user_id=1)
+    finally:
+        engine.dispose()
+        if not args.db:
+            shutil.rmtree(os.path.dirname(path))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
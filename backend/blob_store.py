@@ -0,0 +1,59 @@
+"""
+DermAssist AI — Content-addressed upload storage
+Every upload is stored once under the SHA-256 of its bytes:
+
+    uploads/3f/a2/3fa2…e9.jpg
+
+Two levels of 256-way sharding keep directories small as uploads/ grows,
+so StaticFiles lookups stay fast. Re-uploads of identical bytes reuse the
+existing blob, and writes go through a temp file + rename so a reader
+never sees a half-written image.
+"""
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple
+
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png"}
+
+
+class StoredBlob(NamedTuple):
+    digest:   str     # hex SHA-256 of the bytes
+    name:     str     # "<digest>.<ext>"
+    path:     str     # filesystem path, relative to the process cwd
+    url_path: str     # path under the /uploads mount
+    created:  bool    # False if the blob already existed
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def locate(self, digest: str, ext: str) -> str:
+        return os.path.join(digest[:2], digest[2:4], f"{digest}.{ext}")
+
+    def put(self, contents: bytes, content_type: str) -> StoredBlob:
+        digest   = hashlib.sha256(contents).hexdigest()
+        ext      = EXTENSIONS.get(content_type, "bin")
+        relpath  = self.locate(digest, ext)
+        path     = os.path.join(self.root, relpath)
+        url_path = relpath.replace(os.sep, "/")
+
+        if os.path.exists(path):
+            return StoredBlob(digest, f"{digest}.{ext}", path, url_path, False)
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(contents)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return StoredBlob(digest, f"{digest}.{ext}", path, url_path, True)
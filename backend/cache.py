@@ -0,0 +1,69 @@
+"""
+DermAssist AI — In-process caching primitives
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU map with per-entry expiry.
+    Entries are evicted when they outlive `ttl` seconds (checked lazily on
+    access) or when `maxsize` is exceeded (least recently used first).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(maxsize, 0)
+        self.ttl     = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock   = threading.Lock()
+        self.hits    = 0
+        self.misses  = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize == 0:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size":    len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s":   self.ttl,
+            "hits":    self.hits,
+            "misses":  self.misses,
+        }
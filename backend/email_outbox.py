@@ -0,0 +1,283 @@
+"""
+DermAssist AI — Email outbox
+Outgoing email is written to the `email_outbox` table and delivered by a
+background sender, so a request that sends mail (forgot-password) only pays
+for one INSERT, never for the TLS handshake and SMTP round trips.
+
+  • one authenticated SMTP session (email_service.SMTPMailer) is reused
+    for every message the sender delivers, until it has been idle for
+    SMTP_IDLE_S
+  • the sender claims up to OUTBOX_BATCH due messages at a time with a
+    random claim token and a lease, so several workers can share the table;
+    messages whose lease has passed (their worker died) are picked up again
+  • a transient failure (connection, 4xx) retries with exponential backoff,
+    OUTBOX_BACKOFF_S doubling up to OUTBOX_BACKOFF_MAX_S, at most
+    OUTBOX_MAX_ATTEMPTS times; a 5xx refusal fails the message at once
+  • a message still queued at its expires_at (a reset link that has
+    lapsed) is dropped instead of sent
+  • message bodies are cleared as soon as a message leaves the queue, and
+    the rows themselves are deleted after OUTBOX_RETENTION_S
+  • shutdown() stops the sender between messages, waits for the round in
+    progress to record its results, and only then closes the SMTP session;
+    messages it did not get to stay queued
+
+Config (env vars):
+  OUTBOX_BATCH           messages claimed per round
+  OUTBOX_MAX_ATTEMPTS    delivery tries before a message is marked failed
+  OUTBOX_BACKOFF_S       first retry delay; doubles per attempt
+  OUTBOX_BACKOFF_MAX_S   longest retry delay
+  OUTBOX_LEASE_S         how long a claim lasts
+  OUTBOX_POLL_S          how often an idle sender looks for due messages
+  OUTBOX_RETENTION_S     how long sent/failed rows are kept
+"""
+import asyncio
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import Message
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from email_service import SMTPMailer
+from models.email_outbox import OutboxEmail
+
+OUTBOX_BATCH         = int(os.getenv("OUTBOX_BATCH", "50"))
+OUTBOX_MAX_ATTEMPTS  = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_S     = float(os.getenv("OUTBOX_BACKOFF_S", "5"))
+OUTBOX_BACKOFF_MAX_S = float(os.getenv("OUTBOX_BACKOFF_MAX_S", "600"))
+OUTBOX_LEASE_S       = float(os.getenv("OUTBOX_LEASE_S", "120"))
+OUTBOX_POLL_S        = float(os.getenv("OUTBOX_POLL_S", "5"))
+OUTBOX_RETENTION_S   = float(os.getenv("OUTBOX_RETENTION_S", str(7 * 86400)))
+
+FINISHED = ("sent", "failed", "expired")
+
+_SWEEP_EVERY_S = 600
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_S * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX_S)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx refusals will not succeed on retry; anything else might."""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False                    # our credentials, not this message
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _session_failed(error: Exception) -> bool:
+    """True when the connection itself failed, so the rest of the batch should wait."""
+    return not isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)) \
+        or isinstance(error, smtplib.SMTPAuthenticationError)
+
+
+class EmailOutbox:
+    def __init__(self, session_factory, mailer: Optional[SMTPMailer] = None):
+        self.session_factory = session_factory
+        self.mailer          = mailer or SMTPMailer()
+        self._wake           = asyncio.Event()
+        self._stop           = threading.Event()            # read by _send_batch on its thread
+        self._busy: Optional[asyncio.Future] = None  # mailer work shutdown() waits for
+        self._last_sweep     = 0.0
+        self.enqueued        = 0
+        self.sent            = 0
+        self.retried         = 0
+        self.failed          = 0
+        self.expired         = 0
+
+    # ── Producer side ─────────────────────────────────────────────────────────
+    async def enqueue(self, message: Message, expires_at: Optional[datetime] = None,
+                      db: Optional[AsyncSession] = None):
+        """
+        Queue `message` for delivery to its To: address. Given `db`, the row is
+        only added to that session: it is sent if and when the caller commits,
+        and the caller should then call notify().
+        """
+        now = datetime.utcnow()
+        row = OutboxEmail(
+            to_addr=message["To"],
+            subject=str(message["Subject"] or "")[:255],
+            body=message.as_string(),
+            status="queued",
+            attempts=0,
+            created_at=now,
+            next_attempt_at=now,
+            expires_at=expires_at,
+        )
+        self.enqueued += 1
+        if db is not None:
+            db.add(row)
+            return
+        async with self.session_factory() as db:
+            db.add(row)
+            await db.commit()
+        self.notify()
+
+    def notify(self):
+        """Wake the sender: new messages have been committed."""
+        self._wake.set()
+
+    # ── Sender ────────────────────────────────────────────────────────────────
+    async def run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = await self._guarded(self.deliver_due())
+                if time.monotonic() - self._last_sweep > _SWEEP_EVERY_S:
+                    await self.sweep()
+                    self._last_sweep = time.monotonic()
+            except Exception as e:
+                delivered = 0
+                print(f"⚠ Email outbox round failed: {e}")
+            if delivered >= OUTBOX_BATCH:
+                continue                # more may be due right away
+            try:
+                await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_S)
+            except asyncio.TimeoutError:
+                await self._guarded(asyncio.to_thread(self.mailer.close_if_idle))
+            self._wake.clear()
+
+    async def _guarded(self, work):
+        """
+        Run `work` as a task shutdown() waits for. Cancelling the sender does
+        not cancel it: a send already on its thread could not be stopped anyway.
+        """
+        self._busy = asyncio.ensure_future(work)
+        return await asyncio.shield(self._busy)
+
+    async def deliver_due(self) -> int:
+        """Claim one batch of due messages and send it. Returns the batch size."""
+        if self._stop.is_set():
+            return 0
+        batch = await self._claim()
+        if not batch:
+            return 0
+        results = await asyncio.to_thread(self._send_batch, batch)
+        await self._record(batch, results)
+        return len(batch)
+
+    async def _claim(self) -> List[OutboxEmail]:
+        now   = datetime.utcnow()
+        claim = uuid.uuid4().hex
+        due = or_(
+            and_(OutboxEmail.status == "queued", OutboxEmail.next_attempt_at <= now),
+            and_(OutboxEmail.status == "sending", OutboxEmail.lease_until < now),
+        )
+        async with self.session_factory() as db:
+            ids = (await db.execute(
+                select(OutboxEmail.id).where(due).order_by(OutboxEmail.next_attempt_at).limit(OUTBOX_BATCH)
+            )).scalars().all()
+            if not ids:
+                return []
+            # Re-checking `due` makes the UPDATE the claim: rows another worker took are skipped
+            await db.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id.in_(ids), due)
+                .values(status="sending", claim=claim, lease_until=now + timedelta(seconds=OUTBOX_LEASE_S))
+            )
+            await db.commit()
+            return (await db.execute(
+                select(OutboxEmail).where(OutboxEmail.claim == claim).order_by(OutboxEmail.next_attempt_at)
+            )).scalars().all()
+
+    def _send_batch(self, batch: List[OutboxEmail]) -> List[Optional[tuple]]:
+        """
+        Blocking. One result per message: None if it was not attempted,
+        else (status, error) with status sent | retry | failed | expired.
+        """
+        now     = datetime.utcnow()
+        results = []
+        for i, row in enumerate(batch):
+            if self._stop.is_set():     # shutting down: the rest go back to the queue
+                results.extend([None] * (len(batch) - i))
+                break
+            if row.expires_at is not None and row.expires_at <= now:
+                results.append(("expired", None))
+                continue
+            try:
+                self.mailer.send([row.to_addr], row.body)
+                results.append(("sent", None))
+            except Exception as e:
+                permanent = _is_permanent(e)
+                results.append(("failed" if permanent else "retry", f"{type(e).__name__}: {e}"))
+                if not permanent and _session_failed(e):
+                    print(f"⚠ SMTP session failed, {len(batch) - i - 1} message(s) wait for the next round: {e}")
+                    results.extend([None] * (len(batch) - i - 1))
+                    break
+        return results
+
+    async def _record(self, batch: List[OutboxEmail], results: List[Optional[tuple]]):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            for row, result in zip(batch, results):
+                mine = and_(OutboxEmail.id == row.id, OutboxEmail.claim == row.claim)
+                if result is None:
+                    values = dict(status="queued")
+                else:
+                    status, error = result
+                    values = dict(last_error=error[:255] if error else None)
+                    if status == "retry":
+                        attempts = row.attempts + 1
+                        if attempts >= OUTBOX_MAX_ATTEMPTS:
+                            status = "failed"
+                        else:
+                            values.update(next_attempt_at=now + timedelta(seconds=_backoff(attempts)))
+                            status = "queued"
+                            self.retried += 1
+                        values.update(attempts=attempts)
+                    elif status != "expired":
+                        values.update(attempts=row.attempts + 1)
+                    if status == "sent":
+                        values.update(sent_at=now)
+                        self.sent += 1
+                    elif status == "failed":
+                        print(f"❌ Email {row.id} to {row.to_addr} failed: {error}")
+                        self.failed += 1
+                    elif status == "expired":
+                        self.expired += 1
+                    values.update(status=status)
+                    if status in FINISHED:
+                        values.update(body=None)
+                await db.execute(update(OutboxEmail).where(mine).values(claim=None, lease_until=None, **values))
+            await db.commit()
+
+    # ── Sweeper ───────────────────────────────────────────────────────────────
+    async def sweep(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=OUTBOX_RETENTION_S)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                delete(OutboxEmail).where(OutboxEmail.status.in_(FINISHED), OutboxEmail.created_at < cutoff)
+            )
+            await db.commit()
+        return result.rowcount or 0
+
+    async def shutdown(self):
+        """Stop sending, let the current round record its results, then close the session."""
+        self._stop.set()
+        self._wake.set()
+        if self._busy is not None:
+            try:
+                await self._busy
+            except Exception as e:
+                print(f"⚠ Email outbox round failed during shutdown: {e}")
+        await asyncio.to_thread(self.mailer.close)
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "sent":     self.sent,
+            "retried":  self.retried,
+            "failed":   self.failed,
+            "expired":  self.expired,
+            "smtp":     self.mailer.stats(),
+        }
@@ -1,6 +1,8 @@
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import List, Optional
 import os
 
 # ─── Configure these with your Gmail credentials ──────────────────────────────
@@ -14,12 +16,23 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 # Generate at: https://myaccount.google.com/apppasswords
 # (Requires 2-Step Verification to be enabled on your Gmail)
 
+# ─── SMTP server (defaults: Gmail over implicit TLS) ──────────────────────────
+# For a local stand-in such as aiosmtpd:
+#   SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SSL=0 SMTP_AUTH=0
+SMTP_HOST      = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT      = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL       = os.getenv("SMTP_SSL", "1") == "1"           # implicit TLS (port 465)
+SMTP_STARTTLS  = os.getenv("SMTP_STARTTLS", "0") == "1"      # upgrade a plain connection (port 587)
+SMTP_AUTH      = os.getenv("SMTP_AUTH", "1") == "1"
+SMTP_TIMEOUT_S = float(os.getenv("SMTP_TIMEOUT_S", "20"))
+# Servers drop idle sessions (Gmail after a few minutes); reconnect rather than find out mid-send
+SMTP_IDLE_S    = float(os.getenv("SMTP_IDLE_S", "60"))
 
-def send_reset_email(to_email: str, full_name: str, reset_token: str) -> bool:
-    """
-    Sends a password reset email via Gmail SMTP.
-    Returns True on success, False on failure.
-    """
+RESET_SUBJECT = "Reset Your DermAssist AI Password"
+
+
+def build_reset_email(to_email: str, full_name: str, reset_token: str) -> MIMEMultipart:
+    """The password reset email, ready to queue (see email_outbox.py)."""
     reset_link = f"{FRONTEND_URL}/reset-password?token={reset_token}"
 
     # ── HTML Email Body ────────────────────────────────────────────────────────
@@ -83,22 +96,102 @@ If you did not request this, ignore this email — your password will not change
 — DermAssist AI Team
     """
 
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = "Reset Your DermAssist AI Password"
-        msg["From"]    = f"DermAssist AI <{GMAIL_USER}>"
-        msg["To"]      = to_email
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = RESET_SUBJECT
+    msg["From"]    = f"DermAssist AI <{GMAIL_USER}>"
+    msg["To"]      = to_email
+
+    msg.attach(MIMEText(text_body, "plain"))
+    msg.attach(MIMEText(html_body, "html"))
+    return msg
+
+
+# ─── Persistent SMTP connection ───────────────────────────────────────────────
+class SMTPMailer:
+    """
+    One authenticated SMTP session reused across messages: the TLS handshake
+    and login are paid once per connection, not once per email. Not
+    thread-safe; the outbox sender drives it from one task at a time.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 user: str = GMAIL_USER, password: str = GMAIL_PASS,
+                 use_ssl: bool = SMTP_SSL, starttls: bool = SMTP_STARTTLS, auth: bool = SMTP_AUTH,
+                 timeout: float = SMTP_TIMEOUT_S, idle_s: float = SMTP_IDLE_S):
+        self.host     = host
+        self.port     = port
+        self.user     = user
+        self.password = password
+        self.use_ssl  = use_ssl
+        self.starttls = starttls
+        self.auth     = auth
+        self.timeout  = timeout
+        self.idle_s   = idle_s
+        self.sender   = user
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+        self.sent     = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+        try:
+            if self.auth:
+                server.login(self.user, self.password)
+        except BaseException:
+            server.close()
+            raise
+        self.connects += 1
+        return server
+
+    def _connection(self) -> smtplib.SMTP:
+        self.close_if_idle()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def send(self, to_addrs: List[str], message: str):
+        """
+        Send one message on the shared session. smtplib errors propagate; if
+        a reused session turns out to have been dropped by the server, it is
+        reopened once and the send retried.
+        """
+        reused = self._server is not None
+        try:
+            self._sendmail(to_addrs, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            if not reused:
+                raise
+            self._sendmail(to_addrs, message)
+        self.sent += 1
 
-        msg.attach(MIMEText(text_body, "plain"))
-        msg.attach(MIMEText(html_body, "html"))
+    def _sendmail(self, to_addrs: List[str], message: str):
+        try:
+            self._connection().sendmail(self.sender, to_addrs, message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise                       # the session is still good; the server refused this message
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            self._last_used = time.monotonic()
 
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(GMAIL_USER, GMAIL_PASS)
-            server.sendmail(GMAIL_USER, to_email, msg.as_string())
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_s:
+            self.close()
 
-        print(f"✅ Reset email sent to {to_email}")
-        return True
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                self._server.close()
+            self._server = None
 
-    except Exception as e:
-        print(f"❌ Failed to send email: {e}")
-        return False
\ No newline at end of file
+    def stats(self) -> dict:
+        return {"connects": self.connects, "sent": self.sent, "connected": self._server is not None}
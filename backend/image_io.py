@@ -0,0 +1,105 @@
+"""
+DermAssist AI — Image decoding helpers
+Header sniffing and a reduced-resolution decode path for model input.
+
+Phone uploads are routinely 12 MP+, but the model only sees 128×128. For
+JPEGs, libjpeg can scale by 1/2, 1/4 or 1/8 during the inverse DCT, so we
+read the frame size from the header and ask OpenCV for the largest
+reduction that still leaves at least MODEL_INPUT_SIZE pixels per side.
+"""
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+MODEL_INPUT_SIZE = (128, 128)   # (width, height) the TFLite model expects
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# SOF markers that carry frame dimensions (excludes DHT=C4, JPG=C8, DAC=CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """Return 'jpeg' or 'png' from the magic bytes, or None."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == _PNG_SIGNATURE:
+        return "png"
+    return None
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                          # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2                                  # standalone marker, no payload
+            continue
+        if marker == 0xD9:                          # EOI before any frame header
+            return None
+        (length,) = struct.unpack(">H", data[i + 2:i + 4])
+        if marker in _JPEG_SOF:
+            if i + 9 > n:
+                return None
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def read_image_size(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Parse (format, width, height) from the first few KB of a JPEG/PNG
+    without decoding pixels. Returns None if the header is not recognised.
+    """
+    fmt = sniff_format(data)
+    size = _jpeg_size(data) if fmt == "jpeg" else _png_size(data) if fmt == "png" else None
+    if not size:
+        return None
+    return fmt, size[0], size[1]
+
+
+def reduced_decode_flag(width: int, height: int, target: Tuple[int, int] = MODEL_INPUT_SIZE) -> int:
+    """Largest IMREAD_REDUCED_COLOR_* that keeps both sides >= target."""
+    for factor, flag in _REDUCED_FLAGS:
+        if width // factor >= target[0] and height // factor >= target[1]:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_for_model(data: bytes, size: Tuple[int, int] = MODEL_INPUT_SIZE) -> np.ndarray:
+    """
+    Decode an upload straight to a `size` uint8 RGB array.
+    JPEGs are downscaled in the DCT domain first; the BGR→RGB swap is a
+    strided view rather than a cvtColor pass, so the only full-size copy is
+    the one the consumer makes when it normalises the pixels.
+    """
+    header = read_image_size(data)
+    flag   = cv2.IMREAD_COLOR
+    if header and header[0] == "jpeg":
+        flag = reduced_decode_flag(header[1], header[2], size)
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None:
+        raise ValueError("Could not decode image. Please upload a valid JPEG or PNG.")
+    if img.shape[1] != size[0] or img.shape[0] != size[1]:
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img[..., ::-1]
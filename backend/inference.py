@@ -0,0 +1,333 @@
+"""
+DermAssist AI — Inference executor + micro-batching scheduler
+Keeps image decoding and TFLite invokes off the asyncio event loop and
+collects concurrent /predict requests into a single invoke.
+
+Tuning (env vars):
+  INFERENCE_WORKERS           interpreters in the pool (and threads in the executor)
+  INFERENCE_NUM_THREADS       intra-op threads per interpreter, e.g. 8x2 or 4x4 on 16 cores
+  INFERENCE_MAX_PENDING       requests admitted at once before /predict returns 503
+  INFERENCE_RETRY_AFTER_S     Retry-After hint sent with the 503
+  INFERENCE_BATCH_WINDOW_MS   how long the first request in a batch waits for company
+  INFERENCE_MAX_BATCH_SIZE    hard cap on rows per invoke
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+INFERENCE_NUM_THREADS = int(os.getenv("INFERENCE_NUM_THREADS", "2"))
+INFERENCE_WORKERS     = int(os.getenv("INFERENCE_WORKERS", str(max((os.cpu_count() or 1) // INFERENCE_NUM_THREADS, 1))))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "64"))
+RETRY_AFTER_S         = int(os.getenv("INFERENCE_RETRY_AFTER_S", "2"))
+BATCH_WINDOW_MS       = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE        = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the inference executor cannot admit another request."""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_S):
+        super().__init__("Inference capacity exhausted. Please retry shortly.")
+        self.retry_after = retry_after
+
+
+class PooledInterpreter:
+    """
+    One preloaded interpreter with its tensor indices resolved at load time.
+    `invoke()` takes uint8 RGB rows and writes them straight into the
+    interpreter's own input buffer (normalising to [0, 1] on the way for
+    float models), so no intermediate float32 batch is ever allocated.
+    """
+
+    def __init__(self, model_path: str, num_threads: int):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        input_details     = self.interpreter.get_input_details()[0]
+        self.input_index  = input_details['index']
+        self.input_dtype  = input_details['dtype']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.batch_size   = int(input_details['shape'][0])
+        self.row_shape    = tuple(int(d) for d in input_details['shape'][1:])
+        self.resizes      = 0
+
+    def _fill_input(self, rows: List[np.ndarray]):
+        # The view must be released before invoke(): TFLite refuses to run
+        # while numpy still references its internal buffers.
+        view = self.interpreter.tensor(self.input_index)()
+        for i, row in enumerate(rows):
+            if np.issubdtype(self.input_dtype, np.floating):
+                np.divide(row, 255.0, out=view[i], dtype=self.input_dtype)
+            else:
+                view[i] = row
+
+    def invoke(self, rows: List[np.ndarray]) -> np.ndarray:
+        n = len(rows)
+        if n != self.batch_size:
+            # InterpreterPool.checkout() routes batches to a slot already at
+            # their size, so this only runs when no such slot is idle
+            self.interpreter.resize_tensor_input(self.input_index, [n, *self.row_shape])
+            self.interpreter.allocate_tensors()
+            self.batch_size = n
+            self.resizes += 1
+        self._fill_input(rows)
+        self.interpreter.invoke()
+        # Output buffer is reused by the next invoke, so this (N x 7) copy is the only one
+        return self.interpreter.tensor(self.output_index)().copy()
+
+
+class InterpreterPool:
+    """
+    N preloaded interpreters with check-out/check-in semantics.
+    `tf.lite.Interpreter` is not thread-safe, so a caller must hold an
+    interpreter exclusively for the duration of an invoke:
+
+        with pool.checkout(len(batch)) as slot:
+            scores = slot.invoke(batch)
+
+    Each interpreter stays allocated for the batch size it last ran, and
+    checkout prefers an idle one already at the requested size, so under
+    mixed load the slots settle on the common sizes instead of resizing
+    (resize_tensor_input + allocate_tensors) on most batches. Padding
+    batches up to fixed sizes, or one interpreter per size, was measured
+    to cost more: padding adds a full row of compute, and extra
+    interpreters each pack their own copy of the weights.
+
+    Safe to use from any thread, including FastAPI's sync threadpool.
+    """
+
+    def __init__(self, model_path: str, size: int = INFERENCE_WORKERS,
+                 num_threads: int = INFERENCE_NUM_THREADS):
+        self.size        = max(size, 1)
+        self.num_threads = max(num_threads, 1)
+        self._all        = [PooledInterpreter(model_path, self.num_threads) for _ in range(self.size)]
+        self._idle       = list(self._all)          # longest idle first
+        self._cond       = threading.Condition()
+        self.size_hits   = 0
+
+    @contextmanager
+    def checkout(self, batch_size: Optional[int] = None, timeout: Optional[float] = None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._idle, timeout):
+                raise ExecutorSaturated()
+            slot = next((s for s in self._idle if s.batch_size == batch_size), None)
+            if slot is not None:
+                self.size_hits += 1
+            else:
+                slot = self._idle[0]
+            self._idle.remove(slot)
+        try:
+            yield slot
+        finally:
+            with self._cond:
+                self._idle.append(slot)
+                self._cond.notify()
+
+    def stats(self) -> dict:
+        return {
+            "size":        self.size,
+            "num_threads": self.num_threads,
+            "idle":        len(self._idle),
+            "batch_sizes": [slot.batch_size for slot in self._all],
+            "size_hits":   self.size_hits,
+            "resizes":     sum(slot.resizes for slot in self._all),
+        }
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for CPU-heavy work (decode, resize, invoke), sized to
+    match the interpreter pool so every worker can always check one out.
+    Admission is capped by `max_pending`; beyond that `admit()` raises
+    ExecutorSaturated instead of letting requests pile up behind the pool.
+    """
+
+    def __init__(self, model_path: str, workers: int = INFERENCE_WORKERS,
+                 max_pending: int = INFERENCE_MAX_PENDING,
+                 num_threads: int = INFERENCE_NUM_THREADS):
+        self.interpreters = InterpreterPool(model_path, workers, num_threads)
+        self.workers      = self.interpreters.size
+        self.max_pending  = max(max_pending, 1)
+
+        self._pool      = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock      = threading.Lock()
+        self._in_flight = 0
+        self.rejected   = 0
+
+    # ── Admission control ─────────────────────────────────────────────────────
+    def acquire(self, n: int = 1):
+        """Reserve `n` admission slots or raise ExecutorSaturated. Pair with release(n)."""
+        with self._lock:
+            if self._in_flight + n > self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated()
+            self._in_flight += n
+
+    def release(self, n: int = 1):
+        with self._lock:
+            self._in_flight -= n
+
+    @contextmanager
+    def admit(self, n: int = 1):
+        self.acquire(n)
+        try:
+            yield
+        finally:
+            self.release(n)
+
+    async def run(self, fn, *args):
+        """Run `fn(*args)` on an inference worker thread and await the result."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers":      self.workers,
+            "max_pending":  self.max_pending,
+            "in_flight":    self._in_flight,
+            "rejected":     self.rejected,
+            "interpreters": self.interpreters.stats(),
+        }
+
+    # ── Worker-side inference ─────────────────────────────────────────────────
+    def invoke(self, rows: List[np.ndarray]) -> np.ndarray:
+        """Run uint8 (H, W, C) rows as one batch on a checked-out interpreter."""
+        with self.interpreters.checkout(len(rows)) as slot:
+            return slot.invoke(rows)
+
+
+class BatchScheduler:
+    """
+    Requests call `await submit(row)` with one preprocessed uint8 (H, W, C) image.
+    A background task drains the queue: it waits at most `window_ms` after
+    the first row arrives (or until `max_batch_size` rows are queued), then
+    hands the batch to the executor and gives every caller its own
+    row of the output. At most one batch per executor worker is in flight;
+    while they are all busy the queue keeps filling, so batches grow under load.
+    """
+
+    def __init__(self, executor: InferenceExecutor, window_ms: float = BATCH_WINDOW_MS,
+                 max_batch_size: int = MAX_BATCH_SIZE):
+        self.executor       = executor
+        self.window_s       = max(window_ms, 0.0) / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+
+        self._queue: Optional[asyncio.Queue]     = None
+        self._task:  Optional[asyncio.Task]      = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatches: set = set()           # strong refs: the loop only keeps weak ones
+
+        # ── Metrics ───────────────────────────────────────────────────────────
+        self.batch_size_hist:  Counter = Counter()
+        self.queue_depth_hist: Counter = Counter()
+        self.total_requests  = 0
+        self.total_batches   = 0
+        self.max_queue_depth = 0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.executor.workers)
+            self._task  = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # In-flight batches fail their callers rather than leave them waiting
+        for task in list(self._dispatches):
+            task.cancel()
+        await asyncio.gather(*self._dispatches, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(ExecutorSaturated())
+
+    # ── Public API ────────────────────────────────────────────────────────────
+    async def submit(self, row: np.ndarray) -> np.ndarray:
+        """Queue one preprocessed uint8 image and wait for its output row."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        self.total_requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batch_window_ms":  self.window_s * 1000.0,
+            "max_batch_size":   self.max_batch_size,
+            "queue_depth":      self._queue.qsize() if self._queue else 0,
+            "max_queue_depth":  self.max_queue_depth,
+            "total_requests":   self.total_requests,
+            "total_batches":    self.total_batches,
+            "batch_size_histogram":  dict(sorted(self.batch_size_hist.items())),
+            "queue_depth_histogram": dict(sorted(self.queue_depth_hist.items())),
+            "executor":         self.executor.stats(),
+        }
+
+    # ── Batching loop ─────────────────────────────────────────────────────────
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        batch    = [await self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Drain anything that is already waiting without extending the window
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            self.queue_depth_hist[self._queue.qsize()] += 1
+            self.batch_size_hist[len(batch)] += 1
+            self.total_batches += 1
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        futures = [fut for _, fut in batch]
+        try:
+            output_data = await self.executor.run(self.executor.invoke, [row for row, _ in batch])
+        except asyncio.CancelledError:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(ExecutorSaturated())
+            raise
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for i, fut in enumerate(futures):
+            if not fut.done():
+                fut.set_result(output_data[i])
@@ -1,35 +1,62 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
-import tensorflow as tf
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import numpy as np
-import cv2
+import asyncio
+import base64
+import hashlib
 import os
 import time
 import uuid
 import json
-from typing import Optional
-from sqlalchemy.orm import Session
-
-from database import engine, SessionLocal
-from models import Base          # ✅ FIXED: import Base from models.base
-from models.user import User
-from models.images import Image
-from models.prediciton import Prediction
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+
+from database import engine, async_engine, SessionLocal, AsyncSessionLocal, pool_stats
+from models.prediciton import Prediction, SCORE_LABELS
+from models.base import ist_now
 import auth
-from auth import get_current_user
+import migrate
+from passwords import hasher
+from blob_store import BlobStore
+from cache import TTLCache
+from auth import Principal, get_current_user, get_db
+from image_io import decode_for_model
+from inference import InferenceExecutor, BatchScheduler, ExecutorSaturated
+from persistence import ScanWriter, ScanRecord
+from upload_ingest import UploadSizeLimitMiddleware, UploadRejected, read_upload, MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD
+from prediction_cache import PredictionCache, model_fingerprint
+from report_cache import report_cache, report_scan_data, report_user_data
+from report_export import export_pdf, export_zip, history_rows
+from report_workers import report_pool
+from report_jobs import JOB_KINDS, EXTENSIONS, ReportJobQueue, job_view
 
 app = FastAPI(title="DermAssist AI Backend", version="2.0.0")
 
-# ── Create all tables on startup ──────────────────────────────────────────────
-Base.metadata.create_all(bind=engine)
+# ── Bring the schema up to date (see migrate.py / alembic.ini) ─────────────────
+if migrate.DB_AUTO_MIGRATE:
+    migrate.upgrade_database(engine)
 
 # ── Static file serving ───────────────────────────────────────────────────────
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_DIR       = "uploads"
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "16"))
+blob_store = BlobStore(UPLOAD_DIR)
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
+# ── Upload size guard (rejects before the multipart body is buffered) ──────────
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/predict":       MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/predict/batch": (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD) * BATCH_MAX_IMAGES,
+    },
+)
+
 # ── CORS ──────────────────────────────────────────────────────────────────────
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +64,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Content-Range", "Content-Disposition"],
 )
 
 # ── Auth router ───────────────────────────────────────────────────────────────
@@ -45,221 +73,486 @@ app.include_router(auth.router)
 # ── TFLite model loading ──────────────────────────────────────────────────────
 # ✅ FIXED: replaced tf.keras.models.load_model (wrong for .tflite)
 #           with tf.lite.Interpreter (correct for .tflite files)
-MODEL_PATH  = "skin_cancer_model.tflite"
-interpreter = None
+# Inference (decode + invoke) runs on a bounded executor with one interpreter
+# per worker thread, so the event loop stays free for /health and auth.
+MODEL_PATH    = "skin_cancer_model.tflite"
+MODEL_VERSION = "v2.0"
+executor:         Optional[InferenceExecutor] = None
+scheduler:        Optional[BatchScheduler]    = None
+prediction_cache: Optional[PredictionCache]   = None
+
+# Scan rows are written behind the request by a background batch writer
+scan_writer = ScanWriter(SessionLocal)
 
 if not os.path.exists(MODEL_PATH):
     print(f"WARNING: Model file '{MODEL_PATH}' not found.")
 else:
     try:
-        interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-        interpreter.allocate_tensors()
+        executor  = InferenceExecutor(MODEL_PATH)
+        scheduler = BatchScheduler(executor)
+        prediction_cache = PredictionCache(model_fingerprint(MODEL_PATH, MODEL_VERSION))
         print("✅ TFLite model loaded successfully.")
     except Exception as e:
         print(f"❌ Error loading TFLite model: {e}")
 
 
-# ── DB dependency ─────────────────────────────────────────────────────────────
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+maintenance_tasks: List[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    scan_writer.start()
+    hasher.start()
+    report_cache.start(report_pool)
+    if scheduler is not None:
+        scheduler.start()
+    # Load existing revocations before serving, then keep them in sync
+    await auth.revocation_store.sync()
+    maintenance_tasks.append(asyncio.create_task(auth.revocation_store.run()))
+    maintenance_tasks.append(asyncio.create_task(auth.reset_store.run()))
+    maintenance_tasks.append(asyncio.create_task(auth.email_outbox.run()))
+    maintenance_tasks.append(asyncio.create_task(asyncio.to_thread(report_cache.prune_stale_templates)))
+    maintenance_tasks.append(asyncio.create_task(report_jobs.run()))
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    if scheduler is not None:
+        await scheduler.stop()
+    if executor is not None:
+        executor.shutdown()
+    for task in maintenance_tasks:
+        task.cancel()
+    maintenance_tasks.clear()
+    hasher.shutdown()
+    await asyncio.to_thread(scan_writer.stop)
+    report_cache.shutdown()
+    report_pool.shutdown()
+    await report_jobs.shutdown()
+    await auth.email_outbox.shutdown()
+    await async_engine.dispose()
 
 
 # ── Image preprocessing ───────────────────────────────────────────────────────
+# Returns uint8 RGB pixels at 128×128 (JPEGs are downscaled during decode,
+# see image_io.py); normalisation to [0, 1] happens while the interpreter
+# wrapper copies them into its input tensor (see inference.py).
 def preprocess_image(image_data: bytes) -> np.ndarray:
-    nparr = np.frombuffer(image_data, np.uint8)
-    img   = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    if img is None:
-        raise ValueError("Could not decode image. Please upload a valid JPEG or PNG.")
-    img      = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img      = cv2.resize(img, (128, 128))          # TFLite model expects 128×128
-    img_arr  = img.astype('float32') / 255.0
-    return np.expand_dims(img_arr, axis=0)
+    return decode_for_model(image_data)
+
+
+async def run_inference(contents: bytes) -> Tuple[np.ndarray, bool]:
+    """
+    Classify one upload. Returns (class scores, served_from_cache).
+    Identical bytes seen before are answered from the prediction cache;
+    otherwise decode + invoke run on the inference executor.
+    """
+    key, cached = await asyncio.to_thread(prediction_cache.lookup, contents)
+    if cached is not None:
+        return np.asarray(cached, dtype=np.float32), True
+
+    with executor.admit():
+        pixels = await executor.run(preprocess_image, contents)
+        scores = await scheduler.submit(pixels)
+    await asyncio.to_thread(prediction_cache.put, key, scores.tolist())
+    return scores, False
 
 
 # ── Root & health endpoints ───────────────────────────────────────────────────
 @app.get("/")
-def root():
+async def root():
     return {
         "message":      "DermAssist AI Backend is running.",
-        "model_loaded": interpreter is not None,
+        "model_loaded": executor is not None,
     }
 
 
 @app.get("/health")
-def health_check():
-    return {"status": "ok", "model_loaded": interpreter is not None}
+async def health_check():
+    return {"status": "ok", "model_loaded": executor is not None}
+
+
+@app.get("/metrics/inference")
+async def inference_metrics():
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Model not loaded. Please check server logs.")
+    return {**scheduler.stats(), "cache": prediction_cache.stats()}
+
+
+@app.get("/metrics/db")
+async def db_metrics():
+    return {
+        **pool_stats(async_engine),
+        "sync":            pool_stats(engine),
+        "scan_writer":     scan_writer.stats(),
+        "report_cache":    report_cache.stats(),
+        "report_pool":     report_pool.stats(),
+        "report_jobs":     report_jobs.stats(),
+        "principal_cache": auth.principal_cache.stats(),
+        "revocations":     auth.revocation_store.stats(),
+        "reset_tokens":    auth.reset_store.stats(),
+        "email_outbox":    auth.email_outbox.stats(),
+    }
+
+
+# ── Class metadata ────────────────────────────────────────────────────────────
+CLASSES = list(SCORE_LABELS)     # model output order
+
+RISK_MAP = {
+    'mel': 'High Risk',      'bcc': 'High Risk',      'akiec': 'High Risk',
+    'bkl': 'Moderate Risk',  'df':  'Moderate Risk',  'vasc':  'Moderate Risk',
+    'nv':  'Low Risk',
+}
+NAME_MAP = {
+    'mel':   'Melanoma',
+    'bcc':   'Basal Cell Carcinoma',
+    'akiec': 'Actinic Keratosis',
+    'bkl':   'Benign Keratosis',
+    'df':    'Dermatofibroma',
+    'vasc':  'Vascular Lesion',
+    'nv':    'Melanocytic Nevi',
+}
+
+
+def summarise_scores(scores) -> dict:
+    """Turn one row of model output into the public prediction fields."""
+    idx        = int(np.argmax(scores))
+    prediction = CLASSES[idx]
+    return {
+        "diagnosis":      prediction,
+        "diagnosis_name": NAME_MAP[prediction],
+        "risk_level":     RISK_MAP[prediction],
+        "confidence":     round(float(scores[idx]), 4),
+        "all_scores":     {
+            CLASSES[i]: round(float(scores[i]), 4)
+            for i in range(len(CLASSES))
+        },
+    }
+
+
+async def store_scan(user: Principal, contents: bytes, content_type: str,
+                     result: dict, processing_ms: int) -> Tuple[str, ScanRecord]:
+    """Store the image blob and build the row data for the scan writer. Returns (image_url, record)."""
+    blob      = await asyncio.to_thread(blob_store.put, contents, content_type)
+    image_url = f"/uploads/{blob.url_path}"
+    record    = ScanRecord(
+        scan_uid=uuid.uuid4().hex,
+        user_id=user.id,
+        image_name=blob.name,
+        image_path=blob.path,
+        image_format=content_type,
+        image_size_kb=len(contents) // 1024,
+        predicted_label=result["diagnosis"],
+        confidence_score=result["confidence"],
+        model_version=MODEL_VERSION,
+        processing_time_ms=processing_ms,
+        risk_level=result["risk_level"],
+        diagnosis_name=result["diagnosis_name"],
+        image_url=image_url,
+        scores=[result["all_scores"][label] for label in CLASSES],
+        created_at=ist_now().isoformat(),
+    )
+    return image_url, record
 
 
 # ── Predict endpoint ──────────────────────────────────────────────────────────
 @app.post("/predict")
 async def predict(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    current_user: Optional[Principal] = Depends(get_current_user)
 ):
-    # ✅ FIXED: check interpreter instead of model
-    if interpreter is None:
+    if executor is None:
         raise HTTPException(status_code=503, detail="Model not loaded. Please check server logs.")
-    if file.content_type not in ["image/jpeg", "image/png"]:
-        raise HTTPException(status_code=400, detail="Only JPEG and PNG images are accepted.")
-
-    contents = await file.read()
-
     try:
-        input_data = preprocess_image(contents)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        contents, content_type = await read_upload(file)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    # ✅ FIXED: TFLite inference (was model.predict which only works for Keras)
+    # Decode + TFLite inference off the event loop, batched with concurrent requests
     start_time = time.time()
     try:
-        input_details  = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-        interpreter.set_tensor(input_details[0]['index'], input_data.astype(np.float32))
-        interpreter.invoke()
-        output_data = interpreter.get_tensor(output_details[0]['index'])
+        scores, cached = await run_inference(contents)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
 
     processing_ms = int((time.time() - start_time) * 1000)
+    result        = summarise_scores(scores)
 
-    classes    = ['akiec', 'bcc', 'bkl', 'df', 'mel', 'nv', 'vasc']
-    idx        = int(np.argmax(output_data))
-    prediction = classes[idx]
-    confidence = float(output_data[0][idx])
-
-    risk_map = {
-        'mel': 'High Risk',      'bcc': 'High Risk',      'akiec': 'High Risk',
-        'bkl': 'Moderate Risk',  'df':  'Moderate Risk',  'vasc':  'Moderate Risk',
-        'nv':  'Low Risk',
-    }
-    name_map = {
-        'mel':   'Melanoma',
-        'bcc':   'Basal Cell Carcinoma',
-        'akiec': 'Actinic Keratosis',
-        'bkl':   'Benign Keratosis',
-        'df':    'Dermatofibroma',
-        'vasc':  'Vascular Lesion',
-        'nv':    'Melanocytic Nevi',
-    }
-
-    # ── Save scan if user is logged in ────────────────────────────────────────
+    # ── Save scan if user is logged in (DB write happens behind the response) ──
     image_url = None
+    scan_uid  = None
     if current_user:
         try:
-            ext = (
-                file.filename.split('.')[-1]
-                if file.filename and '.' in file.filename
-                else 'jpg'
-            ).lower()
-            image_name = f"{uuid.uuid4().hex}.{ext}"
-            image_path = os.path.join(UPLOAD_DIR, image_name)
-
-            with open(image_path, "wb") as f:
-                f.write(contents)
-
-            image_url = f"/uploads/{image_name}"
-
-            image_record = Image(
-                image_name=image_name,
-                image_path=image_path,
-                image_format=file.content_type,
-                image_size_kb=len(contents) // 1024,
-                user_id=current_user.id,
-            )
-            db.add(image_record)
-            db.flush()
-
-            scan_record = Prediction(
-                predicted_label=prediction,
-                confidence_score=round(confidence, 4),
-                model_version="v2.0",
-                processing_time_ms=processing_ms,
-                raw_output=json.dumps({
-                    classes[i]: round(float(output_data[0][i]), 4)
-                    for i in range(len(classes))
-                }),
-                extra_metadata=json.dumps({
-                    "risk_level":     risk_map[prediction],
-                    "diagnosis_name": name_map[prediction],
-                    "image_url":      image_url,
-                }),
-                status="completed",
-                user_id=current_user.id,
-                image_id=image_record.id,
-            )
-            db.add(scan_record)
-            db.commit()
+            image_url, record = await store_scan(current_user, contents, content_type, result, processing_ms)
+            scan_writer.submit(record)
+            scan_uid = record.scan_uid
         except Exception as e:
-            db.rollback()
-            print(f"⚠ Could not save scan to DB: {e}")
+            image_url = None
+            print(f"⚠ Could not save scan: {e}")
 
     return {
-        "diagnosis":      prediction,
-        "diagnosis_name": name_map[prediction],
-        "risk_level":     risk_map[prediction],
-        "confidence":     round(confidence, 4),
-        "all_scores":     {
-            classes[i]: round(float(output_data[0][i]), 4)
-            for i in range(len(classes))
-        },
+        **result,
         "image_url": image_url,
+        "scan_id":   scan_uid,
+        "cached":    cached,
     }
 
 
+# ── Batch predict endpoint ────────────────────────────────────────────────────
+@app.post("/predict/batch")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    current_user: Optional[Principal] = Depends(get_current_user)
+):
+    """
+    Classify several photos from one visit in a single request.
+    Streams one NDJSON line per image as soon as its result is known: cache
+    hits and unreadable files first, then everything that went through the
+    single batched invoke. All scans are persisted in one transaction.
+    """
+    if executor is None:
+        raise HTTPException(status_code=503, detail="Model not loaded. Please check server logs.")
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IMAGES} images per batch.")
+
+    # Admit the batch before reading any upload. The multipart parser has
+    # spooled the files, and FastAPI keeps them open until the response is
+    # sent, so each one is read only when prepare() gets to it.
+    slots = min(len(files), executor.max_pending)
+    try:
+        executor.acquire(slots)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    # The slots go back when the stream ends, or, if the client disconnects
+    # before the stream ever starts, when the response's background task runs
+    # (Starlette runs it after a disconnect too). Whichever comes first wins.
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            executor.release(slots)
+
+    reading = asyncio.Semaphore(executor.workers)
+    kept    = {}                    # index -> (bytes, MIME type), held only to store the scan
+
+    async def prepare(i: int):
+        """Read, cache lookup + decode for one image. Returns (index, key, scores, pixels, error)."""
+        async with reading:
+            try:
+                contents, content_type = await read_upload(files[i])
+                if current_user:
+                    kept[i] = (contents, content_type)
+                key, cached = await asyncio.to_thread(prediction_cache.lookup, contents)
+                if cached is not None:
+                    return i, key, np.asarray(cached, dtype=np.float32), None, None
+                return i, key, None, await executor.run(preprocess_image, contents), None
+            except UploadRejected as e:
+                return i, None, None, None, e.detail
+            except ValueError as e:
+                return i, None, None, None, str(e)
+
+    async def stream():
+        start_time = time.time()
+        records    = []
+
+        async def emit(i: int, scores=None, error: Optional[str] = None, cached: bool = False) -> str:
+            filename = files[i].filename
+            contents, content_type = kept.pop(i, (None, None))
+            if error:
+                return json.dumps({"index": i, "filename": filename, "error": error}) + "\n"
+            processing_ms = int((time.time() - start_time) * 1000)
+            result    = summarise_scores(scores)
+            image_url = scan_uid = None
+            if current_user:
+                try:
+                    image_url, record = await store_scan(current_user, contents, content_type, result, processing_ms)
+                    records.append(record)
+                    scan_uid = record.scan_uid
+                except Exception as e:
+                    print(f"⚠ Could not save scan: {e}")
+            return json.dumps({
+                "index": i, "filename": filename, **result,
+                "image_url": image_url, "scan_id": scan_uid, "cached": cached,
+            }) + "\n"
+
+        try:
+            to_infer = []
+            for done in asyncio.as_completed([prepare(i) for i in range(len(files))]):
+                i, key, scores, pixels, error = await done
+                if pixels is not None:
+                    to_infer.append((i, key, pixels))
+                else:
+                    yield await emit(i, scores, error, cached=scores is not None)
+
+            if to_infer:
+                try:
+                    output = await executor.run(executor.invoke, [p for _, _, p in to_infer])
+                except Exception as e:
+                    for i, _, _ in to_infer:
+                        yield await emit(i, error=f"Inference failed: {str(e)}")
+                else:
+                    for (i, key, _), scores in zip(to_infer, output):
+                        await asyncio.to_thread(prediction_cache.put, key, scores.tolist())
+                        yield await emit(i, scores)
+        finally:
+            release()
+            scan_writer.submit_many(records)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+
 # ── User scan history ─────────────────────────────────────────────────────────
+# Keyset-paginated on (created_at, id) so deep pages cost the same as the
+# first one. The ETag is derived from a per-user history version kept in a
+# short-lived cache: the scan writer drops a user's entry whenever it commits
+# their scans, and the TTL bounds staleness for writes made by other workers.
+# While the entry is cached, If-None-Match is answered without touching the DB.
+SCANS_PAGE_DEFAULT  = 50
+SCANS_PAGE_MAX      = 200
+HISTORY_ETAG_TTL_S  = float(os.getenv("HISTORY_ETAG_TTL_S", "30"))
+history_versions    = TTLCache(maxsize=50_000, ttl=HISTORY_ETAG_TTL_S)
+
+
+def _invalidate_history(records):
+    for user_id in {r.user_id for r in records}:
+        history_versions.pop(user_id)
+
+
+scan_writer.add_listener(_invalidate_history)
+scan_writer.add_listener(report_cache.prerender)
+
+
+async def history_version(db: AsyncSession, user_id: int) -> str:
+    version = history_versions.get(user_id)
+    if version is None:
+        count, last_id = (await db.execute(
+            select(func.count(Prediction.id), func.max(Prediction.id))
+            .where(Prediction.user_id == user_id)
+        )).one()
+        version = f"{count}-{last_id or 0}"
+        history_versions.set(user_id, version)
+    return version
+
+
+def encode_cursor(created_at: datetime, scan_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{scan_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, scan_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(scan_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @app.get("/user/scans")
-def get_user_scans(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_user_scans(
+    request: Request,
+    response: Response,
+    limit: int = Query(SCANS_PAGE_DEFAULT, ge=1, le=SCANS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    scans = (
-        db.query(Prediction)
-        .filter(Prediction.user_id == current_user.id)
-        .order_by(Prediction.created_at.desc())
-        .all()
+    version = await history_version(db, current_user.id)
+    etag    = '"' + hashlib.sha1(f"{current_user.id}:{version}:{limit}:{cursor}".encode()).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    query = (
+        select(
+            Prediction.id,
+            Prediction.predicted_label,
+            Prediction.confidence_score,
+            Prediction.risk_level,
+            Prediction.diagnosis_name,
+            Prediction.image_url,
+            Prediction.processing_time_ms,
+            Prediction.created_at,
+        )
+        .where(Prediction.user_id == current_user.id)
     )
-
-    result = []
-    for scan in scans:
-        extra = {}
-        try:
-            extra = json.loads(scan.extra_metadata) if scan.extra_metadata else {}
-        except Exception:
-            pass
-        result.append({
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Prediction.created_at < after_created,
+            and_(Prediction.created_at == after_created, Prediction.id < after_id),
+        ))
+    scans = (await db.execute(
+        query
+        .order_by(Prediction.created_at.desc(), Prediction.id.desc())
+        .limit(limit + 1)
+    )).all()
+
+    response.headers["ETag"] = etag
+    if len(scans) > limit:
+        scans = scans[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(scans[-1].created_at, scans[-1].id)
+
+    return [
+        {
             "id":                 scan.id,
             "predicted_label":    scan.predicted_label,
             "confidence_score":   scan.confidence_score,
-            "risk_level":         extra.get("risk_level", ""),
-            "diagnosis_name":     extra.get("diagnosis_name", scan.predicted_label),
-            "image_url":          extra.get("image_url", None),
+            "risk_level":         scan.risk_level or "",
+            "diagnosis_name":     scan.diagnosis_name or scan.predicted_label,
+            "image_url":          scan.image_url,
             "processing_time_ms": scan.processing_time_ms,
             "created_at":         str(scan.created_at),
-        })
-    return result
+        }
+        for scan in scans
+    ]
+
+
+# ── Resolve a scan ID returned by /predict ────────────────────────────────────
+@app.get("/user/scans/uid/{scan_uid}")
+async def resolve_scan(
+    scan_uid: str,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    scan = (await db.execute(select(Prediction.id).where(
+        Prediction.scan_uid == scan_uid,
+        Prediction.user_id == current_user.id
+    ))).first()
+    if scan:
+        return {"scan_id": scan_uid, "id": scan.id, "status": "saved"}
+    if scan_writer.is_pending(scan_uid):
+        response.status_code = 202
+        return {"scan_id": scan_uid, "id": None, "status": "pending"}
+    raise HTTPException(status_code=404, detail="Scan not found")
 
 
 # ── Full user profile ─────────────────────────────────────────────────────────
 @app.get("/user/me")
-def get_full_profile(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_full_profile(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    total_scans = (
-        db.query(Prediction)
-        .filter(Prediction.user_id == current_user.id)
-        .count()
+    total_scans = await db.scalar(
+        select(func.count())
+        .select_from(Prediction)
+        .where(Prediction.user_id == current_user.id)
     )
 
     return {
@@ -277,58 +570,167 @@ def get_full_profile(
     }
 
 # ── Download PDF report for a single scan ─────────────────────────────────────
+# Reports are rendered once and served from disk (see report_cache.py); the
+# ETag changes only with the template or the owner's profile.
 @app.get("/user/scans/{scan_id}/report")
-def download_scan_report(
+async def download_scan_report(
     scan_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    from report_generator import generate_scan_report
-    from io import BytesIO
-
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    scan = db.query(Prediction).filter(
+    scan = (await db.execute(select(Prediction).where(
         Prediction.id == scan_id,
         Prediction.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
 
     if not scan:
         raise HTTPException(status_code=404, detail="Scan not found")
 
-    extra = {}
-    try:
-        extra = json.loads(scan.extra_metadata) if scan.extra_metadata else {}
-    except Exception:
-        pass
-
-    scan_data = {
-        "id":               scan.id,
-        "predicted_label":  scan.predicted_label,
-        "confidence_score": scan.confidence_score,
-        "risk_level":       extra.get("risk_level", "Low Risk"),
-        "diagnosis_name":   extra.get("diagnosis_name", scan.predicted_label),
-        "created_at":       str(scan.created_at),
-        "raw_output":       scan.raw_output or "{}",
-    }
-
-    user_data = {
-        "full_name":    current_user.full_name,
-        "email":        current_user.email,
-        "date_of_birth": str(current_user.date_of_birth) if current_user.date_of_birth else "N/A",
-        "gender":       current_user.gender or "N/A",
-        "phone_number": current_user.phone_number or "N/A",
-    }
+    scan_data = report_scan_data(scan)
+    user_data = report_user_data(current_user)
 
-    try:
-        pdf_bytes = generate_scan_report(scan_data, user_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Report generation failed: {str(e)}")
+    report, exists = report_cache.lookup(current_user.id, scan_data, user_data)
+    if request.headers.get("if-none-match") == report.etag:
+        return Response(status_code=304, headers={"ETag": report.etag})
+    if not exists:
+        try:
+            await report_cache.render_with(report_pool, current_user.id, scan_data, user_data)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Report generation failed: {str(e)}")
 
     filename = f"DermAssist_Report_{current_user.username}_Scan{scan_id}.pdf"
-    return StreamingResponse(
-        BytesIO(pdf_bytes),
+    return FileResponse(
+        report.path,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
\ No newline at end of file
+        filename=filename,
+        headers={"ETag": report.etag, "Cache-Control": "private, no-cache"},
+    )
+
+
+# ── Export a user's whole history ─────────────────────────────────────────────
+# One consolidated PDF (summary + every report) or a ZIP of per-scan PDFs,
+# streamed while the reports render (see report_export.py).
+@app.get("/user/scans/export")
+async def export_scan_history(
+    format: str = Query("pdf", pattern="^(pdf|zip)$"),
+    current_user: Principal = Depends(get_current_user),
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    rows = await history_rows(current_user.id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No scans to export")
+
+    filename = f"DermAssist_History_{current_user.username}.{format}"
+    if format == "zip":
+        body, media_type = export_zip(current_user, rows), "application/zip"
+    else:
+        body, media_type = export_pdf(current_user, rows), "application/pdf"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ── Report jobs ───────────────────────────────────────────────────────────────
+# Submit a render, poll (or long-poll with ?wait=) its status, then download
+# the result. Jobs are persisted and run on their own process pool, so a
+# clinic bulk-exporting histories does not hold up interactive requests
+# (see report_jobs.py).
+REPORT_JOB_MAX_WAIT_S = float(os.getenv("REPORT_JOB_MAX_WAIT_S", "30"))
+report_jobs = ReportJobQueue(AsyncSessionLocal)
+
+
+class ReportJobRequest(BaseModel):
+    kind:    str = "scan"
+    scan_id: Optional[int] = None
+
+
+def _job_response(job) -> dict:
+    view = job_view(job)
+    view["download_url"] = f"/reports/jobs/{job.id}/download" if job.status == "done" else None
+    return view
+
+
+@app.post("/reports/jobs", status_code=202)
+async def submit_report_job(
+    body: ReportJobRequest,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if body.kind not in JOB_KINDS:
+        raise HTTPException(status_code=422, detail=f"kind must be one of: {', '.join(JOB_KINDS)}")
+
+    if body.kind == "scan":
+        if body.scan_id is None:
+            raise HTTPException(status_code=422, detail="scan_id is required for a scan report")
+        owned = await db.scalar(select(Prediction.id).where(
+            Prediction.id == body.scan_id,
+            Prediction.user_id == current_user.id
+        ))
+        if owned is None:
+            raise HTTPException(status_code=404, detail="Scan not found")
+    else:
+        has_scans = await db.scalar(select(Prediction.id).where(Prediction.user_id == current_user.id).limit(1))
+        if has_scans is None:
+            raise HTTPException(status_code=404, detail="No scans to export")
+
+    job = await report_jobs.submit(current_user.id, body.kind, body.scan_id if body.kind == "scan" else None)
+    if job is None:
+        raise HTTPException(status_code=429, detail="Too many report jobs in progress. Try again later.")
+    return {**job, "status_url": f"/reports/jobs/{job['job_id']}"}
+
+
+@app.get("/reports/jobs/{job_id}")
+async def get_report_job(
+    job_id: str,
+    wait: float = Query(0, ge=0),
+    current_user: Principal = Depends(get_current_user),
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    if wait > 0:
+        job = await report_jobs.wait(job_id, current_user.id, min(wait, REPORT_JOB_MAX_WAIT_S))
+    else:
+        job = await report_jobs.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_response(job)
+
+
+@app.get("/reports/jobs/{job_id}/download")
+async def download_report_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_user),
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    job = await report_jobs.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    if not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=410, detail="Report job result has expired")
+
+    ext = EXTENSIONS[job.kind]
+    if job.kind == "scan":
+        filename = f"DermAssist_Report_{current_user.username}_Scan{job.scan_id}.pdf"
+    else:
+        filename = f"DermAssist_History_{current_user.username}.{ext}"
+    return FileResponse(
+        job.result_path,
+        media_type="application/zip" if ext == "zip" else "application/pdf",
+        filename=filename,
+        headers={"ETag": f'"{job.id}"', "Cache-Control": "private, no-cache"},
+    )
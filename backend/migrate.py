@@ -0,0 +1,46 @@
+"""
+DermAssist AI — Schema migrations
+Wraps Alembic (alembic.ini + migrations/) so the app can bring the database
+to the latest revision on startup, the way create_all() used to.
+
+Databases created by create_all() before migrations existed have tables but
+no alembic_version row; they are stamped at the baseline revision first and
+then upgraded like any other.
+
+With several uvicorn workers, run `alembic upgrade head` once before starting
+them and set DB_AUTO_MIGRATE=0, so workers do not race each other on DDL.
+
+Config (env vars):
+  DB_AUTO_MIGRATE   run pending migrations at import time (default on)
+"""
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+
+BASELINE_REVISION = "0001_baseline"
+ALEMBIC_INI       = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def alembic_config() -> Config:
+    return Config(ALEMBIC_INI)
+
+
+def upgrade_database(engine, revision: str = "head"):
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = set(inspect(connection).get_table_names())
+        if "alembic_version" not in tables and "predictions" in tables:
+            print("⚠ Existing schema has no migration history; stamping it at the baseline")
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade_database(engine)
+    print("✅ Database schema is up to date")
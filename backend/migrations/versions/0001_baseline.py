@@ -0,0 +1,76 @@
+"""Baseline: users, images and predictions as originally created by create_all()
+
+Databases created before migrations existed are stamped at this revision
+by migrate.upgrade_database() and upgraded from here.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("full_name", sa.String(150), nullable=False),
+        sa.Column("username", sa.String(80), nullable=False),
+        sa.Column("email", sa.String(150), nullable=False),
+        sa.Column("phone_number", sa.String(15)),
+        sa.Column("gender", sa.String(20)),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("role", sa.String(20)),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_verified", sa.Boolean()),
+        sa.Column("bio", sa.Text()),
+        sa.Column("profile_picture", sa.String(255)),
+        sa.Column("date_of_birth", sa.Date()),
+        sa.Column("last_login", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "images",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("image_name", sa.String(150)),
+        sa.Column("image_path", sa.String(255), nullable=False),
+        sa.Column("image_format", sa.String(20)),
+        sa.Column("image_size_kb", sa.Integer()),
+        sa.Column("uploaded_at", sa.DateTime()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+    )
+    op.create_index("ix_images_id", "images", ["id"])
+
+    op.create_table(
+        "predictions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("predicted_label", sa.String(120), nullable=False),
+        sa.Column("confidence_score", sa.Float()),
+        sa.Column("model_version", sa.String(50)),
+        sa.Column("processing_time_ms", sa.Integer()),
+        sa.Column("raw_output", sa.Text()),
+        sa.Column("extra_metadata", sa.Text()),
+        sa.Column("status", sa.String(20)),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("images.id"), nullable=False),
+    )
+    op.create_index("ix_predictions_id", "predictions", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("predictions")
+    op.drop_table("images")
+    op.drop_table("users")
@@ -0,0 +1,117 @@
+"""Typed prediction columns: scan_uid, risk_level, diagnosis_name, image_url, class_scores
+
+Some databases already have these from create_all() or from an earlier run
+of scripts/backfill_prediction_columns.py, so each column and index is only
+added when missing. Rows written before the columns existed are then filled
+from the legacy extra_metadata / raw_output JSON, in keyset-ordered batches;
+only rows whose class_scores is still NULL are touched.
+
+Revision ID: 0002_typed_prediction_columns
+Revises: 0001_baseline
+Create Date: 2026-10-16
+"""
+import json
+import struct
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002_typed_prediction_columns"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    sa.Column("scan_uid", sa.String(32)),
+    sa.Column("risk_level", sa.String(20)),
+    sa.Column("diagnosis_name", sa.String(120)),
+    sa.Column("image_url", sa.String(255)),
+    sa.Column("class_scores", sa.LargeBinary(28)),
+]
+
+# Frozen here rather than imported from models/, which may change later
+SCORE_LABELS   = ("akiec", "bcc", "bkl", "df", "mel", "nv", "vasc")
+BACKFILL_BATCH = 1000
+
+predictions = sa.table(
+    "predictions",
+    sa.column("id", sa.Integer),
+    sa.column("predicted_label", sa.String),
+    sa.column("raw_output", sa.Text),
+    sa.column("extra_metadata", sa.Text),
+    *[sa.column(c.name, c.type) for c in COLUMNS],
+)
+
+
+def _json(text) -> dict:
+    try:
+        value = json.loads(text) if text else {}
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def backfill(bind) -> int:
+    t       = predictions
+    last_id = 0
+    total   = 0
+    while True:
+        rows = bind.execute(
+            sa.select(t.c.id, t.c.predicted_label, t.c.raw_output, t.c.extra_metadata)
+            .where(t.c.id > last_id, t.c.class_scores.is_(None))
+            .order_by(t.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return total
+        updates = []
+        for row in rows:
+            raw, extra = _json(row.raw_output), _json(row.extra_metadata)
+            updates.append({
+                "row_id":         row.id,
+                "risk_level":     extra.get("risk_level"),
+                "diagnosis_name": extra.get("diagnosis_name", row.predicted_label),
+                "image_url":      extra.get("image_url"),
+                "class_scores":   struct.pack(f"<{len(SCORE_LABELS)}f",
+                                              *[float(raw.get(label, 0.0)) for label in SCORE_LABELS]),
+            })
+        bind.execute(
+            sa.update(t).where(t.c.id == sa.bindparam("row_id")).values(
+                risk_level=sa.bindparam("risk_level"),
+                diagnosis_name=sa.bindparam("diagnosis_name"),
+                image_url=sa.bindparam("image_url"),
+                class_scores=sa.bindparam("class_scores"),
+            ),
+            updates,
+        )
+        last_id = rows[-1].id
+        total  += len(rows)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns   = {c["name"] for c in inspector.get_columns("predictions")}
+    indexes   = {i["name"] for i in inspector.get_indexes("predictions")}
+
+    with op.batch_alter_table("predictions") as batch:
+        for column in COLUMNS:
+            if column.name not in columns:
+                batch.add_column(column)
+
+    if "ix_predictions_scan_uid" not in indexes:
+        op.create_index("ix_predictions_scan_uid", "predictions", ["scan_uid"], unique=True)
+    if "ix_predictions_risk_level_created_at" not in indexes:
+        op.create_index("ix_predictions_risk_level_created_at", "predictions", ["risk_level", "created_at"])
+
+    filled = backfill(op.get_bind())
+    if filled:
+        print(f"✅ Backfilled typed columns for {filled} existing prediction(s)")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_predictions_risk_level_created_at", table_name="predictions")
+    op.drop_index("ix_predictions_scan_uid", table_name="predictions")
+    with op.batch_alter_table("predictions") as batch:
+        for column in reversed(COLUMNS):
+            batch.drop_column(column.name)
@@ -0,0 +1,39 @@
+"""Composite (user_id, created_at DESC) indexes for per-user history queries
+
+History pages, scan counts and report lookups all filter on user_id and
+order newest first. The predictions index carries id DESC as well, so the
+keyset tiebreak (created_at, id) is read straight off the index with no
+sort step.
+
+Revision ID: 0003_user_created_at_indexes
+Revises: 0002_typed_prediction_columns
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0003_user_created_at_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_typed_prediction_columns"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_predictions_user_id_created_at" not in {i["name"] for i in inspector.get_indexes("predictions")}:
+        op.create_index(
+            "ix_predictions_user_id_created_at", "predictions",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        )
+    if "ix_images_user_id_uploaded_at" not in {i["name"] for i in inspector.get_indexes("images")}:
+        op.create_index(
+            "ix_images_user_id_uploaded_at", "images",
+            ["user_id", sa.text("uploaded_at DESC")],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_user_id_uploaded_at", table_name="images")
+    op.drop_index("ix_predictions_user_id_created_at", table_name="predictions")
@@ -0,0 +1,34 @@
+"""password_reset_tokens: hashed, expiring reset tokens shared by all workers
+
+Revision ID: 0005_password_reset_tokens
+Revises: 0004_revoked_tokens
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005_password_reset_tokens"
+down_revision: Union[str, Sequence[str], None] = "0004_revoked_tokens"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "password_reset_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("token_hash", sa.String(64), nullable=False, unique=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_password_reset_tokens_expires_at", "password_reset_tokens", ["expires_at"])
+    op.create_index(
+        "ix_password_reset_tokens_user_id_created_at", "password_reset_tokens", ["user_id", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("password_reset_tokens")
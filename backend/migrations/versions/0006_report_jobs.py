@@ -0,0 +1,41 @@
+"""report_jobs: persisted queue of off-request report renders
+
+Revision ID: 0006_report_jobs
+Revises: 0005_password_reset_tokens
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006_report_jobs"
+down_revision: Union[str, Sequence[str], None] = "0005_password_reset_tokens"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "report_jobs",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("kind", sa.String(16), nullable=False),
+        sa.Column("scan_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String(255), nullable=True),
+        sa.Column("result_path", sa.String(255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("lease_until", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_report_jobs_status_created_at", "report_jobs", ["status", "created_at"])
+    op.create_index("ix_report_jobs_user_id_created_at", "report_jobs", ["user_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("report_jobs")
@@ -0,0 +1,23 @@
+"""email_outbox: index the claim token
+
+Revision ID: 0008_email_outbox_claim_index
+Revises: 0007_email_outbox
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0008_email_outbox_claim_index"
+down_revision: Union[str, Sequence[str], None] = "0007_email_outbox"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The sender reloads each batch it claimed by its claim token
+    op.create_index("ix_email_outbox_claim", "email_outbox", ["claim"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_email_outbox_claim", table_name="email_outbox")
@@ -11,5 +11,9 @@ from models.base import Base
 from models.user import User
 from models.images import Image
 from models.prediciton import Prediction
+from models.revoked_token import RevokedToken
+from models.password_reset import PasswordResetToken
+from models.report_job import ReportJob
+from models.email_outbox import OutboxEmail
 
-__all__ = ["Base", "User", "Image", "Prediction"]
\ No newline at end of file
+__all__ = ["Base", "User", "Image", "Prediction", "RevokedToken", "PasswordResetToken", "ReportJob", "OutboxEmail"]
\ No newline at end of file
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from .base import Base
+
+class OutboxEmail(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Sender polling: due queued messages, oldest first
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+        # Reloading a claimed batch by its token
+        Index("ix_email_outbox_claim", "claim"),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    to_addr = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+
+    # Full RFC 5322 message. Cleared once the message leaves the queue, since
+    # reset emails carry a live token.
+    body = Column(Text, nullable=True)
+
+    # queued → sending → sent | failed | expired
+    status     = Column(String(16), nullable=False, default="queued")
+    attempts   = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(255), nullable=True)
+
+    # Random token of the sender batch holding the message, with its lease
+    claim       = Column(String(32), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+
+    # All UTC. Messages still queued at expires_at are dropped, not sent.
+    created_at      = Column(DateTime, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    expires_at      = Column(DateTime, nullable=True)
+    sent_at         = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxEmail {self.id} to={self.to_addr} {self.status}>"
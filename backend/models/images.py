@@ -7,7 +7,7 @@
 #     id = Column(Integer, primary_key=True, index=True)
 #     file_path = Column(String)
 #     user_id = Column(Integer, ForeignKey("users.id"))
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, ist_now
 
@@ -32,3 +32,6 @@ class Image(Base):
 
     def __repr__(self):
         return f"<Image {self.image_name}>"
+
+
+Index("ix_images_user_id_uploaded_at", Image.user_id, Image.uploaded_at.desc())
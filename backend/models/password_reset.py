@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from .base import Base
+
+class PasswordResetToken(Base):
+    __tablename__ = "password_reset_tokens"
+    __table_args__ = (
+        # Per-user rate limit: recent requests for one account
+        Index("ix_password_reset_tokens_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    # SHA-256 of the emailed token; the token itself is never stored
+    token_hash = Column(String(64), unique=True, nullable=False)
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    # Both UTC
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<PasswordResetToken user={self.user_id}>"
@@ -9,24 +9,56 @@
 #     risk_level = Column(String, nullable=False)
 #     confidence = Column(Float, nullable=False)
 #     created_at = Column(String, default=lambda: str(get_ist_time()))
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+import struct
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from .base import Base, ist_now
 
+# Order of the model's output vector; class_scores is packed in this order
+SCORE_LABELS = ('akiec', 'bcc', 'bkl', 'df', 'mel', 'nv', 'vasc')
+_SCORES = struct.Struct(f"<{len(SCORE_LABELS)}f")
+
+
+def pack_scores(scores) -> bytes:
+    """Per-class scores (dict by label, or sequence in SCORE_LABELS order) → 28 bytes of float32."""
+    if isinstance(scores, dict):
+        scores = [scores.get(label, 0.0) for label in SCORE_LABELS]
+    return _SCORES.pack(*scores)
+
+
+def unpack_scores(blob) -> dict:
+    if not blob:
+        return {}
+    return {label: round(value, 4) for label, value in zip(SCORE_LABELS, _SCORES.unpack(blob))}
+
+
 class Prediction(Base):
     __tablename__ = "predictions"
+    __table_args__ = (
+        Index("ix_predictions_risk_level_created_at", "risk_level", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
+    # Client-visible ID, assigned before the row is written (write-behind)
+    scan_uid = Column(String(32), unique=True, index=True)
+
     # Model Output
     predicted_label = Column(String(120), nullable=False)
     confidence_score = Column(Float)
     model_version = Column(String(50))
     processing_time_ms = Column(Integer)
 
-    # Advanced Storage
-    raw_output = Column(Text)        # raw model response
-    extra_metadata = Column(Text)    # JSON string if needed
+    # Typed result fields
+    risk_level = Column(String(20))           # indexed with created_at, see __table_args__
+    diagnosis_name = Column(String(120))
+    image_url = Column(String(255))
+    class_scores = Column(LargeBinary(_SCORES.size))   # packed float32, SCORE_LABELS order
+
+    # Legacy JSON storage — only set on rows written before the typed
+    # columns existed; migration 0002 backfills the typed columns from them
+    raw_output = Column(Text)
+    extra_metadata = Column(Text)
 
     status = Column(String(20), default="completed")
     
@@ -41,5 +73,16 @@ class Prediction(Base):
     user = relationship("User", back_populates="predictions")
     image = relationship("Image", back_populates="predictions")
 
+    @property
+    def scores(self) -> dict:
+        return unpack_scores(self.class_scores)
+
     def __repr__(self):
         return f"<Prediction {self.predicted_label} ({self.confidence_score})>"
+
+
+# Per-user history, newest first; id breaks created_at ties for keyset paging
+Index(
+    "ix_predictions_user_id_created_at",
+    Prediction.user_id, Prediction.created_at.desc(), Prediction.id.desc(),
+)
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from .base import Base
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        # Claiming: oldest queued (or lease-expired running) jobs first
+        Index("ix_report_jobs_status_created_at", "status", "created_at"),
+        # Per-user active-job limit and listing
+        Index("ix_report_jobs_user_id_created_at", "user_id", "created_at"),
+    )
+
+    # uuid4 hex, handed to the client
+    id = Column(String(32), primary_key=True)
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    # scan | history_pdf | history_zip
+    kind    = Column(String(16), nullable=False)
+    scan_id = Column(Integer, nullable=True)
+
+    # queued → running → done | failed
+    status   = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    progress = Column(Integer, nullable=False, default=0)
+    total    = Column(Integer, nullable=False, default=0)
+    error    = Column(String(255), nullable=True)
+
+    # File under REPORT_JOB_DIR once the job is done
+    result_path = Column(String(255), nullable=True)
+
+    # All UTC. A running job whose lease has passed is picked up again.
+    created_at  = Column(DateTime, nullable=False)
+    started_at  = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ReportJob {self.id} {self.kind} {self.status}>"
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from .base import Base, ist_now
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # Monotonic id doubles as the sync watermark for other workers
+    id = Column(Integer, primary_key=True)
+
+    jti = Column(String(64), unique=True, nullable=False)
+
+    # Token's own `exp` (UTC); rows past it are pruned
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    revoked_at = Column(DateTime, default=ist_now)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti}>"
@@ -9,11 +9,9 @@
 #     email = Column(String)
 from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text
 from sqlalchemy.orm import relationship
-from passlib.context import CryptContext
+from passwords import pwd_context
 from .base import Base, ist_now
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 class User(Base):
     __tablename__ = "users"
 
@@ -0,0 +1,72 @@
+"""
+DermAssist AI — Password hashing
+bcrypt is deliberately slow (~250 ms at cost 12), so hashing and verifying
+run in a small dedicated process pool (process_pool.SpawnPool) instead of
+the request threadpool or the event loop. A login burst then queues here, bounded, while everything
+else keeps its threads.
+
+Hashes made with a different cost than BCRYPT_ROUNDS still verify;
+`needs_rehash()` tells the caller to re-hash them after the response has
+been sent.
+
+Config (env vars):
+  BCRYPT_ROUNDS            bcrypt cost factor for new hashes
+  PASSWORD_WORKERS         processes in the hashing pool
+  PASSWORD_MAX_PENDING     hash/verify calls allowed in flight; the rest wait
+"""
+import os
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from process_pool import SpawnPool
+
+BCRYPT_ROUNDS        = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS     = int(os.getenv("PASSWORD_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", str(PASSWORD_WORKERS * 8)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+# ── Worker-side functions (run in the pool's processes) ───────────────────────
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _noop():
+    return None
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return pwd_context.verify(password, password_hash)
+    except ValueError:          # malformed or unknown hash format
+        return False
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+class PasswordHasher(SpawnPool):
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING):
+        super().__init__("Password", workers, max_pending, warmup=_noop)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(_hash, password)
+
+    async def verify(self, password: str, password_hash: Optional[str]) -> bool:
+        if not password_hash:
+            return False
+        return await self.run(_verify, password, password_hash)
+
+    @staticmethod
+    def needs_rehash(password_hash: str) -> bool:
+        """True if the hash was made with other settings (e.g. an old BCRYPT_ROUNDS)."""
+        try:
+            return pwd_context.needs_update(password_hash)
+        except ValueError:
+            return False
+
+    def stats(self) -> dict:
+        return {**super().stats(), "rounds": BCRYPT_ROUNDS}
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,147 @@
+"""
+DermAssist AI — Streaming PDF concatenation
+Joins ReportLab-generated PDFs into one document while it is being sent:
+each input is parsed, renumbered and emitted as soon as it arrives, and
+only its object offsets and page ids are kept for the final xref, so
+memory does not grow with the size of the pages.
+
+    cat = PdfConcatenator("Title")
+    yield cat.start()
+    for pdf in parts:
+        yield cat.add(pdf)
+    yield cat.finish()
+
+Inputs must be what ReportLab writes: a single xref section, one object
+per xref entry and no object streams. Identical reference-free objects
+(the standard font dictionaries) are written once and shared.
+"""
+import re
+from typing import Dict, List, Tuple
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_XREF_ROW  = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_REF       = re.compile(rb"(\d+) 0 R\b")
+_STREAM    = re.compile(rb"\bstream\r?\n")
+_KIDS      = re.compile(rb"/Kids\s*\[([^\]]*)\]")
+_IS_PAGES  = re.compile(rb"/Type\s*/Pages\b")
+
+
+def _ref(body: bytes, key: bytes) -> int:
+    m = re.search(re.escape(key) + rb"\s+(\d+) 0 R", body)
+    if m is None:
+        raise ValueError(f"PDF has no {key.decode()} reference")
+    return int(m.group(1))
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("latin-1", "replace") + b")"
+
+
+def parse_objects(pdf: bytes) -> Tuple[Dict[int, bytes], int, int]:
+    """({object id: body between `obj` and `endobj`}, root id, info id)."""
+    m = _STARTXREF.search(pdf, max(len(pdf) - 1024, 0))
+    if m is None:
+        raise ValueError("Not a PDF: no startxref")
+    xref_at = int(m.group(1))
+    trailer = pdf[xref_at:]
+    first   = int(trailer.split(None, 3)[1])
+    offsets = {}
+    for i, row in enumerate(_XREF_ROW.finditer(trailer)):
+        if row.group(3) == b"n":
+            offsets[first + i] = int(row.group(1))
+
+    objects = {}
+    spans   = sorted(offsets.items(), key=lambda item: item[1])
+    for (obj_id, start), (_, end) in zip(spans, spans[1:] + [(None, xref_at)]):
+        span = pdf[start:end]
+        head = span.index(b"obj") + 3
+        objects[obj_id] = span[head:span.rindex(b"endobj")].strip(b"\r\n")
+    return objects, _ref(trailer, b"/Root"), _ref(trailer, b"/Info")
+
+
+class PdfConcatenator:
+    CATALOG_ID = 1
+    PAGES_ID   = 2
+    INFO_ID    = 3
+
+    def __init__(self, title: str, author: str = ""):
+        self.title    = title
+        self.author   = author
+        self._offsets = [0, 0, 0, 0]        # by object id; 1-3 are written by finish()
+        self._kids:   List[int] = []
+        self._shared: Dict[bytes, int] = {}
+        self._pos     = 0
+
+    @property
+    def pages(self) -> int:
+        return len(self._kids)
+
+    def _object(self, obj_id: int, body: bytes) -> bytes:
+        data = b"%d 0 obj\n%s\nendobj\n" % (obj_id, body)
+        if obj_id < len(self._offsets):
+            self._offsets[obj_id] = self._pos
+        else:
+            self._offsets.append(self._pos)
+        self._pos += len(data)
+        return data
+
+    def start(self) -> bytes:
+        header = b"%PDF-1.4\n%\x93\x8c\x8b\x9e DermAssist AI\n"
+        self._pos = len(header)
+        return header
+
+    def add(self, pdf: bytes) -> bytes:
+        """Append every page of `pdf`; returns the bytes to send."""
+        objects, root, info = parse_objects(pdf)
+
+        # Walk the page tree: inner nodes are replaced by our single /Pages node
+        leaves, nodes, todo = [], set(), [_ref(objects[root], b"/Pages")]
+        while todo:
+            node = todo.pop(0)
+            if _IS_PAGES.search(objects[node]):
+                nodes.add(node)
+                kids = _KIDS.search(objects[node])
+                todo[:0] = [int(k) for k in _REF.findall(kids.group(1))] if kids else []
+            else:
+                leaves.append(node)
+
+        mapping = {n: self.PAGES_ID for n in nodes}
+        pending = []
+        for old in sorted(objects):
+            if old in (root, info) or old in nodes:
+                continue
+            body      = objects[old]
+            shareable = not _REF.search(body) and not _STREAM.search(body)
+            if shareable and body in self._shared:
+                mapping[old] = self._shared[body]
+                continue
+            mapping[old] = len(self._offsets) + len(pending)
+            pending.append((old, body))
+            if shareable:
+                self._shared[body] = mapping[old]
+
+        renumber = lambda m: b"%d 0 R" % mapping[int(m.group(1))]
+        out = []
+        for old, body in pending:
+            stream = _STREAM.search(body)
+            head, tail = (body[:stream.start()], body[stream.start():]) if stream else (body, b"")
+            out.append(self._object(mapping[old], _REF.sub(renumber, head) + tail))
+        self._kids.extend(mapping[leaf] for leaf in leaves)
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % k for k in self._kids)
+        out = [
+            self._object(self.PAGES_ID, b"<< /Count %d /Kids [ %s ] /Type /Pages >>" % (len(self._kids), kids)),
+            self._object(self.CATALOG_ID, b"<< /PageMode /UseNone /Pages %d 0 R /Type /Catalog >>" % self.PAGES_ID),
+            self._object(self.INFO_ID, b"<< /Title %s /Author %s /Producer (DermAssist AI) >>"
+                         % (_pdf_string(self.title), _pdf_string(self.author))),
+        ]
+        xref_at = self._pos
+        rows = b"".join(b"%010d 00000 n \n" % off for off in self._offsets[1:])
+        out.append(
+            b"xref\n0 %d\n0000000000 65535 f \n%strailer\n<< /Info %d 0 R /Root %d 0 R /Size %d >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets), rows, self.INFO_ID, self.CATALOG_ID, len(self._offsets), xref_at)
+        )
+        return b"".join(out)
@@ -0,0 +1,401 @@
+"""
+DermAssist AI — Write-behind scan persistence
+/predict hands finished scans to a ScanWriter and returns immediately; a
+background thread batch-inserts the Image + Prediction rows.
+
+  • bounded in-memory queue; when it is full, records go to the spill file
+  • each batch is one transaction, retried with exponential backoff;
+    records submitted together (submit_many) always share a transaction
+  • batches that still fail are appended to a JSONL spill file, which is
+    replayed on the next start (and periodically) so a DB blip never
+    loses a scan; replay files left behind by a process that died are
+    adopted on start
+  • spill lines that cannot be parsed, and records whose replay has failed
+    SCAN_MAX_REPLAYS times (a row the DB will never accept), move to a
+    dead-letter file instead of blocking the spill forever
+  • every scan carries a `scan_uid` generated up front, so the client gets
+    an ID immediately and replays are idempotent; a scan counts as pending
+    (is_pending) from submit until it is committed, including while it
+    waits in the spill file
+
+Config (env vars):
+  SCAN_QUEUE_SIZE        max scans waiting in memory
+  SCAN_BATCH_SIZE        max scans per INSERT transaction
+  SCAN_FLUSH_INTERVAL_S  how long the worker waits to fill a batch
+  SCAN_MAX_RETRIES       attempts per batch before spilling to disk
+  SCAN_SPILL_FILE        path of the durable spill file
+  SCAN_MAX_REPLAYS       failed replays before a record is dead-lettered
+  SCAN_DEAD_LETTER_FILE  where unreplayable spill lines are kept for inspection
+"""
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import exc
+
+from models.images import Image
+from models.prediciton import Prediction, SCORE_LABELS, pack_scores
+
+SCAN_QUEUE_SIZE       = int(os.getenv("SCAN_QUEUE_SIZE", "10000"))
+SCAN_BATCH_SIZE       = int(os.getenv("SCAN_BATCH_SIZE", "200"))
+SCAN_FLUSH_INTERVAL_S = float(os.getenv("SCAN_FLUSH_INTERVAL_S", "0.05"))
+SCAN_MAX_RETRIES      = int(os.getenv("SCAN_MAX_RETRIES", "5"))
+SCAN_SPILL_FILE       = os.getenv("SCAN_SPILL_FILE", "scan_spill.jsonl")
+SCAN_MAX_REPLAYS      = int(os.getenv("SCAN_MAX_REPLAYS", "10"))
+SCAN_DEAD_LETTER_FILE = os.getenv("SCAN_DEAD_LETTER_FILE", "scan_spill.dead.jsonl")
+
+_REPLAY_EVERY_S = 30.0
+
+
+@dataclass
+class ScanRecord:
+    """Everything needed to write one Image + Prediction pair. JSON-serialisable."""
+    scan_uid:           str
+    user_id:            int
+    image_name:         str
+    image_path:         str
+    image_format:       str
+    image_size_kb:      int
+    predicted_label:    str
+    confidence_score:   float
+    model_version:      str
+    processing_time_ms: int
+    risk_level:         str
+    diagnosis_name:     str
+    image_url:          str
+    scores:             List[float]     # SCORE_LABELS order
+    created_at:         str             # ISO timestamp taken when the scan finished
+
+
+def _record_from_spill(data: dict) -> Tuple[ScanRecord, int]:
+    """(record, failed replays so far) from one parsed spill line."""
+    replays = int(data.pop("replays", 0))
+    # Lines spilled before the typed prediction columns carried JSON blobs
+    if "raw_output" in data:
+        raw   = json.loads(data.pop("raw_output") or "{}")
+        extra = json.loads(data.pop("extra_metadata") or "{}")
+        data["scores"]         = [raw.get(label, 0.0) for label in SCORE_LABELS]
+        data["risk_level"]     = extra.get("risk_level", "")
+        data["diagnosis_name"] = extra.get("diagnosis_name", data["predicted_label"])
+        data["image_url"]      = extra.get("image_url")
+    return ScanRecord(**data), replays
+
+
+def _spill_line(record: ScanRecord, replays: int = 0) -> str:
+    data = asdict(record)
+    if replays:
+        data["replays"] = replays
+    return json.dumps(data) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScanWriter:
+    def __init__(self, session_factory, queue_size: int = SCAN_QUEUE_SIZE,
+                 batch_size: int = SCAN_BATCH_SIZE, flush_interval: float = SCAN_FLUSH_INTERVAL_S,
+                 max_retries: int = SCAN_MAX_RETRIES, spill_file: str = SCAN_SPILL_FILE,
+                 max_replays: int = SCAN_MAX_REPLAYS, dead_letter_file: str = SCAN_DEAD_LETTER_FILE):
+        self.session_factory  = session_factory
+        self.batch_size       = max(batch_size, 1)
+        self.flush_interval   = flush_interval
+        self.max_retries      = max(max_retries, 1)
+        self.spill_file       = spill_file
+        self.max_replays      = max(max_replays, 1)
+        self.dead_letter_file = dead_letter_file
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+        self._pending: set       = set()
+        self._lock       = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stop       = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._listeners: List[Callable[[List[ScanRecord]], None]] = []
+
+        self.written       = 0
+        self.spilled       = 0
+        self.batches       = 0
+        self.dead_lettered = 0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="scan-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush what is queued; anything left after `timeout` goes to the spill file."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        leftover = self._drain(None)
+        if leftover:
+            self._spill(leftover)
+
+    # ── Producer side ─────────────────────────────────────────────────────────
+    def submit(self, record: ScanRecord):
+        self.submit_many([record])
+
+    def submit_many(self, records: List[ScanRecord]):
+        """Queue records that must be committed in the same transaction."""
+        if not records:
+            return
+        with self._lock:
+            self._pending.update(r.scan_uid for r in records)
+        try:
+            self._queue.put_nowait(list(records))
+        except queue.Full:
+            self._spill(records)
+
+    def add_listener(self, fn: Callable[[List[ScanRecord]], None]):
+        """Call `fn(records)` on the writer thread after each committed batch."""
+        self._listeners.append(fn)
+
+    def is_pending(self, scan_uid: str) -> bool:
+        with self._lock:
+            return scan_uid in self._pending
+
+    def stats(self) -> dict:
+        return {
+            "queued":        self._queue.qsize(),
+            "written":       self.written,
+            "batches":       self.batches,
+            "spilled":       self.spilled,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    # ── Worker ────────────────────────────────────────────────────────────────
+    def _drain(self, limit: Optional[int], batch: Optional[List[ScanRecord]] = None) -> List[ScanRecord]:
+        # Queue items are groups; a group is never split, so a batch may run
+        # slightly over `limit`.
+        batch = batch if batch is not None else []
+        while limit is None or len(batch) < limit:
+            try:
+                batch.extend(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        self._replay_safely()
+        last_replay = time.monotonic()
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                first = None
+            if first is not None:
+                if self.flush_interval > 0 and self._queue.qsize() < self.batch_size - len(first):
+                    time.sleep(self.flush_interval)
+                batch = self._drain(self.batch_size, list(first))
+                if not self._write_with_retry(batch):
+                    self._spill(batch)
+            if time.monotonic() - last_replay > _REPLAY_EVERY_S:
+                self._replay_safely()
+                last_replay = time.monotonic()
+
+    def _write_with_retry(self, batch: List[ScanRecord]) -> bool:
+        delay = 0.2
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._write(batch)
+                return True
+            except Exception as e:
+                print(f"⚠ Scan batch write failed (attempt {attempt}/{self.max_retries}): {e}")
+                if attempt < self.max_retries and not self._stop.is_set():
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+        return False
+
+    def _write(self, batch: List[ScanRecord]):
+        db = self.session_factory()
+        try:
+            # Skip scans already committed (e.g. a spill replay after a crash)
+            uids = [r.scan_uid for r in batch]
+            done = {uid for (uid,) in db.query(Prediction.scan_uid).filter(Prediction.scan_uid.in_(uids))}
+            for r in batch:
+                if r.scan_uid in done:
+                    continue
+                created = datetime.fromisoformat(r.created_at)
+                image = Image(
+                    image_name=r.image_name,
+                    image_path=r.image_path,
+                    image_format=r.image_format,
+                    image_size_kb=r.image_size_kb,
+                    uploaded_at=created,
+                    user_id=r.user_id,
+                )
+                db.add(Prediction(
+                    scan_uid=r.scan_uid,
+                    predicted_label=r.predicted_label,
+                    confidence_score=r.confidence_score,
+                    model_version=r.model_version,
+                    processing_time_ms=r.processing_time_ms,
+                    risk_level=r.risk_level,
+                    diagnosis_name=r.diagnosis_name,
+                    image_url=r.image_url,
+                    class_scores=pack_scores(r.scores),
+                    status="completed",
+                    created_at=created,
+                    user_id=r.user_id,
+                    image=image,
+                ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        with self._lock:
+            self._pending.difference_update(uids)
+        self.written += len(batch)
+        self.batches += 1
+        for fn in self._listeners:
+            try:
+                fn(batch)
+            except Exception as e:
+                print(f"⚠ Scan writer listener failed: {e}")
+
+    # ── Spill file ────────────────────────────────────────────────────────────
+    def _spill(self, batch: List[ScanRecord]):
+        # The scans stay pending: the replay that commits them clears them
+        self._append_spill("".join(_spill_line(r) for r in batch))
+        self.spilled += len(batch)
+        print(f"⚠ Spilled {len(batch)} scan(s) to {self.spill_file}")
+
+    def _append_spill(self, lines: str, path: Optional[str] = None):
+        with self._spill_lock:
+            with open(path or self.spill_file, "a") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _dead_letter(self, lines: List[str], reason: str):
+        self._append_spill("".join(lines), self.dead_letter_file)
+        self.dead_lettered += len(lines)
+        print(f"❌ Moved {len(lines)} spilled scan(s) to {self.dead_letter_file}: {reason}")
+
+    def _replay_safely(self):
+        # Never let a bad spill file or a full disk end the writer thread
+        try:
+            self._replay_spill()
+        except Exception as e:
+            print(f"❌ Spill replay failed: {e}")
+
+    def _claim_spill(self) -> List[str]:
+        """
+        Replay files this process now owns: its own, plus any left by a
+        process that died mid-replay. The live spill file is renamed first,
+        so concurrent appends (other workers too) start a fresh file.
+        """
+        own     = f"{self.spill_file}.{os.getpid()}.replay"
+        claimed = []
+        with self._spill_lock:
+            for path in sorted(glob.glob(glob.escape(self.spill_file) + ".*.replay")):
+                if path == own:
+                    continue
+                suffix = path[len(self.spill_file) + 1:]       # "<pid>[.<pid>...].replay"
+                owner  = suffix.split(".", 1)[0]
+                if owner == str(os.getpid()):
+                    claimed.append(path)    # adopted earlier; that replay was interrupted
+                    continue
+                if owner.isdigit() and _pid_alive(int(owner)):
+                    continue
+                # Keep the whole old suffix: a dead process can leave both its
+                # own file and one it had adopted, and they must not collide
+                adopted = f"{self.spill_file}.{os.getpid()}.{suffix}"
+                try:
+                    os.replace(path, adopted)
+                except FileNotFoundError:
+                    continue            # another worker adopted it first
+                claimed.append(adopted)
+            if os.path.exists(own):
+                claimed.append(own)     # an earlier replay of ours was interrupted
+            else:
+                try:
+                    os.replace(self.spill_file, own)
+                    claimed.append(own)
+                except FileNotFoundError:
+                    pass
+        return claimed
+
+    def _replay_spill(self):
+        for path in self._claim_spill():
+            self._replay_file(path)
+
+    def _isolate(self, batch: List[Tuple[ScanRecord, int]]):
+        """
+        Retry a failed replay batch one record at a time, so one bad row does
+        not hold back the others. Returns (rejected records with their replay
+        count bumped, records left untried because the DB is unreachable);
+        an outage does not count against a record.
+        """
+        failed = []
+        for j, (rec, replays) in enumerate(batch):
+            try:
+                self._write([rec])
+            except (exc.OperationalError, exc.InterfaceError):
+                return failed, batch[j:]
+            except Exception as e:
+                print(f"⚠ Spilled scan {rec.scan_uid} rejected: {e}")
+                failed.append((rec, replays + 1))
+        return failed, []
+
+    def _replay_file(self, path: str):
+        records, unreadable = [], []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(_record_from_spill(json.loads(line)))
+                except (ValueError, TypeError, KeyError):
+                    unreadable.append(line if line.endswith("\n") else line + "\n")
+        if unreadable:
+            self._dead_letter(unreadable, "unparseable spill line(s)")
+        # Scans spilled before a restart, or by another worker, are pending here too
+        with self._lock:
+            self._pending.update(rec.scan_uid for rec, _ in records)
+
+        keep, dead, gone = [], [], []
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+            if self._write_with_retry([rec for rec, _ in batch]):
+                continue
+            failed, untried = self._isolate(batch)
+            keep += [(rec, n) for rec, n in failed if n < self.max_replays]
+            dead += [_spill_line(rec, n) for rec, n in failed if n >= self.max_replays]
+            gone += [rec.scan_uid for rec, n in failed if n >= self.max_replays]
+            if untried:                 # the DB is unreachable: try the rest next time
+                keep += untried + records[i + self.batch_size:]
+                break
+        if dead:
+            self._dead_letter(dead, f"replay failed {self.max_replays} times")
+            with self._lock:
+                self._pending.difference_update(gone)
+        if keep:
+            print(f"⚠ Spill replay failed; {len(keep)} scan(s) kept for the next attempt")
+            self._append_spill("".join(_spill_line(rec, n) for rec, n in keep))
+        elif len(records) > len(dead):
+            print(f"✅ Replayed {len(records) - len(dead)} spilled scan(s) from {path}")
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,115 @@
+"""
+DermAssist AI — Prediction cache
+Re-uploads of the same photo (and frontend retries) skip decode + inference.
+
+Entries are keyed by SHA-256(model version + raw upload bytes) and hold the
+per-class scores. Two tiers:
+  • in-process LRU with TTL (always on)
+  • optional on-disk tier shared by every worker on the host
+
+Config (env vars):
+  PREDICTION_CACHE_SIZE    max entries in the in-process tier (0 disables it)
+  PREDICTION_CACHE_TTL_S   entry lifetime in seconds, both tiers
+  PREDICTION_CACHE_DIR     directory for the shared tier (unset = disabled)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import List, Optional
+
+from cache import TTLCache
+
+PREDICTION_CACHE_SIZE  = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", str(24 * 3600)))
+PREDICTION_CACHE_DIR   = os.getenv("PREDICTION_CACHE_DIR", "")
+
+
+def model_fingerprint(model_path: str, model_version: str) -> str:
+    """Model version tag plus a digest of the weights, so swapping the file invalidates the cache."""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{model_version}-{digest.hexdigest()[:12]}"
+
+
+class PredictionCache:
+    def __init__(self, model_tag: str, maxsize: int = PREDICTION_CACHE_SIZE,
+                 ttl: float = PREDICTION_CACHE_TTL_S, directory: str = PREDICTION_CACHE_DIR):
+        self.model_tag = model_tag
+        self.ttl       = ttl
+        self.memory    = TTLCache(maxsize, ttl)
+        self.directory = directory or None
+        self.disk_hits = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, contents: bytes) -> str:
+        digest = hashlib.sha256(self.model_tag.encode())
+        digest.update(contents)
+        return digest.hexdigest()
+
+    # ── Lookup / store ────────────────────────────────────────────────────────
+    def get(self, key: str) -> Optional[List[float]]:
+        scores = self.memory.get(key)
+        if scores is None and self.directory:
+            scores = self._disk_get(key)
+            if scores is not None:
+                self.disk_hits += 1
+                self.memory.set(key, scores)
+        return scores
+
+    def put(self, key: str, scores: List[float]):
+        self.memory.set(key, scores)
+        if self.directory:
+            self._disk_put(key, scores)
+
+    def lookup(self, contents: bytes):
+        """Hash the upload and check both tiers. Returns (key, scores or None)."""
+        key = self.key(contents)
+        return key, self.get(key)
+
+    def stats(self) -> dict:
+        return {
+            "model":     self.model_tag,
+            "memory":    self.memory.stats(),
+            "disk":      self.directory is not None,
+            "disk_hits": self.disk_hits,
+        }
+
+    # ── Disk tier ─────────────────────────────────────────────────────────────
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry.get("scores")
+
+    def _disk_put(self, key: str, scores: List[float]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"scores": scores, "created": time.time()}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠ Could not write prediction cache entry: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -0,0 +1,81 @@
+"""
+DermAssist AI — Worker process pools
+The base for the pools that keep CPU-heavy work off the event loop and the
+request threadpool: bcrypt (passwords.py) and ReportLab (report_workers.py).
+
+  • workers are spawned, not forked: the parent holds TF/OpenCV threads and
+    DB pools that a forked child would inherit half-initialised
+  • the pool starts on first use, and a warm-up call boots the workers
+    right away instead of on the first real request
+  • at most `max_pending` calls are in flight; the rest wait
+  • if a worker dies (e.g. OOM-killed) the pool is replaced and the call
+    retried once; the replacement happens under a lock, so callers that
+    all hit the same broken pool start one new pool between them
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+
+def _noop():
+    return None
+
+
+class SpawnPool:
+    def __init__(self, name: str, workers: int, max_pending: int, warmup: Callable = _noop):
+        self.name        = name
+        self.workers     = max(workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self.warmup      = warmup       # module-level, so workers import its module on boot
+        self.restarts    = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore]  = None
+        self._lock       = threading.Lock()
+
+    def start(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool  = self._new_pool()
+                self._slots = asyncio.Semaphore(self.max_pending)
+            return self._pool
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        pool.submit(self.warmup)
+        return pool
+
+    def _restart(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace `broken` unless another caller already has; returns the pool to retry on."""
+        with self._lock:
+            if self._pool is broken or self._pool is None:
+                print(f"⚠ {self.name} pool broke; restarting it")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+                self.restarts += 1
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def run(self, fn, *args):
+        """Run `fn(*args)` on a worker and await the result."""
+        pool = self.start()
+        async with self._slots:
+            try:
+                return await asyncio.wrap_future(pool.submit(fn, *args))
+            except BrokenProcessPool:
+                return await asyncio.wrap_future(self._restart(pool).submit(fn, *args))
+
+    def stats(self) -> dict:
+        return {
+            "workers":     self.workers,
+            "max_pending": self.max_pending,
+            "running":     self._pool is not None,
+            "restarts":    self.restarts,
+        }
@@ -0,0 +1,245 @@
+"""
+DermAssist AI — Pre-rendered PDF report cache
+A scan's report only depends on the scan (immutable once written), the
+owner's profile and the report template, so it is rendered once and served
+from disk afterwards:
+
+    report_cache/<user_id>/<scan_id>-v<template>-<profile digest>.pdf
+
+  • the profile digest is part of the name, so a profile change can never
+    serve a stale report; `evict_user()` (called on profile updates) just
+    frees the old files
+  • files are written to a temp file + rename, so a reader never sees a
+    half-written PDF; concurrent requests for the same report share one render
+  • with REPORT_PRERENDER on, reports are rendered in the background, on the
+    report process pool, as soon as the scan writer commits a scan, so the
+    first download is a cache hit
+  • the "Generated" timestamp in a cached report is its render time
+
+Config (env vars):
+  REPORT_CACHE_DIR              where rendered reports are kept
+  REPORT_PRERENDER              1 = render right after a scan is persisted
+  REPORT_PRERENDER_MAX_PENDING  queued background renders; extra scans render on first download
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from models.prediciton import Prediction
+from models.user import User
+from report_generator import TEMPLATE_VERSION
+
+REPORT_CACHE_DIR             = os.getenv("REPORT_CACHE_DIR", "report_cache")
+REPORT_PRERENDER             = os.getenv("REPORT_PRERENDER", "1") == "1"
+REPORT_PRERENDER_MAX_PENDING = int(os.getenv("REPORT_PRERENDER_MAX_PENDING", "256"))
+
+
+def report_scan_data(scan: Prediction) -> dict:
+    return {
+        "id":               scan.id,
+        "predicted_label":  scan.predicted_label,
+        "confidence_score": scan.confidence_score,
+        "risk_level":       scan.risk_level or "Low Risk",
+        "diagnosis_name":   scan.diagnosis_name or scan.predicted_label,
+        "created_at":       str(scan.created_at),
+        "raw_output":       scan.scores,
+    }
+
+
+def report_user_data(user) -> dict:
+    """Profile fields printed on the report; `user` is a User row or an auth Principal."""
+    return {
+        "full_name":     user.full_name,
+        "email":         user.email,
+        "date_of_birth": str(user.date_of_birth) if user.date_of_birth else "N/A",
+        "gender":        user.gender or "N/A",
+        "phone_number":  user.phone_number or "N/A",
+    }
+
+
+class CachedReport(NamedTuple):
+    path: str     # filesystem path, relative to the process cwd
+    etag: str     # strong ETag, stable for as long as the file is valid
+
+
+class ReportCache:
+    def __init__(self, root: str = REPORT_CACHE_DIR, session_factory=None,
+                 max_pending: int = REPORT_PRERENDER_MAX_PENDING):
+        self.root            = root
+        self.session_factory = session_factory
+        self.max_pending     = max(max_pending, 0)
+        self._inflight: dict = {}               # path → Future of the render
+        self._lock           = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._render_pool    = None
+        self._one_at_once: Optional[asyncio.Lock] = None
+        self._tasks: set     = set()            # pre-renders scheduled on _loop
+        self._pending        = 0
+        self.hits            = 0
+        self.renders         = 0
+        self.prerendered     = 0
+        self.skipped         = 0
+        self.evicted         = 0
+        os.makedirs(root, exist_ok=True)
+
+    def locate(self, user_id: int, scan_id: int, user_data: dict) -> CachedReport:
+        profile = json.dumps(user_data, sort_keys=True, default=str)
+        digest  = hashlib.sha256(f"{TEMPLATE_VERSION}|{profile}".encode()).hexdigest()[:16]
+        name    = f"{scan_id}-v{TEMPLATE_VERSION}-{digest}.pdf"
+        return CachedReport(os.path.join(self.root, str(user_id), name), f'"{scan_id}-{digest}"')
+
+    def lookup(self, user_id: int, scan_data: dict, user_data: dict) -> tuple:
+        """(report, exists): where the report lives and whether it is already rendered."""
+        report = self.locate(user_id, scan_data["id"], user_data)
+        exists = os.path.exists(report.path)
+        if exists:
+            self.hits += 1
+        return report, exists
+
+    # ── Rendering ─────────────────────────────────────────────────────────────
+    # Downloads and pre-rendering share `_inflight`, so a report is rendered
+    # once however many of them ask for it at the same time.
+    def _claim(self, report: CachedReport) -> Tuple[Optional[Future], bool]:
+        """(future, owner): no future if the file exists; the owner renders and settles it."""
+        with self._lock:
+            if os.path.exists(report.path):
+                return None, False
+            future = self._inflight.get(report.path)
+            if future is not None:
+                return future, False
+            future = self._inflight[report.path] = Future()
+            return future, True
+
+    def _settle(self, report: CachedReport, future: Future, error: Optional[BaseException] = None):
+        with self._lock:
+            self._inflight.pop(report.path, None)
+        if error is None:
+            future.set_result(report)
+        else:
+            future.set_exception(error)
+
+    async def render_with(self, pool, user_id: int, scan_data: dict, user_data: dict) -> CachedReport:
+        """Render the report on `pool` (a report_workers.ReportRenderPool) unless it is on disk already."""
+        report = self.locate(user_id, scan_data["id"], user_data)
+        future, owner = self._claim(report)
+        if future is None:
+            return report
+        if not owner:
+            # Shielded: a waiter that goes away must not cancel the owner's render
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            pdf = await pool.render_scan(scan_data, user_data)
+            await asyncio.to_thread(self._write, report.path, pdf)
+            self.renders += 1
+        except BaseException as e:
+            self._settle(report, future, e)
+            raise
+        self._settle(report, future)
+        return report
+
+    def _write(self, path: str, pdf: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    # ── Background pre-rendering (ScanWriter listener) ────────────────────────
+    def start(self, pool):
+        """Enable pre-rendering on `pool`; call from the event loop that runs it."""
+        self._loop        = asyncio.get_running_loop()
+        self._render_pool = pool
+        self._one_at_once = asyncio.Lock()
+
+    def prerender(self, records):
+        """Queue reports for freshly committed scans; runs on the scan writer thread."""
+        if self.session_factory is None or self.max_pending == 0 or self._loop is None:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.skipped += len(records)
+                return
+            self._pending += 1
+        task = asyncio.run_coroutine_threadsafe(self._prerender([r.scan_uid for r in records]), self._loop)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load(self, scan_uids: List[str]) -> list:
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(Prediction, User)
+                .join(User, User.id == Prediction.user_id)
+                .where(Prediction.scan_uid.in_(scan_uids))
+            ).all()
+            return [(user.id, report_scan_data(scan), report_user_data(user)) for scan, user in rows]
+        finally:
+            db.close()
+
+    async def _prerender(self, scan_uids: List[str]):
+        try:
+            # One background render at a time, so downloads never queue behind a burst
+            async with self._one_at_once:
+                for user_id, scan_data, user_data in await asyncio.to_thread(self._load, scan_uids):
+                    await self.render_with(self._render_pool, user_id, scan_data, user_data)
+                    self.prerendered += 1
+        except Exception as e:
+            print(f"⚠ Report pre-render failed: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._loop = None
+
+    # ── Eviction ──────────────────────────────────────────────────────────────
+    def evict_user(self, user_id: int):
+        """Drop every cached report of a user (their profile changed). Blocking."""
+        shutil.rmtree(os.path.join(self.root, str(user_id)), ignore_errors=True)
+        self.evicted += 1
+
+    def prune_stale_templates(self) -> int:
+        """Delete reports rendered by an older template version. Blocking."""
+        removed = 0
+        marker  = f"-v{TEMPLATE_VERSION}-"
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if marker not in name and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "hits":        self.hits,
+            "renders":     self.renders,
+            "prerendered": self.prerendered,
+            "pending":     self._pending,
+            "skipped":     self.skipped,
+            "evicted":     self.evicted,
+        }
+
+
+report_cache = ReportCache(REPORT_CACHE_DIR, SessionLocal if REPORT_PRERENDER else None)
@@ -0,0 +1,174 @@
+"""
+DermAssist AI — Whole-history export
+Streams every scan of a user either as one consolidated PDF (a summary
+table, then each scan's report) or as a ZIP of per-scan PDFs.
+
+  • scans are loaded EXPORT_CHUNK at a time, each chunk on a short-lived
+    session, so an export never holds a DB connection while it renders
+  • up to EXPORT_WINDOW reports render ahead on the report process pool
+    (report_workers.py) and are sent in history order as they complete
+  • reports already in the report cache are read from disk instead
+  • output leaves part by part (pdf_concat.PdfConcatenator, or a ZIP
+    written to an unseekable sink), so memory is bounded by the window,
+    not by the number of scans
+
+Config (env vars):
+  EXPORT_CHUNK     scans loaded per query
+  EXPORT_WINDOW    reports rendered ahead of the one being sent
+"""
+import asyncio
+import os
+import zipfile
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models.prediciton import Prediction
+from pdf_concat import PdfConcatenator
+from report_cache import report_cache, report_scan_data, report_user_data
+from report_workers import ReportRenderPool, report_pool
+
+EXPORT_CHUNK  = int(os.getenv("EXPORT_CHUNK", "50"))
+EXPORT_WINDOW = int(os.getenv("EXPORT_WINDOW", str(report_pool.workers * 2)))
+
+
+async def history_rows(user_id: int) -> List[dict]:
+    """Summary fields of every scan of the user, newest first."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(
+                Prediction.id, Prediction.predicted_label, Prediction.diagnosis_name,
+                Prediction.risk_level, Prediction.confidence_score, Prediction.created_at,
+            )
+            .where(Prediction.user_id == user_id)
+            .order_by(Prediction.created_at.desc(), Prediction.id.desc())
+        )).all()
+    return [
+        {
+            "id":               r.id,
+            "predicted_label":  r.predicted_label,
+            "diagnosis_name":   r.diagnosis_name,
+            "risk_level":       r.risk_level,
+            "confidence_score": r.confidence_score,
+            "created_at":       str(r.created_at),
+        }
+        for r in rows
+    ]
+
+
+async def _load_scans(user_id: int, ids: List[int]) -> List[dict]:
+    async with AsyncSessionLocal() as db:
+        scans = (await db.execute(
+            select(Prediction).where(Prediction.user_id == user_id, Prediction.id.in_(ids))
+        )).scalars().all()
+    by_id = {s.id: report_scan_data(s) for s in scans}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def scan_report(user_id: int, scan_data: dict, user_data: dict,
+                      pool: ReportRenderPool = report_pool) -> bytes:
+    """A scan's PDF: from the report cache if it is there, else rendered on `pool`."""
+    report, exists = report_cache.lookup(user_id, scan_data, user_data)
+    if exists:
+        try:
+            return await asyncio.to_thread(_read, report.path)
+        except FileNotFoundError:
+            pass                # evicted since the lookup
+    return await pool.render_scan(scan_data, user_data)
+
+
+async def rendered_reports(user_id: int, rows: List[dict], user_data: dict,
+                           window: int = EXPORT_WINDOW,
+                           pool: ReportRenderPool = report_pool) -> AsyncIterator[Tuple[dict, bytes]]:
+    """(scan_data, pdf) for every row, in order, with up to `window` renders in flight."""
+    inflight = deque()
+    try:
+        for start in range(0, len(rows), EXPORT_CHUNK):
+            for scan in await _load_scans(user_id, [r["id"] for r in rows[start:start + EXPORT_CHUNK]]):
+                inflight.append((scan, asyncio.ensure_future(scan_report(user_id, scan, user_data, pool))))
+                if len(inflight) > window:
+                    scan_data, task = inflight.popleft()
+                    yield scan_data, await task
+        while inflight:
+            scan_data, task = inflight.popleft()
+            yield scan_data, await task
+    finally:
+        for _, task in inflight:        # client went away mid-export
+            task.cancel()
+
+
+async def _numbered(items):
+    done = 0
+    async for item in items:
+        done += 1
+        yield done, item
+
+
+# ── Consolidated PDF ──────────────────────────────────────────────────────────
+async def export_pdf(user, rows: List[dict], progress: Optional[Callable[[int], None]] = None,
+                     pool: ReportRenderPool = report_pool) -> AsyncIterator[bytes]:
+    user_data = report_user_data(user)
+    pdf = PdfConcatenator("DermAssist AI Screening History", "DermAssist AI Platform")
+    yield pdf.start()
+    yield pdf.add(await pool.render_summary(rows, user_data))
+    async for done, (_, report) in _numbered(rendered_reports(user.id, rows, user_data, pool=pool)):
+        yield pdf.add(report)
+        if progress is not None:
+            progress(done)
+    yield pdf.finish()
+
+
+# ── ZIP of per-scan PDFs ──────────────────────────────────────────────────────
+class _ChunkSink:
+    """Write-only file for ZipFile; without tell() it writes a streamable ZIP."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_entry(name: str, created_at: str) -> zipfile.ZipInfo:
+    try:
+        stamp = datetime.fromisoformat(str(created_at).replace("Z", ""))
+    except ValueError:
+        stamp = datetime.now()
+    return zipfile.ZipInfo(name, date_time=stamp.timetuple()[:6])
+
+
+async def export_zip(user, rows: List[dict], progress: Optional[Callable[[int], None]] = None,
+                     pool: ReportRenderPool = report_pool) -> AsyncIterator[bytes]:
+    user_data = report_user_data(user)
+    sink = _ChunkSink()
+    # PDF page streams are already compressed; storing them keeps this cheap
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+    archive.writestr(
+        _zip_entry(f"DermAssist_History_{user.username}_Summary.pdf", datetime.now().isoformat()),
+        await pool.render_summary(rows, user_data),
+    )
+    yield sink.drain()
+    async for done, (scan, report) in _numbered(rendered_reports(user.id, rows, user_data, pool=pool)):
+        archive.writestr(_zip_entry(f"DermAssist_Report_{user.username}_Scan{scan['id']}.pdf", scan["created_at"]), report)
+        yield sink.drain()
+        if progress is not None:
+            progress(done)
+    archive.close()
+    yield sink.drain()
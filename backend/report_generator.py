@@ -2,6 +2,11 @@
 DermAssist AI — PDF Report Generator
 Place in: backend/report_generator.py
 Install:  pip install reportlab
+
+Everything that does not depend on the scan or the patient — styles, table
+styles, the header/footer text, per-class descriptions, per-risk
+recommendations — is built once at import into a ReportTemplate; a render
+only creates the patient- and scan-specific cells and lays out the page.
 """
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -12,8 +17,12 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.graphics.shapes import Drawing, Rect
 from io import BytesIO
 from datetime import datetime
+import copy
 import json
 
+# Bump whenever the layout or wording changes: cached reports are keyed on it
+TEMPLATE_VERSION = "1"
+
 BRAND_BLUE   = colors.HexColor('#1d4ed8')
 BRAND_DARK   = colors.HexColor('#0f172a')
 BRAND_GRAY   = colors.HexColor('#64748b')
@@ -55,258 +64,435 @@ CLASS_RISK = {
 }
 
 
-def generate_scan_report(scan_data: dict, user_data: dict) -> bytes:
-    buffer = BytesIO()
-    W, H   = A4
-    MG     = 18 * mm
-    CW     = W - 2 * MG
-
-    doc = SimpleDocTemplate(
-        buffer, pagesize=A4,
-        topMargin=MG, bottomMargin=MG, leftMargin=MG, rightMargin=MG,
-        title='DermAssist AI Screening Report',
-        author='DermAssist AI Platform',
-    )
-
-    def S(**kw):
-        return ParagraphStyle('_', fontName='Helvetica', fontSize=9, leading=13, textColor=BRAND_DARK, **kw)
-
-    story = []
-
-    # ── Extract values ────────────────────────────────────────────────────────
-    risk       = scan_data.get('risk_level', 'Low Risk')
-    dlabel     = scan_data.get('predicted_label', 'nv')
-    dname      = NAME_MAP.get(dlabel, dlabel)
-    conf       = float(scan_data.get('confidence_score', 0)) * 100
-    scan_id    = scan_data.get('id', 0)
-    created_at = scan_data.get('created_at', '')
-    try:
-        dt        = datetime.fromisoformat(str(created_at).replace('Z',''))
-        scan_date = dt.strftime('%d %B %Y')
-        scan_time = dt.strftime('%I:%M %p')
-    except Exception:
-        scan_date = str(created_at)[:10] if created_at else 'N/A'
-        scan_time = 'N/A'
+# ── Page geometry ─────────────────────────────────────────────────────────────
+W, H = A4
+MG   = 18 * mm
+CW   = W - 2 * MG
+
+SCORE_CLASSES = ['mel','bcc','akiec','bkl','df','vasc','nv']
+INFO_LABELS   = ['PATIENT NAME','EMAIL ADDRESS','DATE OF BIRTH','PHONE NUMBER',
+                 'SCAN DATE','SCAN TIME','GENDER','REPORT ID',
+                 'TOTAL SCANS','FIRST SCAN','LATEST SCAN']
+HEADINGS      = ['AI ANALYSIS RESULT','ABOUT THIS DIAGNOSIS',
+                 'DIFFERENTIAL DIAGNOSIS — ALL CLASS SCORES','RECOMMENDED ACTION',
+                 'SCAN HISTORY']
+CLASS_RISK_COLORS = {'High':RISK_COLORS['High Risk'],'Moderate':RISK_COLORS['Moderate Risk'],'Low':RISK_COLORS['Low Risk']}
+
+
+class StaticParagraph(Paragraph):
+    """
+    Paragraph whose text never changes, so its line breaks at a given width
+    never change either: the first wrap at a width is remembered and shared
+    by every shallow copy.
+    """
+    _LAYOUT = ('width', 'height', 'blPara', 'frags', '_wrapWidths', '_width_max')
+
+    def __init__(self, text, style):
+        super().__init__(text, style)
+        self._layouts = {}
 
-    now       = datetime.now().strftime('%d %B %Y, %I:%M %p')
-    report_id = f'RPT-{str(scan_id).zfill(6)}'
-    rcol      = RISK_COLORS.get(risk, BRAND_GRAY)
-    rbg       = RISK_BG.get(risk, BRAND_LIGHT)
+    def wrap(self, availWidth, availHeight):
+        layout = self._layouts.get(availWidth)
+        if layout is not None:
+            self.__dict__.update(layout)
+            return self.width, self.height
+        size = super().wrap(availWidth, availHeight)
+        if size[0] > 0:
+            self._layouts[availWidth] = {k: getattr(self, k) for k in self._LAYOUT if hasattr(self, k)}
+        return size
 
-    raw_scores = {}
+
+def _scan_date(created_at):
+    """(date, time) strings for a scan's created_at."""
     try:
-        raw = scan_data.get('raw_output', '{}')
-        raw_scores = json.loads(raw) if isinstance(raw, str) else (raw or {})
+        dt = datetime.fromisoformat(str(created_at).replace('Z',''))
+        return dt.strftime('%d %B %Y'), dt.strftime('%I:%M %p')
     except Exception:
-        pass
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # HEADER BANNER
-    # ══════════════════════════════════════════════════════════════════════════
-    hdr = Table([[
-        Table([[
-            Paragraph('DermAssist AI',
-                S(fontSize=20, fontName='Helvetica-Bold', textColor=WHITE)),
-            Paragraph('AI-Based Skin Lesion Screening Platform',
-                S(fontSize=8.5, textColor=colors.HexColor('#bfdbfe'))),
-            Paragraph('www.dermassist.ai  |  support@dermassist.ai',
-                S(fontSize=7.5, textColor=colors.HexColor('#93c5fd'))),
-        ]], colWidths=[105*mm],
-        style=TableStyle([('TOPPADDING',(0,0),(-1,-1),2),('BOTTOMPADDING',(0,0),(-1,-1),2),('LEFTPADDING',(0,0),(-1,-1),0),('RIGHTPADDING',(0,0),(-1,-1),0)])),
-
-        Table([[
-            Paragraph('SCREENING REPORT',
-                S(fontSize=9, fontName='Helvetica-Bold', textColor=WHITE, alignment=TA_RIGHT)),
-            Paragraph(report_id,
-                S(fontSize=8, textColor=colors.HexColor('#bfdbfe'), alignment=TA_RIGHT)),
-            Paragraph(f'Generated: {now}',
-                S(fontSize=7, textColor=colors.HexColor('#93c5fd'), alignment=TA_RIGHT)),
-        ]], colWidths=[58*mm],
-        style=TableStyle([('TOPPADDING',(0,0),(-1,-1),2),('BOTTOMPADDING',(0,0),(-1,-1),2),('LEFTPADDING',(0,0),(-1,-1),0),('RIGHTPADDING',(0,0),(-1,-1),0)])),
-    ]], colWidths=[105*mm, 58*mm])
-    hdr.setStyle(TableStyle([
-        ('BACKGROUND',    (0,0),(-1,-1), BRAND_BLUE),
-        ('TOPPADDING',    (0,0),(-1,-1), 7*mm),
-        ('BOTTOMPADDING', (0,0),(-1,-1), 7*mm),
-        ('LEFTPADDING',   (0,0),(0,-1),  6*mm),
-        ('RIGHTPADDING',  (1,0),(1,-1),  6*mm),
-        ('VALIGN',        (0,0),(-1,-1), 'MIDDLE'),
-    ]))
-    story.append(hdr)
-    story.append(Spacer(1, 5*mm))
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # PATIENT + SCAN INFO
-    # ══════════════════════════════════════════════════════════════════════════
-    def icell(lbl, val):
-        return Table([
-            [Paragraph(lbl, S(fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9))],
-            [Paragraph(str(val) if val else '—', S(fontSize=10, fontName='Helvetica-Bold', textColor=BRAND_DARK, leading=13))],
-        ], colWidths=[80*mm],
-        style=TableStyle([('TOPPADDING',(0,0),(-1,-1),0),('BOTTOMPADDING',(0,0),(-1,-1),0),('LEFTPADDING',(0,0),(-1,-1),0),('RIGHTPADDING',(0,0),(-1,-1),0)]))
-
-    info = Table([
-        [icell('PATIENT NAME',  user_data.get('full_name')),       icell('SCAN DATE',  scan_date)],
-        [icell('EMAIL ADDRESS', user_data.get('email')),           icell('SCAN TIME',  scan_time)],
-        [icell('DATE OF BIRTH', user_data.get('date_of_birth')),   icell('GENDER',     user_data.get('gender'))],
-        [icell('PHONE NUMBER',  user_data.get('phone_number')),    icell('REPORT ID',  report_id)],
-    ], colWidths=[83*mm, 83*mm])
-    info.setStyle(TableStyle([
-        ('BACKGROUND',    (0,0),(-1,-1), BRAND_LIGHT),
-        ('BOX',           (0,0),(-1,-1), 0.5, BRAND_BORDER),
-        ('INNERGRID',     (0,0),(-1,-1), 0.3, BRAND_BORDER),
-        ('TOPPADDING',    (0,0),(-1,-1), 3.5*mm),
-        ('BOTTOMPADDING', (0,0),(-1,-1), 3.5*mm),
-        ('LEFTPADDING',   (0,0),(-1,-1), 4*mm),
-        ('RIGHTPADDING',  (0,0),(-1,-1), 4*mm),
-    ]))
-    story.append(info)
-    story.append(Spacer(1, 4*mm))
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # RESULT BANNER
-    # ══════════════════════════════════════════════════════════════════════════
-    story.append(Paragraph('AI ANALYSIS RESULT',
-        S(fontSize=11, fontName='Helvetica-Bold', textColor=BRAND_DARK, spaceBefore=4, spaceAfter=3)))
-
-    rl = Table([
-        [Paragraph('PRIMARY DIAGNOSIS',  S(fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9))],
-        [Paragraph(dname,                S(fontSize=17, fontName='Helvetica-Bold', textColor=BRAND_DARK, leading=22))],
-        [Paragraph(f'Code: {dlabel.upper()}', S(fontSize=7.5, textColor=BRAND_GRAY, leading=10))],
-        [Spacer(1, 3*mm)],
-        [Paragraph('RISK LEVEL',         S(fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9))],
-        [Paragraph(risk,                 S(fontSize=14, fontName='Helvetica-Bold', textColor=rcol, leading=18))],
-    ], colWidths=[88*mm],
-    style=TableStyle([('TOPPADDING',(0,0),(-1,-1),1.5),('BOTTOMPADDING',(0,0),(-1,-1),1.5),('LEFTPADDING',(0,0),(-1,-1),0),('RIGHTPADDING',(0,0),(-1,-1),0)]))
-
-    rr = Table([
-        [Paragraph('AI CONFIDENCE SCORE', S(fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9, alignment=TA_CENTER))],
-        [Paragraph(f'{conf:.1f}%',        S(fontSize=36, fontName='Helvetica-Bold', textColor=BRAND_BLUE, alignment=TA_CENTER, leading=44))],
-        [Paragraph('DermAssist v2.0',     S(fontSize=8, textColor=BRAND_GRAY, alignment=TA_CENTER, leading=11))],
-        [Paragraph('TFLite · 128×128',    S(fontSize=7.5, textColor=BRAND_GRAY, alignment=TA_CENTER, leading=10))],
-    ], colWidths=[70*mm],
-    style=TableStyle([('TOPPADDING',(0,0),(-1,-1),1.5),('BOTTOMPADDING',(0,0),(-1,-1),1.5),('LEFTPADDING',(0,0),(-1,-1),0),('RIGHTPADDING',(0,0),(-1,-1),0)]))
-
-    res = Table([[rl, rr]], colWidths=[93*mm, 73*mm])
-    res.setStyle(TableStyle([
-        ('BACKGROUND',    (0,0),(0,-1), rbg),
-        ('BACKGROUND',    (1,0),(1,-1), BRAND_LIGHT),
-        ('BOX',           (0,0),(-1,-1), 1.5, rcol),
-        ('LINEAFTER',     (0,0),(0,-1), 0.5, BRAND_BORDER),
-        ('TOPPADDING',    (0,0),(-1,-1), 5*mm),
-        ('BOTTOMPADDING', (0,0),(-1,-1), 5*mm),
-        ('LEFTPADDING',   (0,0),(-1,-1), 5*mm),
-        ('RIGHTPADDING',  (0,0),(-1,-1), 5*mm),
-        ('VALIGN',        (0,0),(-1,-1), 'MIDDLE'),
-    ]))
-    story.append(res)
-    story.append(Spacer(1, 4*mm))
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ABOUT DIAGNOSIS
-    # ══════════════════════════════════════════════════════════════════════════
-    story.append(Paragraph('ABOUT THIS DIAGNOSIS',
-        S(fontSize=11, fontName='Helvetica-Bold', textColor=BRAND_DARK, spaceBefore=4, spaceAfter=3)))
-    dbox = Table([[Paragraph(DESCRIPTIONS.get(dlabel,''), S(fontSize=9, leading=14, textColor=colors.HexColor('#374151')))]], colWidths=[CW])
-    dbox.setStyle(TableStyle([
-        ('BACKGROUND',(0,0),(-1,-1),BRAND_LIGHT),('BOX',(0,0),(-1,-1),0.5,BRAND_BORDER),
-        ('TOPPADDING',(0,0),(-1,-1),4*mm),('BOTTOMPADDING',(0,0),(-1,-1),4*mm),
-        ('LEFTPADDING',(0,0),(-1,-1),5*mm),('RIGHTPADDING',(0,0),(-1,-1),5*mm),
-    ]))
-    story.append(dbox)
-    story.append(Spacer(1, 4*mm))
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ALL CLASS SCORES
-    # ══════════════════════════════════════════════════════════════════════════
-    story.append(Paragraph('DIFFERENTIAL DIAGNOSIS — ALL CLASS SCORES',
-        S(fontSize=11, fontName='Helvetica-Bold', textColor=BRAND_DARK, spaceBefore=4, spaceAfter=3)))
-
-    rows = [[
-        Paragraph('CONDITION',  S(fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)),
-        Paragraph('CODE',       S(fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)),
-        Paragraph('RISK',       S(fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)),
-        Paragraph('SCORE %',    S(fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)),
-        Paragraph('VISUAL BAR', S(fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)),
-    ]]
-
-    rclrs = {'High':RISK_COLORS['High Risk'],'Moderate':RISK_COLORS['Moderate Risk'],'Low':RISK_COLORS['Low Risk']}
-    for cls in sorted(['mel','bcc','akiec','bkl','df','vasc','nv'], key=lambda c: raw_scores.get(c,0), reverse=True):
-        sc     = raw_scores.get(cls, 0)
-        pct    = round(sc * 100, 1)
-        rt     = CLASS_RISK.get(cls,'Low')
-        rclr   = rclrs.get(rt, BRAND_GRAY)
-        is_top = (cls == dlabel)
-
-        bar = Drawing(50*mm, 7)
-        bar.add(Rect(0,0,50*mm,7,fillColor=BRAND_BORDER,strokeColor=None))
-        bar.add(Rect(0,0,50*mm*sc,7,fillColor=rclr if is_top else colors.HexColor('#93c5fd'),strokeColor=None))
-
-        fn = 'Helvetica-Bold' if is_top else 'Helvetica'
-        rows.append([
-            Paragraph(NAME_MAP.get(cls,cls), S(fontSize=9,fontName=fn,textColor=BRAND_DARK if is_top else BRAND_GRAY)),
-            Paragraph(cls.upper(),           S(fontSize=8,fontName='Helvetica',textColor=BRAND_GRAY)),
-            Paragraph(rt,                    S(fontSize=8,fontName='Helvetica-Bold',textColor=rclr)),
-            Paragraph(f'{pct}%',             S(fontSize=9,fontName='Helvetica-Bold',textColor=BRAND_BLUE if is_top else BRAND_GRAY)),
-            bar,
+        return (str(created_at)[:10] if created_at else 'N/A'), 'N/A'
+
+
+def _cell_padding(v):
+    return TableStyle([('TOPPADDING',(0,0),(-1,-1),v),('BOTTOMPADDING',(0,0),(-1,-1),v),('LEFTPADDING',(0,0),(-1,-1),0),('RIGHTPADDING',(0,0),(-1,-1),0)])
+
+
+class ReportTemplate:
+    """
+    The static part of a screening report, built once.
+    Styles are interned, so equal style arguments share one ParagraphStyle.
+    Static Paragraphs are parsed here and shallow-copied into each story:
+    the parsed text is shared, the layout state set while wrapping is not,
+    so concurrent renders can use the same template.
+    """
+
+    def __init__(self):
+        self._styles = {}
+        self._risks  = {}
+        P = self.static
+
+        # Header banner
+        self.brand = [
+            P('DermAssist AI', fontSize=20, fontName='Helvetica-Bold', textColor=WHITE),
+            P('AI-Based Skin Lesion Screening Platform', fontSize=8.5, textColor=colors.HexColor('#bfdbfe')),
+            P('www.dermassist.ai  |  support@dermassist.ai', fontSize=7.5, textColor=colors.HexColor('#93c5fd')),
+        ]
+        self.report_title = P('SCREENING REPORT', fontSize=9, fontName='Helvetica-Bold', textColor=WHITE, alignment=TA_RIGHT)
+        self.report_id_style = self.style(fontSize=8, textColor=colors.HexColor('#bfdbfe'), alignment=TA_RIGHT)
+        self.generated_style = self.style(fontSize=7, textColor=colors.HexColor('#93c5fd'), alignment=TA_RIGHT)
+        self.header_cell_style = _cell_padding(2)
+        self.header_style = TableStyle([
+            ('BACKGROUND',    (0,0),(-1,-1), BRAND_BLUE),
+            ('TOPPADDING',    (0,0),(-1,-1), 7*mm),
+            ('BOTTOMPADDING', (0,0),(-1,-1), 7*mm),
+            ('LEFTPADDING',   (0,0),(0,-1),  6*mm),
+            ('RIGHTPADDING',  (1,0),(1,-1),  6*mm),
+            ('VALIGN',        (0,0),(-1,-1), 'MIDDLE'),
         ])
 
-    st = Table(rows, colWidths=[52*mm,17*mm,22*mm,22*mm,53*mm])
-    st.setStyle(TableStyle([
-        ('BACKGROUND',(0,0),(-1,0),BRAND_DARK),
-        ('TOPPADDING',(0,0),(-1,0),3.5*mm),('BOTTOMPADDING',(0,0),(-1,0),3.5*mm),
-        ('TOPPADDING',(0,1),(-1,-1),3*mm),('BOTTOMPADDING',(0,1),(-1,-1),3*mm),
-        ('LEFTPADDING',(0,0),(-1,-1),3.5*mm),('RIGHTPADDING',(0,0),(-1,-1),3.5*mm),
-        ('ROWBACKGROUNDS',(0,1),(-1,-1),[WHITE,BRAND_LIGHT]),
-        ('VALIGN',(0,0),(-1,-1),'MIDDLE'),
-        ('BOX',(0,0),(-1,-1),0.5,BRAND_BORDER),
-        ('INNERGRID',(0,0),(-1,-1),0.3,BRAND_BORDER),
-        ('BACKGROUND',(0,1),(-1,1),colors.HexColor('#eff6ff')),
-    ]))
-    story.append(st)
-    story.append(Spacer(1, 4*mm))
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # RECOMMENDATION
-    # ══════════════════════════════════════════════════════════════════════════
-    story.append(Paragraph('RECOMMENDED ACTION',
-        S(fontSize=11, fontName='Helvetica-Bold', textColor=BRAND_DARK, spaceBefore=4, spaceAfter=3)))
-    rb = Table([[
-        Paragraph('⚕', S(fontSize=22, textColor=rcol, alignment=TA_CENTER)),
-        Paragraph(RECOMMENDATIONS.get(risk,''),
-            S(fontSize=10, fontName='Helvetica-Bold', textColor=rcol, leading=15)),
-    ]], colWidths=[14*mm, CW-14*mm])
-    rb.setStyle(TableStyle([
-        ('BACKGROUND',(0,0),(-1,-1),rbg),('BOX',(0,0),(-1,-1),1.5,rcol),
-        ('TOPPADDING',(0,0),(-1,-1),5*mm),('BOTTOMPADDING',(0,0),(-1,-1),5*mm),
-        ('LEFTPADDING',(0,0),(-1,-1),4*mm),('RIGHTPADDING',(0,0),(-1,-1),4*mm),
-        ('VALIGN',(0,0),(-1,-1),'MIDDLE'),
-    ]))
-    story.append(rb)
-    story.append(Spacer(1, 5*mm))
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # FOOTER
-    # ══════════════════════════════════════════════════════════════════════════
-    story.append(HRFlowable(width=CW, thickness=0.5, color=BRAND_BORDER))
-    story.append(Spacer(1, 3*mm))
-    ft = Table([[
-        Paragraph(
+        # Patient + scan info
+        self.info_labels = {lbl: P(lbl, fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9) for lbl in INFO_LABELS}
+        self.info_value_style = self.style(fontSize=10, fontName='Helvetica-Bold', textColor=BRAND_DARK, leading=13)
+        self.info_cell_style  = _cell_padding(0)
+        self.info_style = TableStyle([
+            ('BACKGROUND',    (0,0),(-1,-1), BRAND_LIGHT),
+            ('BOX',           (0,0),(-1,-1), 0.5, BRAND_BORDER),
+            ('INNERGRID',     (0,0),(-1,-1), 0.3, BRAND_BORDER),
+            ('TOPPADDING',    (0,0),(-1,-1), 3.5*mm),
+            ('BOTTOMPADDING', (0,0),(-1,-1), 3.5*mm),
+            ('LEFTPADDING',   (0,0),(-1,-1), 4*mm),
+            ('RIGHTPADDING',  (0,0),(-1,-1), 4*mm),
+        ])
+
+        self.headings = {h: P(h, fontSize=11, fontName='Helvetica-Bold', textColor=BRAND_DARK, spaceBefore=4, spaceAfter=3) for h in HEADINGS}
+
+        # Result banner
+        self.primary_label = P('PRIMARY DIAGNOSIS', fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9)
+        self.risk_label    = P('RISK LEVEL', fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9)
+        self.dname_style   = self.style(fontSize=17, fontName='Helvetica-Bold', textColor=BRAND_DARK, leading=22)
+        self.dcode_style   = self.style(fontSize=7.5, textColor=BRAND_GRAY, leading=10)
+        self.dnames = {cls: StaticParagraph(name, self.dname_style) for cls, name in NAME_MAP.items()}
+        self.dcodes = {cls: StaticParagraph(f'Code: {cls.upper()}', self.dcode_style) for cls in NAME_MAP}
+        self.conf_label = P('AI CONFIDENCE SCORE', fontSize=7, fontName='Helvetica-Bold', textColor=BRAND_GRAY, leading=9, alignment=TA_CENTER)
+        self.conf_style = self.style(fontSize=36, fontName='Helvetica-Bold', textColor=BRAND_BLUE, alignment=TA_CENTER, leading=44)
+        self.model_lines = [
+            P('DermAssist v2.0', fontSize=8, textColor=BRAND_GRAY, alignment=TA_CENTER, leading=11),
+            P('TFLite · 128×128', fontSize=7.5, textColor=BRAND_GRAY, alignment=TA_CENTER, leading=10),
+        ]
+        self.result_cell_style = _cell_padding(1.5)
+
+        # About this diagnosis
+        self.description_style = self.style(fontSize=9, leading=14, textColor=colors.HexColor('#374151'))
+        self.descriptions = {cls: StaticParagraph(text, self.description_style) for cls, text in DESCRIPTIONS.items()}
+        self.description_box_style = TableStyle([
+            ('BACKGROUND',(0,0),(-1,-1),BRAND_LIGHT),('BOX',(0,0),(-1,-1),0.5,BRAND_BORDER),
+            ('TOPPADDING',(0,0),(-1,-1),4*mm),('BOTTOMPADDING',(0,0),(-1,-1),4*mm),
+            ('LEFTPADDING',(0,0),(-1,-1),5*mm),('RIGHTPADDING',(0,0),(-1,-1),5*mm),
+        ])
+
+        # Class scores
+        self.score_header = [P(h, fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)
+                             for h in ('CONDITION', 'CODE', 'RISK', 'SCORE %', 'VISUAL BAR')]
+        self.score_names = {
+            (cls, is_top): P(NAME_MAP.get(cls,cls), fontSize=9, fontName='Helvetica-Bold' if is_top else 'Helvetica',
+                             textColor=BRAND_DARK if is_top else BRAND_GRAY)
+            for cls in SCORE_CLASSES for is_top in (True, False)
+        }
+        self.score_codes = {cls: P(cls.upper(), fontSize=8, fontName='Helvetica', textColor=BRAND_GRAY) for cls in SCORE_CLASSES}
+        self.score_risks = {
+            cls: P(CLASS_RISK.get(cls,'Low'), fontSize=8, fontName='Helvetica-Bold',
+                   textColor=CLASS_RISK_COLORS.get(CLASS_RISK.get(cls,'Low'), BRAND_GRAY))
+            for cls in SCORE_CLASSES
+        }
+        self.pct_styles = {
+            is_top: self.style(fontSize=9, fontName='Helvetica-Bold', textColor=BRAND_BLUE if is_top else BRAND_GRAY)
+            for is_top in (True, False)
+        }
+        self.score_table_style = TableStyle([
+            ('BACKGROUND',(0,0),(-1,0),BRAND_DARK),
+            ('TOPPADDING',(0,0),(-1,0),3.5*mm),('BOTTOMPADDING',(0,0),(-1,0),3.5*mm),
+            ('TOPPADDING',(0,1),(-1,-1),3*mm),('BOTTOMPADDING',(0,1),(-1,-1),3*mm),
+            ('LEFTPADDING',(0,0),(-1,-1),3.5*mm),('RIGHTPADDING',(0,0),(-1,-1),3.5*mm),
+            ('ROWBACKGROUNDS',(0,1),(-1,-1),[WHITE,BRAND_LIGHT]),
+            ('VALIGN',(0,0),(-1,-1),'MIDDLE'),
+            ('BOX',(0,0),(-1,-1),0.5,BRAND_BORDER),
+            ('INNERGRID',(0,0),(-1,-1),0.3,BRAND_BORDER),
+            ('BACKGROUND',(0,1),(-1,1),colors.HexColor('#eff6ff')),
+        ])
+
+        # History summary
+        self.history_title = P('SCREENING HISTORY', fontSize=9, fontName='Helvetica-Bold', textColor=WHITE, alignment=TA_RIGHT)
+        self.history_header = [P(h, fontSize=8, fontName='Helvetica-Bold', textColor=WHITE)
+                               for h in ('REPORT ID', 'SCAN DATE', 'DIAGNOSIS', 'RISK', 'CONFIDENCE')]
+        self.history_cell_style  = self.style(fontSize=8.5, leading=11)
+        self.history_table_style = TableStyle([
+            ('BACKGROUND',(0,0),(-1,0),BRAND_DARK),
+            ('TOPPADDING',(0,0),(-1,-1),2.5*mm),('BOTTOMPADDING',(0,0),(-1,-1),2.5*mm),
+            ('LEFTPADDING',(0,0),(-1,-1),3*mm),('RIGHTPADDING',(0,0),(-1,-1),3*mm),
+            ('ROWBACKGROUNDS',(0,1),(-1,-1),[WHITE,BRAND_LIGHT]),
+            ('VALIGN',(0,0),(-1,-1),'MIDDLE'),
+            ('BOX',(0,0),(-1,-1),0.5,BRAND_BORDER),
+            ('INNERGRID',(0,0),(-1,-1),0.3,BRAND_BORDER),
+        ])
+
+        # Footer
+        self.rule       = HRFlowable(width=CW, thickness=0.5, color=BRAND_BORDER)
+        self.disclaimer = P(
             '<b>DermAssist AI</b> · AI-Based Skin Lesion Screening Platform<br/>'
             'This report is generated by an AI model for <b>screening purposes only</b> and does <b>NOT</b> '
             'constitute a medical diagnosis. Always consult a qualified dermatologist or healthcare professional.',
-            S(fontSize=7.5, textColor=BRAND_GRAY, leading=11)
-        ),
-        Paragraph(
-            f'<b>Report Date:</b> {now}<br/><b>Model:</b> DermAssist v2.0<br/><b>Classes:</b> 7 (HAM10000)',
-            S(fontSize=7.5, textColor=BRAND_GRAY, alignment=TA_RIGHT, leading=11)
-        ),
-    ]], colWidths=[115*mm, 51*mm])
-    ft.setStyle(TableStyle([
-        ('VALIGN',(0,0),(-1,-1),'TOP'),('TOPPADDING',(0,0),(-1,-1),0),('BOTTOMPADDING',(0,0),(-1,-1),0),
-        ('LEFTPADDING',(0,0),(0,-1),0),('RIGHTPADDING',(1,0),(1,-1),0),
-    ]))
-    story.append(ft)
-
-    doc.build(story)
-    return buffer.getvalue()
\ No newline at end of file
+            fontSize=7.5, textColor=BRAND_GRAY, leading=11)
+        self.footer_meta_style = self.style(fontSize=7.5, textColor=BRAND_GRAY, alignment=TA_RIGHT, leading=11)
+        self.footer_style = TableStyle([
+            ('VALIGN',(0,0),(-1,-1),'TOP'),('TOPPADDING',(0,0),(-1,-1),0),('BOTTOMPADDING',(0,0),(-1,-1),0),
+            ('LEFTPADDING',(0,0),(0,-1),0),('RIGHTPADDING',(1,0),(1,-1),0),
+        ])
+
+        for risk in RISK_COLORS:
+            self.risk_parts(risk)
+
+    # ── Building blocks ───────────────────────────────────────────────────────
+    def style(self, **kw) -> ParagraphStyle:
+        """Interned ParagraphStyle with the report defaults."""
+        attrs = dict(fontName='Helvetica', fontSize=9, leading=13, textColor=BRAND_DARK)
+        attrs.update(kw)
+        key = tuple(sorted(attrs.items()))
+        style = self._styles.get(key)
+        if style is None:
+            style = self._styles.setdefault(key, ParagraphStyle('_', **attrs))
+        return style
+
+    def static(self, text, **kw) -> StaticParagraph:
+        return StaticParagraph(text, self.style(**kw))
+
+    def risk_parts(self, risk: str) -> dict:
+        """Colours, paragraphs and table styles that depend only on the risk level."""
+        parts = self._risks.get(risk)
+        if parts is not None:
+            return parts
+        rcol = RISK_COLORS.get(risk, BRAND_GRAY)
+        rbg  = RISK_BG.get(risk, BRAND_LIGHT)
+        parts = {
+            'label':  self.static(risk, fontSize=14, fontName='Helvetica-Bold', textColor=rcol, leading=18),
+            'cell':   self.static(risk, fontSize=8.5, fontName='Helvetica-Bold', textColor=rcol, leading=11),
+            'icon':   self.static('⚕', fontSize=22, textColor=rcol, alignment=TA_CENTER),
+            'advice': self.static(RECOMMENDATIONS.get(risk,''), fontSize=10, fontName='Helvetica-Bold', textColor=rcol, leading=15),
+            'result_style': TableStyle([
+                ('BACKGROUND',    (0,0),(0,-1), rbg),
+                ('BACKGROUND',    (1,0),(1,-1), BRAND_LIGHT),
+                ('BOX',           (0,0),(-1,-1), 1.5, rcol),
+                ('LINEAFTER',     (0,0),(0,-1), 0.5, BRAND_BORDER),
+                ('TOPPADDING',    (0,0),(-1,-1), 5*mm),
+                ('BOTTOMPADDING', (0,0),(-1,-1), 5*mm),
+                ('LEFTPADDING',   (0,0),(-1,-1), 5*mm),
+                ('RIGHTPADDING',  (0,0),(-1,-1), 5*mm),
+                ('VALIGN',        (0,0),(-1,-1), 'MIDDLE'),
+            ]),
+            'advice_style': TableStyle([
+                ('BACKGROUND',(0,0),(-1,-1),rbg),('BOX',(0,0),(-1,-1),1.5,rcol),
+                ('TOPPADDING',(0,0),(-1,-1),5*mm),('BOTTOMPADDING',(0,0),(-1,-1),5*mm),
+                ('LEFTPADDING',(0,0),(-1,-1),4*mm),('RIGHTPADDING',(0,0),(-1,-1),4*mm),
+                ('VALIGN',(0,0),(-1,-1),'MIDDLE'),
+            ]),
+        }
+        return self._risks.setdefault(risk, parts)
+
+    # ── Render ────────────────────────────────────────────────────────────────
+    def render(self, scan_data: dict, user_data: dict) -> bytes:
+        buffer = BytesIO()
+        doc = self._document(buffer, 'DermAssist AI Screening Report')
+        c = copy.copy
+        story = []
+
+        # ── Extract values ────────────────────────────────────────────────────
+        risk       = scan_data.get('risk_level', 'Low Risk')
+        dlabel     = scan_data.get('predicted_label', 'nv')
+        conf       = float(scan_data.get('confidence_score', 0)) * 100
+        scan_id    = scan_data.get('id', 0)
+        scan_date, scan_time = _scan_date(scan_data.get('created_at', ''))
+
+        now       = datetime.now().strftime('%d %B %Y, %I:%M %p')
+        report_id = f'RPT-{str(scan_id).zfill(6)}'
+        rp        = self.risk_parts(risk)
+
+        raw_scores = {}
+        try:
+            raw = scan_data.get('raw_output', '{}')
+            raw_scores = json.loads(raw) if isinstance(raw, str) else (raw or {})
+        except Exception:
+            pass
+
+        # ── Header banner ─────────────────────────────────────────────────────
+        story.append(self._header(self.report_title, report_id, now))
+        story.append(Spacer(1, 5*mm))
+
+        # ── Patient + scan info ───────────────────────────────────────────────
+        icell = self._info_cell
+        info = Table([
+            [icell('PATIENT NAME',  user_data.get('full_name')),       icell('SCAN DATE',  scan_date)],
+            [icell('EMAIL ADDRESS', user_data.get('email')),           icell('SCAN TIME',  scan_time)],
+            [icell('DATE OF BIRTH', user_data.get('date_of_birth')),   icell('GENDER',     user_data.get('gender'))],
+            [icell('PHONE NUMBER',  user_data.get('phone_number')),    icell('REPORT ID',  report_id)],
+        ], colWidths=[83*mm, 83*mm])
+        info.setStyle(self.info_style)
+        story.append(info)
+        story.append(Spacer(1, 4*mm))
+
+        # ── Result banner ─────────────────────────────────────────────────────
+        story.append(c(self.headings['AI ANALYSIS RESULT']))
+        dname = self.dnames.get(dlabel)
+        dcode = self.dcodes.get(dlabel)
+        rl = Table([
+            [c(self.primary_label)],
+            [c(dname) if dname else Paragraph(NAME_MAP.get(dlabel, dlabel), self.dname_style)],
+            [c(dcode) if dcode else Paragraph(f'Code: {dlabel.upper()}', self.dcode_style)],
+            [Spacer(1, 3*mm)],
+            [c(self.risk_label)],
+            [c(rp['label'])],
+        ], colWidths=[88*mm], style=self.result_cell_style)
+
+        rr = Table([
+            [c(self.conf_label)],
+            [Paragraph(f'{conf:.1f}%', self.conf_style)],
+            [c(self.model_lines[0])],
+            [c(self.model_lines[1])],
+        ], colWidths=[70*mm], style=self.result_cell_style)
+
+        res = Table([[rl, rr]], colWidths=[93*mm, 73*mm])
+        res.setStyle(rp['result_style'])
+        story.append(res)
+        story.append(Spacer(1, 4*mm))
+
+        # ── About this diagnosis ──────────────────────────────────────────────
+        story.append(c(self.headings['ABOUT THIS DIAGNOSIS']))
+        desc = self.descriptions.get(dlabel)
+        dbox = Table([[c(desc) if desc else Paragraph('', self.description_style)]], colWidths=[CW])
+        dbox.setStyle(self.description_box_style)
+        story.append(dbox)
+        story.append(Spacer(1, 4*mm))
+
+        # ── All class scores ──────────────────────────────────────────────────
+        story.append(c(self.headings['DIFFERENTIAL DIAGNOSIS — ALL CLASS SCORES']))
+        rows = [[c(p) for p in self.score_header]]
+        for cls in sorted(SCORE_CLASSES, key=lambda k: raw_scores.get(k,0), reverse=True):
+            sc     = raw_scores.get(cls, 0)
+            pct    = round(sc * 100, 1)
+            rclr   = CLASS_RISK_COLORS.get(CLASS_RISK.get(cls,'Low'), BRAND_GRAY)
+            is_top = (cls == dlabel)
+
+            bar = Drawing(50*mm, 7)
+            bar.add(Rect(0,0,50*mm,7,fillColor=BRAND_BORDER,strokeColor=None))
+            bar.add(Rect(0,0,50*mm*sc,7,fillColor=rclr if is_top else colors.HexColor('#93c5fd'),strokeColor=None))
+
+            rows.append([
+                c(self.score_names[cls, is_top]),
+                c(self.score_codes[cls]),
+                c(self.score_risks[cls]),
+                Paragraph(f'{pct}%', self.pct_styles[is_top]),
+                bar,
+            ])
+
+        st = Table(rows, colWidths=[52*mm,17*mm,22*mm,22*mm,53*mm])
+        st.setStyle(self.score_table_style)
+        story.append(st)
+        story.append(Spacer(1, 4*mm))
+
+        # ── Recommendation ────────────────────────────────────────────────────
+        story.append(c(self.headings['RECOMMENDED ACTION']))
+        rb = Table([[c(rp['icon']), c(rp['advice'])]], colWidths=[14*mm, CW-14*mm])
+        rb.setStyle(rp['advice_style'])
+        story.append(rb)
+        story.append(Spacer(1, 5*mm))
+
+        # ── Footer ────────────────────────────────────────────────────────────
+        story.extend(self._footer(now))
+
+        doc.build(story)
+        return buffer.getvalue()
+
+    def render_summary(self, scans: list, user_data: dict) -> bytes:
+        """One table listing every scan, for the front of a history export."""
+        buffer = BytesIO()
+        doc    = self._document(buffer, 'DermAssist AI Screening History')
+        c      = copy.copy
+        now    = datetime.now().strftime('%d %B %Y, %I:%M %p')
+        story  = [self._header(self.history_title, f'{len(scans)} scan{"s" if len(scans) != 1 else ""}', now),
+                  Spacer(1, 5*mm)]
+
+        dates = [_scan_date(s.get('created_at'))[0] for s in scans]
+        info = Table([
+            [self._info_cell('PATIENT NAME',  user_data.get('full_name')),     self._info_cell('TOTAL SCANS', len(scans))],
+            [self._info_cell('EMAIL ADDRESS', user_data.get('email')),         self._info_cell('FIRST SCAN',  dates[-1] if dates else None)],
+            [self._info_cell('DATE OF BIRTH', user_data.get('date_of_birth')), self._info_cell('LATEST SCAN', dates[0] if dates else None)],
+        ], colWidths=[83*mm, 83*mm])
+        info.setStyle(self.info_style)
+        story.append(info)
+        story.append(Spacer(1, 4*mm))
+
+        story.append(c(self.headings['SCAN HISTORY']))
+        rows = [[c(p) for p in self.history_header]]
+        for scan, date in zip(scans, dates):
+            risk = scan.get('risk_level') or 'Low Risk'
+            rows.append([
+                Paragraph(f"RPT-{str(scan.get('id', 0)).zfill(6)}", self.history_cell_style),
+                Paragraph(date, self.history_cell_style),
+                Paragraph(NAME_MAP.get(scan.get('predicted_label'), scan.get('diagnosis_name') or '—'), self.history_cell_style),
+                c(self.risk_parts(risk)['cell']),
+                Paragraph(f"{float(scan.get('confidence_score') or 0) * 100:.1f}%", self.history_cell_style),
+            ])
+        table = Table(rows, colWidths=[30*mm,34*mm,54*mm,26*mm,22*mm], repeatRows=1)
+        table.setStyle(self.history_table_style)
+        story.append(table)
+        story.append(Spacer(1, 5*mm))
+        story.extend(self._footer(now))
+
+        doc.build(story)
+        return buffer.getvalue()
+
+    # ── Shared sections ───────────────────────────────────────────────────────
+    def _document(self, buffer, title: str) -> SimpleDocTemplate:
+        return SimpleDocTemplate(
+            buffer, pagesize=A4,
+            topMargin=MG, bottomMargin=MG, leftMargin=MG, rightMargin=MG,
+            title=title,
+            author='DermAssist AI Platform',
+        )
+
+    def _header(self, title: Paragraph, subtitle: str, now: str) -> Table:
+        c = copy.copy
+        hdr = Table([[
+            Table([[c(p) for p in self.brand]], colWidths=[105*mm], style=self.header_cell_style),
+            Table([[
+                c(title),
+                Paragraph(subtitle, self.report_id_style),
+                Paragraph(f'Generated: {now}', self.generated_style),
+            ]], colWidths=[58*mm], style=self.header_cell_style),
+        ]], colWidths=[105*mm, 58*mm])
+        hdr.setStyle(self.header_style)
+        return hdr
+
+    def _info_cell(self, lbl: str, val) -> Table:
+        return Table([
+            [copy.copy(self.info_labels[lbl])],
+            [Paragraph(str(val) if val else '—', self.info_value_style)],
+        ], colWidths=[80*mm], style=self.info_cell_style)
+
+    def _footer(self, now: str) -> list:
+        ft = Table([[
+            copy.copy(self.disclaimer),
+            Paragraph(
+                f'<b>Report Date:</b> {now}<br/><b>Model:</b> DermAssist v2.0<br/><b>Classes:</b> 7 (HAM10000)',
+                self.footer_meta_style
+            ),
+        ]], colWidths=[115*mm, 51*mm])
+        ft.setStyle(self.footer_style)
+        return [copy.copy(self.rule), Spacer(1, 3*mm), ft]
+
+
+TEMPLATE = ReportTemplate()
+
+
+def generate_scan_report(scan_data: dict, user_data: dict) -> bytes:
+    return TEMPLATE.render(scan_data, user_data)
+
+
+def generate_history_summary(scans: list, user_data: dict) -> bytes:
+    return TEMPLATE.render_summary(scans, user_data)
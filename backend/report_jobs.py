@@ -0,0 +1,335 @@
+"""
+DermAssist AI — Report job queue
+Reports requested through /reports/jobs are rendered off the request path.
+The handler records a job in the `report_jobs` table and returns its id.
+Workers claim jobs, render them on their own report process pool (so bulk
+work never queues ahead of interactive downloads) and write the result
+under REPORT_JOB_DIR, from where /reports/jobs/{id}/download serves it.
+
+  • jobs are rows, so queued work survives a restart and any worker can
+    answer status and download requests for a job another worker ran
+  • a claim is a compare-and-set UPDATE that takes a lease; long jobs renew
+    it as they make progress, and a job whose worker died is picked up
+    again once the lease passes (up to REPORT_JOB_MAX_ATTEMPTS tries)
+  • each process runs at most REPORT_JOB_CONCURRENCY jobs at once, and a
+    user may have at most REPORT_JOB_MAX_ACTIVE jobs queued or running
+  • finished jobs and their files are deleted after REPORT_JOB_TTL_S
+
+Config (env vars):
+  REPORT_JOB_DIR            where finished results are written
+  REPORT_JOB_WORKERS        processes in the job rendering pool
+  REPORT_JOB_CONCURRENCY    jobs run at once per process
+  REPORT_JOB_MAX_ACTIVE     queued + running jobs allowed per user
+  REPORT_JOB_MAX_ATTEMPTS   tries before a job is marked failed
+  REPORT_JOB_LEASE_S        how long a claim lasts without a heartbeat
+  REPORT_JOB_POLL_S         how often idle workers look for new jobs
+  REPORT_JOB_TTL_S          how long finished results are kept
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from models.prediciton import Prediction
+from models.report_job import ReportJob
+from models.user import User
+from report_cache import report_scan_data, report_user_data
+from report_export import export_pdf, export_zip, history_rows, scan_report
+from report_workers import ReportRenderPool
+
+REPORT_JOB_DIR          = os.getenv("REPORT_JOB_DIR", "report_jobs")
+REPORT_JOB_WORKERS      = int(os.getenv("REPORT_JOB_WORKERS", "1"))
+REPORT_JOB_CONCURRENCY  = int(os.getenv("REPORT_JOB_CONCURRENCY", "2"))
+REPORT_JOB_MAX_ACTIVE   = int(os.getenv("REPORT_JOB_MAX_ACTIVE", "20"))
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "3"))
+REPORT_JOB_LEASE_S      = float(os.getenv("REPORT_JOB_LEASE_S", "120"))
+REPORT_JOB_POLL_S       = float(os.getenv("REPORT_JOB_POLL_S", "2"))
+REPORT_JOB_TTL_S        = float(os.getenv("REPORT_JOB_TTL_S", "86400"))
+
+JOB_KINDS  = ("scan", "history_pdf", "history_zip")
+EXTENSIONS = {"scan": "pdf", "history_pdf": "pdf", "history_zip": "zip"}
+FINISHED   = ("done", "failed")
+
+_SWEEP_EVERY_S = 300
+
+
+class JobFailed(Exception):
+    """A job that cannot succeed however often it is retried."""
+
+
+def job_view(job: ReportJob) -> dict:
+    return {
+        "job_id":      job.id,
+        "kind":        job.kind,
+        "scan_id":     job.scan_id,
+        "status":      job.status,
+        "progress":    job.progress,
+        "total":       job.total,
+        "attempts":    job.attempts,
+        "error":       job.error,
+        "created_at":  job.created_at.isoformat() + "Z",
+        "finished_at": job.finished_at.isoformat() + "Z" if job.finished_at else None,
+    }
+
+
+class ReportJobQueue:
+    def __init__(self, session_factory, root: str = REPORT_JOB_DIR,
+                 workers: int = REPORT_JOB_WORKERS, concurrency: int = REPORT_JOB_CONCURRENCY):
+        self.session_factory = session_factory
+        self.root            = root
+        self.pool            = ReportRenderPool(workers, max_pending=workers * 4)
+        self.concurrency     = max(concurrency, 1)
+        self._running: set   = set()
+        self._wake           = asyncio.Event()
+        self._changed        = asyncio.Event()
+        self._last_sweep     = 0.0
+        self.submitted       = 0
+        self.rejected        = 0
+        self.completed       = 0
+        self.failed          = 0
+        self.retried         = 0
+        os.makedirs(root, exist_ok=True)
+
+    # ── Producer side ─────────────────────────────────────────────────────────
+    async def submit(self, user_id: int, kind: str, scan_id: Optional[int] = None) -> Optional[dict]:
+        """Queue a job, or return None if the user already has too many active."""
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            active = await db.scalar(
+                select(func.count())
+                .select_from(ReportJob)
+                .where(ReportJob.user_id == user_id, ReportJob.status.in_(("queued", "running")))
+            )
+            if active >= REPORT_JOB_MAX_ACTIVE:
+                self.rejected += 1
+                return None
+            job = ReportJob(
+                id=uuid.uuid4().hex, user_id=user_id, kind=kind, scan_id=scan_id,
+                status="queued", attempts=0, progress=0, total=1 if kind == "scan" else 0,
+                created_at=now,
+            )
+            db.add(job)
+            await db.commit()
+        self.submitted += 1
+        self._wake.set()
+        return job_view(job)
+
+    async def get(self, job_id: str, user_id: int) -> Optional[ReportJob]:
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(ReportJob).where(ReportJob.id == job_id, ReportJob.user_id == user_id)
+            )).scalars().first()
+
+    async def wait(self, job_id: str, user_id: int, timeout: float) -> Optional[ReportJob]:
+        """Long-poll: the job once it has finished, or as it is after `timeout` seconds."""
+        loop     = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id, user_id)
+            remaining = deadline - loop.time()
+            if job is None or job.status in FINISHED or remaining <= 0:
+                return job
+            # Jobs finished here wake us at once; other workers' are seen on the next poll
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, REPORT_JOB_POLL_S))
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # ── Worker ────────────────────────────────────────────────────────────────
+    async def run(self):
+        while True:
+            try:
+                await self._claim()
+                if time.monotonic() - self._last_sweep > _SWEEP_EVERY_S:
+                    await self.sweep()
+                    self._last_sweep = time.monotonic()
+            except Exception as e:
+                print(f"⚠ Report job poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), REPORT_JOB_POLL_S)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _claim(self):
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return
+        now = datetime.utcnow()
+        claimable = or_(
+            ReportJob.status == "queued",
+            and_(ReportJob.status == "running", ReportJob.lease_until < now),
+        )
+        async with self.session_factory() as db:
+            candidates = (await db.execute(
+                select(ReportJob.id, ReportJob.attempts)
+                .where(claimable)
+                .order_by(ReportJob.created_at)
+                .limit(free * 2)
+            )).all()
+            for job_id, attempts in candidates:
+                if free <= 0:
+                    break
+                # Compare-and-set: of several workers eyeing a job only one moves it
+                claimed = await db.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == job_id, ReportJob.attempts == attempts, claimable)
+                    .values(status="running", attempts=attempts + 1, started_at=now,
+                            lease_until=now + timedelta(seconds=REPORT_JOB_LEASE_S))
+                )
+                await db.commit()
+                if claimed.rowcount != 1:
+                    continue
+                if attempts:
+                    self.retried += 1
+                task = asyncio.create_task(self._execute(job_id, attempts + 1))
+                self._running.add(task)
+                task.add_done_callback(self._job_done)
+                free -= 1
+
+    def _job_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._wake.set()
+        self._notify()
+
+    async def _execute(self, job_id: str, attempt: int):
+        mine = and_(ReportJob.id == job_id, ReportJob.attempts == attempt)
+        try:
+            async with self.session_factory() as db:
+                job, user = (await db.execute(
+                    select(ReportJob, User).join(User, User.id == ReportJob.user_id).where(ReportJob.id == job_id)
+                )).one()
+            path = os.path.join(self.root, f"{job_id}.{EXTENSIONS[job.kind]}")
+            if job.kind == "scan":
+                await self._render_scan(job, user, path)
+            else:
+                await self._render_history(job, user, path, mine)
+            values = dict(status="done", result_path=path, progress=ReportJob.total, error=None)
+            self.completed += 1
+        except Exception as e:
+            final = isinstance(e, JobFailed) or attempt >= REPORT_JOB_MAX_ATTEMPTS
+            print(f"{'❌' if final else '⚠'} Report job {job_id} failed (attempt {attempt}): {e}")
+            values = dict(status="failed" if final else "queued", error=str(e)[:255])
+            if final:
+                self.failed += 1
+        values.update(lease_until=None, finished_at=datetime.utcnow() if values["status"] in FINISHED else None)
+        try:
+            async with self.session_factory() as db:
+                await db.execute(update(ReportJob).where(mine).values(**values))
+                await db.commit()
+        except Exception as e:
+            print(f"⚠ Report job {job_id} could not be updated: {e}")   # the lease will expire
+
+    async def _render_scan(self, job: ReportJob, user: User, path: str):
+        async with self.session_factory() as db:
+            scan = (await db.execute(
+                select(Prediction).where(Prediction.id == job.scan_id, Prediction.user_id == user.id)
+            )).scalars().first()
+        if scan is None:
+            raise JobFailed("Scan not found")
+        pdf = await scan_report(user.id, report_scan_data(scan), report_user_data(user), pool=self.pool)
+        await asyncio.to_thread(_write_file, path, [pdf])
+
+    async def _render_history(self, job: ReportJob, user: User, path: str, mine):
+        rows = await history_rows(user.id)
+        if not rows:
+            raise JobFailed("No scans to export")
+        done = 0
+        beat = time.monotonic()
+
+        def progress(n: int):
+            nonlocal done
+            done = n
+
+        export = export_zip if job.kind == "history_zip" else export_pdf
+        async with self.session_factory() as db:
+            await db.execute(update(ReportJob).where(mine).values(total=len(rows)))
+            await db.commit()
+        directory = os.path.dirname(path)
+        fd, tmp   = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in export(user, rows, progress=progress, pool=self.pool):
+                    await asyncio.to_thread(f.write, chunk)
+                    if time.monotonic() - beat > REPORT_JOB_LEASE_S / 3:
+                        await self._heartbeat(mine, done)
+                        beat = time.monotonic()
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    async def _heartbeat(self, mine, progress: int):
+        async with self.session_factory() as db:
+            await db.execute(update(ReportJob).where(mine).values(
+                progress=progress, lease_until=datetime.utcnow() + timedelta(seconds=REPORT_JOB_LEASE_S),
+            ))
+            await db.commit()
+
+    # ── Sweeper ───────────────────────────────────────────────────────────────
+    async def sweep(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=REPORT_JOB_TTL_S)
+        async with self.session_factory() as db:
+            stale = (await db.execute(
+                select(ReportJob.id, ReportJob.result_path)
+                .where(ReportJob.status.in_(FINISHED), ReportJob.finished_at < cutoff)
+            )).all()
+            if not stale:
+                return 0
+            await asyncio.to_thread(_remove_files, [p for _, p in stale if p])
+            await db.execute(delete(ReportJob).where(ReportJob.id.in_([job_id for job_id, _ in stale])))
+            await db.commit()
+        return len(stale)
+
+    async def shutdown(self):
+        for task in list(self._running):
+            task.cancel()               # their leases expire and another worker resumes them
+        self.pool.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "running":   len(self._running),
+            "submitted": self.submitted,
+            "rejected":  self.rejected,
+            "completed": self.completed,
+            "failed":    self.failed,
+            "retried":   self.retried,
+            "pool":      self.pool.stats(),
+        }
+
+
+def _write_file(path: str, chunks: list):
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _remove_files(paths: list):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,58 @@
+"""
+DermAssist AI — Report rendering pool
+ReportLab layout is pure-Python CPU work (~25 ms a page) that holds the
+GIL, so bulk renders run in a small dedicated process pool
+(process_pool.SpawnPool) rather than in the request threadpool, where
+they would slow every other handler. Each worker builds the
+ReportTemplate once, on import; the warm-up call triggers that at boot.
+
+The pool is started on first use; a render burst queues here, bounded.
+
+Config (env vars):
+  REPORT_WORKERS         processes in the rendering pool
+  REPORT_MAX_PENDING     renders allowed in flight; the rest wait
+"""
+import os
+
+from process_pool import SpawnPool
+from report_generator import generate_history_summary, generate_scan_report
+
+REPORT_WORKERS     = int(os.getenv("REPORT_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+REPORT_MAX_PENDING = int(os.getenv("REPORT_MAX_PENDING", str(REPORT_WORKERS * 4)))
+
+
+# ── Worker-side functions (run in the pool's processes) ───────────────────────
+def _noop():
+    return None
+
+
+def _render_scan(scan_data: dict, user_data: dict) -> bytes:
+    return generate_scan_report(scan_data, user_data)
+
+
+def _render_summary(scans: list, user_data: dict) -> bytes:
+    return generate_history_summary(scans, user_data)
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+class ReportRenderPool(SpawnPool):
+    def __init__(self, workers: int = REPORT_WORKERS, max_pending: int = REPORT_MAX_PENDING):
+        super().__init__("Report", workers, max_pending, warmup=_noop)
+        self.rendered = 0
+
+    async def _render(self, fn, *args) -> bytes:
+        result = await self.run(fn, *args)
+        self.rendered += 1
+        return result
+
+    async def render_scan(self, scan_data: dict, user_data: dict) -> bytes:
+        return await self._render(_render_scan, scan_data, user_data)
+
+    async def render_summary(self, scans: list, user_data: dict) -> bytes:
+        return await self._render(_render_summary, scans, user_data)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "rendered": self.rendered}
+
+
+report_pool = ReportRenderPool()
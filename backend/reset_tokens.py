@@ -0,0 +1,149 @@
+"""
+DermAssist AI — Password reset tokens
+Reset tokens live in the `password_reset_tokens` table, so every worker
+accepts a link issued by any other and nothing is lost on restart.
+
+  • only the SHA-256 of a token is stored; the emailed token is the secret
+  • a token is single-use: consuming it deletes it (and the user's other
+    outstanding tokens, since the password just changed)
+  • each account may request at most RESET_RATE_LIMIT tokens per
+    RESET_RATE_WINDOW_S, which also caps reset emails per address; the
+    check holds a lock on the user's row, so concurrent requests cannot
+    slip past it
+  • a background sweeper deletes expired rows every RESET_SWEEP_INTERVAL_S
+    (once they are also outside the rate-limit window)
+
+Config (env vars):
+  RESET_TOKEN_TTL_MIN      link lifetime in minutes
+  RESET_RATE_LIMIT         max reset requests per account per window
+  RESET_RATE_WINDOW_S      rate-limit window in seconds
+  RESET_SWEEP_INTERVAL_S   how often expired tokens are deleted
+"""
+import asyncio
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.password_reset import PasswordResetToken
+from models.user import User
+
+RESET_TOKEN_TTL_MIN    = int(os.getenv("RESET_TOKEN_TTL_MIN", "30"))
+RESET_RATE_LIMIT       = int(os.getenv("RESET_RATE_LIMIT", "3"))
+RESET_RATE_WINDOW_S    = int(os.getenv("RESET_RATE_WINDOW_S", "3600"))
+RESET_SWEEP_INTERVAL_S = float(os.getenv("RESET_SWEEP_INTERVAL_S", "300"))
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ResetTokenStore:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.issued          = 0
+        self.rate_limited    = 0
+        self.swept           = 0
+
+    async def issue(self, user_id: int, db: Optional[AsyncSession] = None) -> Optional[str]:
+        """
+        New token for `user_id`, or None if the account is over its rate limit.
+        Given `db`, the token is added to that session for the caller to commit
+        (e.g. together with the email that carries it); otherwise it is committed here.
+        """
+        if db is None:
+            async with self.session_factory() as db:
+                token = await self.issue(user_id, db)
+                await db.commit()
+            return token
+        # Lock the account's row first, so concurrent requests for one user count
+        # and insert one after another and cannot all pass the limit at once.
+        # The count is a locking read too: under MySQL's REPEATABLE READ a plain
+        # SELECT would still see the transaction's older snapshot. Both locks
+        # last until the caller commits; SQLite has no row locks and skips them.
+        await db.execute(select(User.id).where(User.id == user_id).with_for_update())
+        now = datetime.utcnow()
+        recent = len((await db.execute(
+            select(PasswordResetToken.token_hash)
+            .where(
+                PasswordResetToken.user_id == user_id,
+                PasswordResetToken.created_at > now - timedelta(seconds=RESET_RATE_WINDOW_S),
+            )
+            .with_for_update()
+        )).all())
+        if recent >= RESET_RATE_LIMIT:
+            self.rate_limited += 1
+            return None
+        token = secrets.token_urlsafe(32)
+        db.add(PasswordResetToken(
+            token_hash=hash_token(token),
+            user_id=user_id,
+            created_at=now,
+            expires_at=now + timedelta(minutes=RESET_TOKEN_TTL_MIN),
+        ))
+        self.issued += 1
+        return token
+
+    async def consume(self, token: str) -> Tuple[Optional[int], bool]:
+        """
+        Redeem a token. Returns (user_id, expired): user_id is None when the
+        token is unknown, already used, or expired (expired=True).
+        """
+        token_hash = hash_token(token)
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(PasswordResetToken.user_id, PasswordResetToken.expires_at)
+                .where(PasswordResetToken.token_hash == token_hash)
+            )).first()
+            if row is None:
+                return None, False
+            if row.expires_at <= datetime.utcnow():
+                return None, True       # left for the sweeper; it still counts towards the rate limit
+            # The DELETE is the claim: of two concurrent redemptions only one removes the row
+            claimed = await db.execute(delete(PasswordResetToken).where(PasswordResetToken.token_hash == token_hash))
+            if claimed.rowcount != 1:
+                await db.rollback()
+                return None, False
+            await db.execute(delete(PasswordResetToken).where(PasswordResetToken.user_id == row.user_id))
+            await db.commit()
+        return row.user_id, False
+
+    async def active(self, limit: int = 50) -> list:
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(PasswordResetToken.token_hash, PasswordResetToken.user_id, PasswordResetToken.expires_at)
+                .where(PasswordResetToken.expires_at > datetime.utcnow())
+                .order_by(PasswordResetToken.expires_at.desc())
+                .limit(limit)
+            )).all()
+        return rows
+
+    # ── Sweeper ───────────────────────────────────────────────────────────────
+    async def sweep(self) -> int:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            # Expired rows still count towards the rate limit until they leave its window
+            result = await db.execute(
+                delete(PasswordResetToken).where(
+                    PasswordResetToken.expires_at <= now,
+                    PasswordResetToken.created_at <= now - timedelta(seconds=RESET_RATE_WINDOW_S),
+                )
+            )
+            await db.commit()
+        self.swept += result.rowcount or 0
+        return result.rowcount or 0
+
+    async def run(self, interval: float = RESET_SWEEP_INTERVAL_S):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"⚠ Reset token sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {"issued": self.issued, "rate_limited": self.rate_limited, "swept": self.swept}
@@ -0,0 +1,136 @@
+"""
+DermAssist AI — JWT revocation store
+Logged-out tokens are remembered by their `jti` until their own `exp`, and
+no longer.
+
+  • MemoryRevocationStore — jti → expiry dict for O(1) lookups, plus
+    one-minute expiry buckets so purging touches only what has expired.
+  • DatabaseRevocationStore — the same in-memory index, backed by the
+    `revoked_tokens` table. Every worker polls the table for rows past its
+    last-seen id, so a logout on one worker reaches all of them within
+    REVOCATION_SYNC_S, while request-time lookups never touch the DB.
+
+Config (env vars):
+  REVOCATION_BACKEND   db (default, shared across workers) | memory
+  REVOCATION_SYNC_S    how often workers pull new revocations / purge
+"""
+import asyncio
+import heapq
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from models.revoked_token import RevokedToken
+
+REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "db")
+REVOCATION_SYNC_S  = float(os.getenv("REVOCATION_SYNC_S", "2"))
+
+_BUCKET_S    = 60
+_DB_PRUNE_S  = 600
+_SYNC_REREAD = 256     # ids below the watermark re-read each sync, for late commits
+
+
+def _utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+class MemoryRevocationStore:
+    def __init__(self):
+        self._expiry: dict   = {}                   # jti → exp (epoch seconds)
+        self._buckets        = defaultdict(set)     # exp // _BUCKET_S → {jti}
+        self._heap: list     = []                   # bucket ids, oldest first
+        self._lock           = threading.Lock()
+
+    def _add(self, jti: str, expires: float):
+        if expires <= time.time():
+            return
+        bucket = int(expires // _BUCKET_S)
+        with self._lock:
+            self._expiry[jti] = expires
+            if bucket not in self._buckets:
+                heapq.heappush(self._heap, bucket)
+            self._buckets[bucket].add(jti)
+
+    async def revoke(self, jti: str, expires: float):
+        self._add(jti, expires)
+
+    def is_revoked(self, jti: str) -> bool:
+        expires = self._expiry.get(jti)
+        return expires is not None and expires > time.time()
+
+    def purge(self) -> int:
+        """Drop every bucket whose whole time range has passed."""
+        current = int(time.time() // _BUCKET_S)
+        dropped = 0
+        with self._lock:
+            while self._heap and self._heap[0] < current:
+                for jti in self._buckets.pop(heapq.heappop(self._heap), ()):
+                    self._expiry.pop(jti, None)
+                    dropped += 1
+        return dropped
+
+    async def sync(self):
+        self.purge()
+
+    async def run(self, interval: float = REVOCATION_SYNC_S):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"⚠ Revocation sync failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "revoked": len(self._expiry), "buckets": len(self._buckets)}
+
+
+class DatabaseRevocationStore(MemoryRevocationStore):
+    def __init__(self, session_factory):
+        super().__init__()
+        self.session_factory = session_factory
+        self._last_id        = 0
+        self._last_prune     = 0.0
+
+    async def revoke(self, jti: str, expires: float):
+        self._add(jti, expires)
+        async with self.session_factory() as db:
+            db.add(RevokedToken(jti=jti, expires_at=_utc(expires)))
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()     # already revoked (e.g. double logout)
+
+    async def sync(self):
+        now = time.time()
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+                # Ids are assigned at insert but become visible at commit, so
+                # re-read a short window below the watermark to catch stragglers
+                .where(RevokedToken.id > self._last_id - _SYNC_REREAD, RevokedToken.expires_at > _utc(now))
+                .order_by(RevokedToken.id)
+            )).all()
+            for row in rows:
+                self._add(row.jti, row.expires_at.replace(tzinfo=timezone.utc).timestamp())
+                self._last_id = max(self._last_id, row.id)
+            if now - self._last_prune > _DB_PRUNE_S:
+                await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= _utc(now)))
+                await db.commit()
+                self._last_prune = now
+        self.purge()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "db", "last_id": self._last_id}
+
+
+def build_revocation_store(session_factory, backend: str = REVOCATION_BACKEND):
+    if backend == "memory":
+        return MemoryRevocationStore()
+    if backend == "db":
+        return DatabaseRevocationStore(session_factory)
+    raise ValueError(f"Unknown REVOCATION_BACKEND: {backend!r}")
@@ -0,0 +1,81 @@
+"""
+DermAssist AI — Backfill typed prediction columns
+Fills the risk_level / diagnosis_name / image_url / class_scores columns of
+rows written before they existed, from the legacy extra_metadata /
+raw_output JSON, in keyset-ordered batches.
+
+Migration 0002 runs the same backfill when it adds the columns, so a
+database upgraded through the migrations needs nothing more. This script
+is for databases that got the columns another way (create_all, or an
+upgrade made before 0002 backfilled), run from backend/:
+    python scripts/backfill_prediction_columns.py [--batch-size 1000]
+
+Safe to re-run: only rows whose class_scores is still NULL are touched.
+"""
+import argparse
+import json
+import os
+import sys
+
+from sqlalchemy import bindparam, select, update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import engine  # noqa: E402
+from models.prediciton import Prediction, pack_scores  # noqa: E402
+
+
+def backfill(batch_size: int):
+    t       = Prediction.__table__
+    last_id = 0
+    total   = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(t.c.id, t.c.predicted_label, t.c.raw_output, t.c.extra_metadata)
+                .where(t.c.id > last_id, t.c.class_scores.is_(None))
+                .order_by(t.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                try:
+                    raw = json.loads(row.raw_output) if row.raw_output else {}
+                except ValueError:
+                    raw = {}
+                try:
+                    extra = json.loads(row.extra_metadata) if row.extra_metadata else {}
+                except ValueError:
+                    extra = {}
+                updates.append({
+                    "row_id":         row.id,
+                    "risk_level":     extra.get("risk_level"),
+                    "diagnosis_name": extra.get("diagnosis_name", row.predicted_label),
+                    "image_url":      extra.get("image_url"),
+                    "class_scores":   pack_scores(raw),
+                })
+            conn.execute(
+                update(t).where(t.c.id == bindparam("row_id")).values(
+                    risk_level=bindparam("risk_level"),
+                    diagnosis_name=bindparam("diagnosis_name"),
+                    image_url=bindparam("image_url"),
+                    class_scores=bindparam("class_scores"),
+                ),
+                updates,
+            )
+            last_id = rows[-1].id
+            total  += len(rows)
+            print(f"  backfilled {total} rows (last id {last_id})")
+    print(f"✅ Backfill complete: {total} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfill(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
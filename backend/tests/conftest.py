@@ -0,0 +1,68 @@
+"""
+Shared fixtures. Every run gets its own SQLite database, built through the
+Alembic migrations, and works from a scratch directory so uploads, report
+caches and spill files never land in the source tree.
+
+Run from the repository root or backend/:
+    python -m pytest -q backend/tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH = tempfile.mkdtemp(prefix="dermassist-tests-")
+
+# Must be set before `database` is imported anywhere
+os.environ["DATABASE_URL"]    = f"sqlite:///{os.path.join(SCRATCH, 'test.db')}"
+os.environ["SCAN_SPILL_FILE"] = os.path.join(SCRATCH, "scan_spill.jsonl")
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+os.makedirs(os.path.join(SCRATCH, "uploads"), exist_ok=True)
+os.chdir(SCRATCH)
+
+import database  # noqa: E402
+import migrate  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+migrate.upgrade_database(database.engine)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+@pytest.fixture
+def make_user():
+    """Insert a user row; returns its id."""
+    def make(**fields) -> int:
+        name = fields.pop("username", f"user-{uuid.uuid4().hex[:12]}")
+        with database.engine.begin() as conn:
+            return conn.exec_driver_sql(
+                "INSERT INTO users (full_name, username, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)",
+                (fields.get("full_name", "Test User"), name, fields.get("email", f"{name}@example.com"), "x",
+                 datetime.utcnow()),
+            ).lastrowid
+    return make
+
+
+@pytest.fixture
+def sessions():
+    """
+    An async session factory for use inside one asyncio.run(): the engine is
+    created and disposed on the test's own event loop.
+    """
+    @asynccontextmanager
+    async def factory():
+        engine = database.build_async_engine(database.DATABASE_URL)
+        try:
+            yield async_sessionmaker(engine, expire_on_commit=False)
+        finally:
+            await engine.dispose()
+    return factory
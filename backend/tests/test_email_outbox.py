@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from email_outbox import EmailOutbox, OUTBOX_BATCH
+from email_service import build_reset_email
+from models.email_outbox import OutboxEmail
+
+
+class NoMailer:
+    """The claim tests never send."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+def run(sessions, body):
+    async def main():
+        async with sessions() as factory:
+            async with factory() as db:
+                await db.execute(delete(OutboxEmail))
+                await db.commit()
+            return await body(factory)
+    return asyncio.run(main())
+
+
+async def enqueue(outbox: EmailOutbox, n: int):
+    for i in range(n):
+        await outbox.enqueue(build_reset_email(f"user{i}@example.com", "Test User", "token"))
+
+
+def test_concurrent_claims_are_disjoint(sessions):
+    async def body(factory):
+        workers = [EmailOutbox(factory, NoMailer()) for _ in range(3)]
+        await enqueue(workers[0], 30)
+        return await asyncio.gather(*(w._claim() for w in workers))
+
+    batches = run(sessions, body)
+    ids = [row.id for batch in batches for row in batch]
+    assert len(ids) == 30
+    assert len(set(ids)) == 30
+    for batch in batches:
+        assert len({row.claim for row in batch}) <= 1
+        assert all(row.status == "sending" and row.lease_until is not None for row in batch)
+
+
+def test_claim_takes_at_most_one_batch(sessions):
+    async def body(factory):
+        outbox = EmailOutbox(factory, NoMailer())
+        await enqueue(outbox, OUTBOX_BATCH + 5)
+        return len(await outbox._claim()), len(await outbox._claim()), len(await outbox._claim())
+
+    assert run(sessions, body) == (OUTBOX_BATCH, 5, 0)
+
+
+def test_claim_skips_messages_not_yet_due(sessions):
+    async def body(factory):
+        outbox = EmailOutbox(factory, NoMailer())
+        await enqueue(outbox, 2)
+        async with factory() as db:
+            first = await db.scalar(select(OutboxEmail.id).order_by(OutboxEmail.id).limit(1))
+            await db.execute(update(OutboxEmail).where(OutboxEmail.id == first)
+                             .values(next_attempt_at=datetime.utcnow() + timedelta(minutes=5)))
+            await db.commit()
+        return first, [row.id for row in await outbox._claim()]
+
+    first, claimed = run(sessions, body)
+    assert len(claimed) == 1
+    assert first not in claimed
+
+
+@pytest.mark.parametrize("lapsed", [True, False])
+def test_claim_reclaims_only_lapsed_leases(sessions, lapsed):
+    async def body(factory):
+        outbox = EmailOutbox(factory, NoMailer())
+        await enqueue(outbox, 1)
+        held = await outbox._claim()
+        if lapsed:              # the worker holding it died
+            async with factory() as db:
+                await db.execute(update(OutboxEmail).values(lease_until=datetime.utcnow() - timedelta(seconds=1)))
+                await db.commit()
+        return held, await outbox._claim()
+
+    held, again = run(sessions, body)
+    assert len(held) == 1
+    if lapsed:
+        assert [row.id for row in again] == [held[0].id]
+        assert again[0].claim != held[0].claim
+    else:
+        assert again == []
+
+
+class SlowMailer:
+    """Blocks in send() until released; remembers whether close() came mid-send."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.sending = False
+        self.closed_while_sending = None
+
+    def send(self, to_addrs, message):
+        self.sending = True
+        self.started.set()
+        self.release.wait(10)
+        self.sending = False
+
+    def close_if_idle(self):
+        pass
+
+    def close(self):
+        self.closed_while_sending = self.sending
+
+    def stats(self) -> dict:
+        return {}
+
+
+def test_shutdown_waits_for_the_send_in_progress(sessions):
+    mailer = SlowMailer()
+
+    async def body(factory):
+        outbox = EmailOutbox(factory, mailer)
+        await enqueue(outbox, 5)
+        sender = asyncio.create_task(outbox.run())
+        await asyncio.to_thread(mailer.started.wait, 10)
+        sender.cancel()                 # what the app's shutdown hook does first
+        stopping = asyncio.ensure_future(outbox.shutdown())
+        await asyncio.sleep(0.1)
+        still_waiting = not stopping.done()
+        mailer.release.set()
+        await asyncio.wait_for(stopping, 10)
+        async with factory() as db:
+            rows = (await db.execute(select(OutboxEmail.status, OutboxEmail.claim))).all()
+        return still_waiting, rows
+
+    still_waiting, rows = run(sessions, body)
+    assert still_waiting
+    assert mailer.closed_while_sending is False
+    assert sorted(status for status, _ in rows) == ["queued"] * 4 + ["sent"]
+    assert all(claim is None for _, claim in rows)
@@ -0,0 +1,37 @@
+import json
+
+from sqlalchemy import select
+
+from database import build_engine
+from migrate import upgrade_database
+from models.prediciton import Prediction, unpack_scores
+
+
+def test_typed_columns_are_backfilled_from_legacy_json(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    try:
+        upgrade_database(engine, "0001_baseline")
+        scores = {"akiec": 0.1, "bcc": 0.05, "bkl": 0.05, "df": 0.05, "mel": 0.6, "nv": 0.1, "vasc": 0.05}
+        extra  = {"risk_level": "High Risk", "diagnosis_name": "Melanoma", "image_url": "/uploads/a.jpg"}
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO users (id, full_name, username, email, password_hash)"
+                                 " VALUES (1, 'Test User', 'legacy', 'legacy@example.com', 'x')")
+            conn.exec_driver_sql("INSERT INTO images (id, image_path, user_id) VALUES (1, 'uploads/a.jpg', 1)")
+            conn.exec_driver_sql(
+                "INSERT INTO predictions (id, predicted_label, raw_output, extra_metadata, user_id, image_id)"
+                " VALUES (1, 'mel', ?, ?, 1, 1), (2, 'nv', NULL, 'not json', 1, 1)",
+                (json.dumps(scores), json.dumps(extra)),
+            )
+
+        upgrade_database(engine)
+
+        with engine.connect() as conn:
+            rows = {r.id: r for r in conn.execute(select(Prediction.__table__))}
+    finally:
+        engine.dispose()
+
+    assert (rows[1].risk_level, rows[1].diagnosis_name, rows[1].image_url) == ("High Risk", "Melanoma", "/uploads/a.jpg")
+    assert unpack_scores(rows[1].class_scores) == scores
+    # Unreadable legacy JSON still gets a row the app can show
+    assert rows[2].diagnosis_name == "nv"
+    assert rows[2].class_scores is not None
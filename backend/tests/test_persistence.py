@@ -0,0 +1,99 @@
+import glob
+import subprocess
+import sys
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import exc
+
+import database
+from persistence import ScanRecord, ScanWriter, _spill_line
+
+
+def dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def record(user_id: int) -> ScanRecord:
+    return ScanRecord(
+        scan_uid=uuid.uuid4().hex, user_id=user_id, image_name="a.jpg", image_path="uploads/a.jpg",
+        image_format="jpg", image_size_kb=1, predicted_label="nv", confidence_score=0.9,
+        model_version="test", processing_time_ms=5, risk_level="Low", diagnosis_name="Nevus",
+        image_url="/uploads/a.jpg", scores=[0.0] * 7, created_at=datetime.utcnow().isoformat(),
+    )
+
+
+def committed(uids) -> set:
+    with database.engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            f"SELECT scan_uid FROM predictions WHERE scan_uid IN ({', '.join('?' * len(uids))})", tuple(uids),
+        )
+        return {uid for (uid,) in rows}
+
+
+@pytest.fixture
+def writer(tmp_path):
+    return ScanWriter(database.SessionLocal, spill_file=str(tmp_path / "scan_spill.jsonl"),
+                      dead_letter_file=str(tmp_path / "scan_spill.dead.jsonl"))
+
+
+def test_replay_files_of_a_dead_process_are_adopted_without_losing_any(writer, make_user):
+    user = make_user()
+    dead, other = dead_pid(), dead_pid()
+    # The dead process was replaying its own spill and one it had adopted from `other`
+    own, adopted = record(user), record(user)
+    with open(f"{writer.spill_file}.{dead}.replay", "w") as f:
+        f.write(_spill_line(own))
+    with open(f"{writer.spill_file}.{dead}.{other}.replay", "w") as f:
+        f.write(_spill_line(adopted))
+
+    writer._replay_spill()
+
+    assert committed([own.scan_uid, adopted.scan_uid]) == {own.scan_uid, adopted.scan_uid}
+    assert glob.glob(glob.escape(writer.spill_file) + "*") == []
+
+
+def test_replay_files_of_a_live_process_are_left_alone(writer, make_user):
+    rec  = record(make_user())
+    path = f"{writer.spill_file}.1.replay"      # pid 1 is always alive
+    with open(path, "w") as f:
+        f.write(_spill_line(rec))
+
+    writer._replay_spill()
+
+    assert committed([rec.scan_uid]) == set()
+    assert glob.glob(glob.escape(writer.spill_file) + "*") == [path]
+
+
+def test_spilled_scans_stay_pending_until_replayed(tmp_path, make_user):
+    writer = ScanWriter(database.SessionLocal, queue_size=1, spill_file=str(tmp_path / "scan_spill.jsonl"))
+    queued, spilled = record(make_user()), record(make_user())
+    writer.submit(queued)
+    writer.submit(spilled)                  # the queue is full, so this one goes to disk
+
+    assert writer.spilled == 1
+    assert writer.is_pending(spilled.scan_uid)
+
+    writer._replay_spill()
+
+    assert committed([spilled.scan_uid]) == {spilled.scan_uid}
+    assert not writer.is_pending(spilled.scan_uid)
+
+
+def test_scans_spilled_before_a_restart_are_pending(writer, make_user):
+    rec = record(make_user())
+    with open(writer.spill_file, "w") as f:
+        f.write(_spill_line(rec))
+
+    def unreachable():
+        raise exc.OperationalError("SELECT 1", None, Exception("database is down"))
+
+    restarted = ScanWriter(unreachable, max_retries=1, spill_file=writer.spill_file,
+                           dead_letter_file=writer.dead_letter_file)
+    restarted._replay_spill()
+
+    assert restarted.is_pending(rec.scan_uid)
+    assert committed([rec.scan_uid]) == set()
@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+
+class CountingExecutor:
+    """Stands in for InferenceExecutor: only admission is exercised."""
+
+    max_pending = 64
+    workers     = 1
+
+    def __init__(self):
+        self.in_flight = 0
+
+    def acquire(self, n: int = 1):
+        self.in_flight += n
+
+    def release(self, n: int = 1):
+        self.in_flight -= n
+
+    async def run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = CountingExecutor()
+    monkeypatch.setattr(main, "executor", executor)
+    return executor
+
+
+def batch_request(n: int) -> httpx.Request:
+    files = [("files", (f"{i}.jpg", b"\xff\xd8\xff\xe0" + b"\0" * 64, "image/jpeg")) for i in range(n)]
+    return httpx.Request("POST", "http://test/predict/batch", files=files)
+
+
+async def call_and_disconnect(request: httpx.Request) -> list:
+    """Send the whole body, then report the client gone before any of the response is read."""
+    body     = request.read()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent     = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        await asyncio.sleep(0)          # a real server's send suspends; the disconnect lands here
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/predict/batch", "raw_path": b"/predict/batch",
+        "root_path": "", "query_string": b"", "server": ("test", 80), "client": ("127.0.0.1", 1),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in request.headers.items()],
+    }
+    await main.app(scope, receive, send)
+    return sent
+
+
+def test_slots_are_released_when_the_client_disconnects_early(executor):
+    asyncio.run(call_and_disconnect(batch_request(3)))
+    assert executor.in_flight == 0
+
+
+def test_slots_are_released_after_a_full_response(executor):
+    async def body():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as c:
+            request = batch_request(2)
+            return await c.post("/predict/batch", content=request.read(), headers=dict(request.headers))
+    r = asyncio.run(body())
+    assert r.status_code == 200
+    assert len(r.text.splitlines()) == 2
+    assert executor.in_flight == 0
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import signal
+
+from process_pool import SpawnPool
+
+
+def test_calls_run_on_worker_processes():
+    pool = SpawnPool("Test", workers=2, max_pending=4)
+
+    async def body():
+        return await asyncio.gather(*(pool.run(os.getpid) for _ in range(4)))
+
+    try:
+        pids = asyncio.run(asyncio.wait_for(body(), 60))
+    finally:
+        pool.shutdown()
+    assert os.getpid() not in pids
+
+
+def test_broken_pool_is_replaced_once():
+    pool = SpawnPool("Test", workers=2, max_pending=8)
+
+    async def body():
+        await pool.run(os.getpid)
+        broken = pool._pool
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        pids = await asyncio.gather(*(pool.run(os.getpid) for _ in range(8)))
+        return broken, pids
+
+    try:
+        broken, pids = asyncio.run(asyncio.wait_for(body(), 60))
+        assert pool.restarts == 1
+        assert pool._pool is not broken
+        assert not set(pids) & set(broken._processes or {})
+    finally:
+        pool.shutdown()
@@ -0,0 +1,26 @@
+"""The hot per-user queries must be answered from their indexes (benchmarks/check_query_plans.py)."""
+import pytest
+
+import check_query_plans
+from database import build_engine
+from migrate import upgrade_database
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    engine = build_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    upgrade_database(engine)
+    check_query_plans.seed(engine, rows=20_000, users=200)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", [name for name, _, _ in check_query_plans.hot_queries(1)])
+def test_hot_query_uses_its_index(seeded, name):
+    _, index, stmt = next(q for q in check_query_plans.hot_queries(1) if q[0] == name)
+    sql = str(stmt.compile(seeded, compile_kwargs={"literal_binds": True}))
+    with seeded.connect() as conn:
+        plan = " | ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+    assert index in plan
+    assert "TEMP B-TREE" not in plan
+    assert not plan.startswith("SCAN")
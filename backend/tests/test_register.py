@@ -0,0 +1,58 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def account(**fields) -> dict:
+    name = f"reg-{uuid.uuid4().hex[:12]}"
+    return {"full_name": "Test User", "username": name, "email": f"{name}@example.com", "password": "pw", **fields}
+
+
+def test_duplicate_email_and_username_are_told_apart(client):
+    first = account()
+    assert client.post("/auth/register", json=first).status_code == 201
+
+    r = client.post("/auth/register", json=account(email=first["email"]))
+    assert (r.status_code, r.json()["detail"]) == (400, "Email already registered")
+    r = client.post("/auth/register", json=account(username=first["username"]))
+    assert (r.status_code, r.json()["detail"]) == (400, "Username already taken")
+
+
+def test_concurrent_registrations_create_one_account():
+    payload = account()
+
+    async def race():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await asyncio.gather(*(c.post("/auth/register", json=payload) for _ in range(4)))
+
+    codes = sorted(r.status_code for r in asyncio.run(race()))
+    assert codes.count(201) == 1
+    assert set(codes[1:]) <= {400, 409}
+
+
+def test_registration_is_a_single_insert(client):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0].upper())
+
+    engine = main.async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert client.post("/auth/register", json=account()).status_code == 201
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements == ["INSERT"]
@@ -0,0 +1,99 @@
+import asyncio
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import insert
+
+import database
+from models.images import Image
+from models.prediciton import Prediction, pack_scores
+from report_cache import ReportCache
+
+SCAN = {"id": 1, "predicted_label": "nv"}
+USER = {"full_name": "Test User"}
+
+
+class SlowPool:
+    """Stands in for ReportRenderPool: counts renders, takes a moment over each."""
+
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail  = fail
+
+    async def render_scan(self, scan_data: dict, user_data: dict) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("render failed")
+        return b"%PDF-1.4 test"
+
+
+def test_concurrent_requests_share_one_render(tmp_path):
+    cache, pool = ReportCache(str(tmp_path)), SlowPool()
+
+    async def body():
+        return await asyncio.gather(*(cache.render_with(pool, 7, SCAN, USER) for _ in range(5)))
+
+    reports = asyncio.run(body())
+    assert pool.calls == 1
+    assert len(set(reports)) == 1
+    with open(reports[0].path, "rb") as f:
+        assert f.read() == b"%PDF-1.4 test"
+    assert asyncio.run(cache.render_with(pool, 7, SCAN, USER)) == reports[0]
+    assert pool.calls == 1
+
+
+def test_waiter_going_away_does_not_cancel_the_render(tmp_path):
+    cache, pool = ReportCache(str(tmp_path)), SlowPool()
+
+    async def body():
+        owner  = asyncio.ensure_future(cache.render_with(pool, 7, SCAN, USER))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.render_with(pool, 7, SCAN, USER))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        return await owner
+
+    assert os.path.exists(asyncio.run(body()).path)
+
+
+def test_failed_render_reaches_every_waiter_and_is_retried(tmp_path):
+    cache, pool = ReportCache(str(tmp_path)), SlowPool(fail=True)
+
+    async def body():
+        return await asyncio.gather(*(cache.render_with(pool, 7, SCAN, USER) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(body())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert pool.calls == 1
+    assert cache._inflight == {}
+
+    pool.fail = False
+    assert os.path.exists(asyncio.run(cache.render_with(pool, 7, SCAN, USER)).path)
+
+
+def test_prerender_renders_on_the_pool_once(tmp_path, make_user):
+    user_id = make_user()
+    with database.engine.begin() as conn:
+        image_id = conn.execute(insert(Image).values(
+            image_path="uploads/x.jpg", uploaded_at=datetime.utcnow(), user_id=user_id,
+        )).inserted_primary_key[0]
+        conn.execute(insert(Prediction).values(
+            scan_uid="prerender-1", predicted_label="nv", confidence_score=0.5, model_version="v2.0",
+            class_scores=pack_scores([1 / 7] * 7), status="completed", created_at=datetime.utcnow(),
+            user_id=user_id, image_id=image_id,
+        ))
+    cache, pool = ReportCache(str(tmp_path), database.SessionLocal), SlowPool()
+
+    async def body():
+        cache.start(pool)
+        # Called by the scan writer after it commits, on the writer's thread
+        await asyncio.to_thread(cache.prerender, [SimpleNamespace(scan_uid="prerender-1")])
+        await asyncio.gather(*(asyncio.wrap_future(t) for t in list(cache._tasks)))
+        return os.listdir(tmp_path / str(user_id))
+
+    assert len(asyncio.run(body())) == 1
+    assert pool.calls == 1
+    assert cache.prerendered == 1
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+import reset_tokens
+from models.password_reset import PasswordResetToken
+from reset_tokens import ResetTokenStore, hash_token
+
+
+def run(sessions, body):
+    async def main():
+        async with sessions() as factory:
+            return await body(ResetTokenStore(factory), factory)
+    return asyncio.run(main())
+
+
+def test_token_is_stored_hashed_and_consumed_once(sessions, make_user):
+    user_id = make_user()
+
+    async def body(store, factory):
+        token = await store.issue(user_id)
+        async with factory() as db:
+            stored = await db.scalar(select(PasswordResetToken.token_hash).where(PasswordResetToken.user_id == user_id))
+        assert stored == hash_token(token) != token
+        return await store.consume(token), await store.consume(token)
+
+    first, second = run(sessions, body)
+    assert first == (user_id, False)
+    assert second == (None, False)
+
+
+def test_consume_revokes_the_users_other_tokens(sessions, make_user):
+    user_id = make_user()
+
+    async def body(store, factory):
+        older, newer = await store.issue(user_id), await store.issue(user_id)
+        await store.consume(newer)
+        async with factory() as db:
+            left = await db.scalar(select(func.count()).select_from(PasswordResetToken)
+                                   .where(PasswordResetToken.user_id == user_id))
+        return left, await store.consume(older)
+
+    left, older = run(sessions, body)
+    assert left == 0
+    assert older == (None, False)
+
+
+def test_expired_token_is_refused(sessions, make_user):
+    user_id = make_user()
+
+    async def body(store, factory):
+        token = await store.issue(user_id)
+        async with factory() as db:
+            await db.execute(update(PasswordResetToken)
+                             .where(PasswordResetToken.token_hash == hash_token(token))
+                             .values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+            await db.commit()
+        return await store.consume(token)
+
+    assert run(sessions, body) == (None, True)
+
+
+def test_unknown_token(sessions):
+    async def body(store, factory):
+        return await store.consume("not-a-token")
+
+    assert run(sessions, body) == (None, False)
+
+
+def test_concurrent_redemptions_succeed_once(sessions, make_user):
+    user_id = make_user()
+
+    async def body(store, factory):
+        token = await store.issue(user_id)
+        return await asyncio.gather(*(store.consume(token) for _ in range(5)))
+
+    results = run(sessions, body)
+    assert results.count((user_id, False)) == 1
+    assert results.count((None, False)) == 4
+
+
+def test_issue_is_rate_limited(sessions, make_user):
+    user_id = make_user()
+
+    async def body(store, factory):
+        return [await store.issue(user_id) for _ in range(reset_tokens.RESET_RATE_LIMIT + 1)], store.rate_limited
+
+    tokens, limited = run(sessions, body)
+    assert all(tokens[:-1])
+    assert tokens[-1] is None
+    assert limited == 1
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import database
+import main
+from auth import Principal, get_current_user
+from models.images import Image
+from models.prediciton import Prediction, pack_scores
+
+SCANS = 7
+
+
+@pytest.fixture
+def user_id(make_user):
+    user_id = make_user()
+    start   = datetime(2024, 1, 1)
+    with database.engine.begin() as conn:
+        for i in range(SCANS):
+            # Two scans share each timestamp, so ties are broken on id
+            add_scan(conn, user_id, start + timedelta(minutes=i // 2))
+    return user_id
+
+
+def add_scan(conn, user_id: int, created_at: datetime):
+    # Through SQLAlchemy, so SQLite stores the timestamps the way the app does
+    image_id = conn.execute(insert(Image).values(
+        image_name="x.jpg", image_path="uploads/x.jpg", image_format="jpg", image_size_kb=200,
+        uploaded_at=created_at, user_id=user_id,
+    )).inserted_primary_key[0]
+    conn.execute(insert(Prediction).values(
+        predicted_label="nv", confidence_score=0.5, model_version="v2.0", processing_time_ms=20,
+        risk_level="Low Risk", diagnosis_name="Nevus", image_url="/uploads/x.jpg",
+        class_scores=pack_scores([1 / 7] * 7), status="completed", created_at=created_at,
+        user_id=user_id, image_id=image_id,
+    ))
+
+
+@pytest.fixture
+def client(user_id):
+    main.app.dependency_overrides[get_current_user] = lambda: Principal(
+        id=user_id, username="u", email="u@example.com", full_name="Test User", phone_number=None,
+        gender=None, date_of_birth=None, role="user", is_active=True, created_at=None,
+    )
+    with TestClient(main.app) as client:
+        yield client
+    main.app.dependency_overrides.clear()
+
+
+def test_cursor_round_trip():
+    created = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert main.decode_cursor(main.encode_cursor(created, 42)) == (created, 42)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(HTTPException) as e:
+        main.decode_cursor("not a cursor")
+    assert e.value.status_code == 400
+
+
+def test_pages_cover_history_once_newest_first(client):
+    seen, cursor = [], None
+    while True:
+        r = client.get("/user/scans", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        seen += [(s["created_at"], s["id"]) for s in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(seen) == SCANS
+    assert len(set(seen)) == SCANS
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_etag_revalidates_until_history_changes(client, user_id):
+    r    = client.get("/user/scans")
+    etag = r.headers["ETag"]
+    assert client.get("/user/scans", headers={"If-None-Match": etag}).status_code == 304
+
+    with database.engine.begin() as conn:
+        add_scan(conn, user_id, datetime(2025, 1, 1))
+    main._invalidate_history([SimpleNamespace(user_id=user_id)])   # what the scan writer does after a commit
+
+    r = client.get("/user/scans", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert len(r.json()) == SCANS + 1
+
+
+def test_etag_differs_per_page(client):
+    first = client.get("/user/scans", params={"limit": 3})
+    later = client.get("/user/scans", params={"limit": 3, "cursor": first.headers["X-Next-Cursor"]})
+    assert first.headers["ETag"] != later.headers["ETag"]
@@ -0,0 +1,155 @@
+"""
+DermAssist AI — Streaming upload ingestion
+Guards /predict against oversized or bogus uploads without buffering them.
+
+Two layers:
+  • UploadSizeLimitMiddleware caps the raw request body per path. A
+    Content-Length over the cap gets a 413 before a single body byte is
+    read; chunked bodies are counted as they stream in and cut off at the
+    cap, so the multipart parser never spools more than that.
+  • read_upload() pulls the file part in chunks. It sniffs JPEG/PNG magic
+    bytes and parses the frame size from the header before reading the
+    rest, and rejects anything that is not an image, is too large in bytes,
+    or claims more pixels than MAX_IMAGE_PIXELS (decompression bombs).
+    The client's content_type is ignored; the sniffed format wins.
+
+Config (env vars):
+  MAX_UPLOAD_BYTES    max bytes for a single image
+  MAX_IMAGE_PIXELS    max width × height declared in the image header
+"""
+import os
+from typing import Dict, Tuple
+
+from fastapi import UploadFile
+
+from image_io import read_image_size, sniff_format
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+
+CHUNK_SIZE         = 256 * 1024
+HEADER_PROBE_BYTES = 64 * 1024      # JPEG SOF usually sits behind EXIF/ICC blocks
+MULTIPART_OVERHEAD = 16 * 1024      # boundaries + part headers on top of the file bytes
+
+MIME_TYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail      = detail
+
+
+def _validate_header(head: bytes, complete: bool) -> bool:
+    """
+    Check magic bytes and declared dimensions of the bytes seen so far.
+    Returns True once the header is fully validated, False if more bytes
+    are needed; raises UploadRejected on anything invalid.
+    """
+    if len(head) >= 8 or complete:
+        if sniff_format(head) is None:
+            raise UploadRejected(400, "Only JPEG and PNG images are accepted.")
+    size = read_image_size(head)
+    if size is None:
+        if complete:
+            raise UploadRejected(400, "Could not read image header. Please upload a valid JPEG or PNG.")
+        return False
+    _, width, height = size
+    if width == 0 or height == 0 or width * height > MAX_IMAGE_PIXELS:
+        raise UploadRejected(400, f"Image dimensions {width}×{height} are not supported.")
+    return True
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[bytes, str]:
+    """
+    Read an uploaded image chunk by chunk. Returns (bytes, sniffed MIME type).
+    Raises UploadRejected as soon as the stream is known to be invalid.
+    """
+    chunks    = []
+    total     = 0
+    head      = b""
+    validated = False
+
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadRejected(413, f"Image exceeds the {max_bytes // (1024 * 1024)} MB upload limit.")
+        chunks.append(chunk)
+        # Probe only the first few KB; a frame header hidden behind unusually
+        # large metadata is validated once the whole file is in.
+        if not validated and len(head) < HEADER_PROBE_BYTES:
+            head += chunk[:HEADER_PROBE_BYTES - len(head)]
+            validated = _validate_header(head, complete=False)
+
+    contents = b"".join(chunks)
+    if not validated:
+        _validate_header(contents, complete=True)
+    return contents, MIME_TYPES[sniff_format(contents)]
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Pure ASGI middleware enforcing a per-path cap on request body size.
+    `limits` maps a path to its max body bytes, e.g. {"/predict": 15 MB}.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app    = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    if int(value) > limit:
+                        return await self._reject(send)
+                except ValueError:
+                    return await self._reject(send, 400, b'{"detail":"Invalid Content-Length."}')
+
+        received  = 0
+        too_large = False
+        rejected  = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Stop reading here; the body parser sees a disconnect and
+                    # whatever error response it produces is swapped for a 413.
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal rejected
+            if too_large:
+                if not rejected and message["type"] == "http.response.start":
+                    rejected = True
+                    await self._reject(send)
+                return
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    @staticmethod
+    async def _reject(send, status: int = 413, body: bytes = b'{"detail":"Upload too large."}'):
+        await send({
+            "type":    "http.response.start",
+            "status":  status,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})